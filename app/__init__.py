@@ -1,12 +1,51 @@
 from flask import Flask
 from flask_cors import CORS
 from threading import Thread
+import atexit
 import os
+import time
 
-from .config import LOG_FILE, SIMULATION_INTERVAL
+from .config import (
+    BASELINE_ENABLED,
+    BASELINE_FILE,
+    INGEST_POLICY,
+    INGEST_PUBLISH_INTERVAL,
+    INGEST_QUEUE_MAX_RECORDS,
+    INGEST_UDP_HOST,
+    INGEST_UDP_PORT,
+    INGEST_WORKERS,
+    LOG_FILE,
+    LOG_GLOB,
+    LOG_POLL_INTERVAL,
+    REORDER_WINDOW,
+    SAMPLING_ENABLED,
+    SERVING_MODE,
+    SHARED_STATE_NAME,
+    SIMULATION_INTERVAL,
+    SNAPSHOT_ENABLED,
+    SNAPSHOT_DIR,
+    SNAPSHOT_INTERVAL,
+    SNAPSHOT_KEEP,
+    TIMELINE_CHECKPOINT_INTERVAL,
+    TIMELINE_DELTA_INTERVAL,
+    TIMELINE_DIR,
+    TIMELINE_ENABLED,
+    TIMELINE_RETENTION,
+)
+from .dir_reader import DirectoryReader
 from .graph_state import GraphState
+from .ingest import IngestPipeline, UdpIngestServer
 from .log_reader import LogReader
 from .alert_engine import AlertEngine
+from .baselines import BaselineTable
+from .metrics import REGISTRY
+from .sampling import AdaptiveSampler
+from .scenarios import ScenarioEngine
+from .scoring import ScoringEngine
+from .shared_state import SharedGraphView
+from .sharded import ShardedIngest
+from .snapshot import SnapshotStore, Snapshotter
+from .timeline import TimelineRecorder, TimelineStore
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
@@ -25,17 +64,108 @@ def create_app():
 
     app.graph_state = graph_state
     app.alert_engine = alert_engine
+    app.ingest_pipeline = None
 
-    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
-        print(">>> Starting LogReader THREAD (MAIN PROCESS)")
-        reader = LogReader(graph_state, alert_engine, LOG_FILE, SIMULATION_INTERVAL)
-        t = Thread(target=reader.run_blocking, daemon=True)
-        t.start()
+    if SERVING_MODE == "shared":
+        # граф ведёт отдельный процесс run_ingest.py, воркер только читает
+        view = SharedGraphView(SHARED_STATE_NAME)
+        app.graph_state = view
+        app.alert_engine = view
+        print(f">>> Serving graph from shared memory '{SHARED_STATE_NAME}'")
+    elif os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        app.ingest_pipeline = start_ingest(graph_state, alert_engine)
     else:
         print(">>> SKIP LogReader THREAD (LOADER PROCESS)")
 
+    gs = app.graph_state
+    app.scenario_engine = ScenarioEngine(gs)
+    atexit.register(app.scenario_engine.close)
+    # история читается с диска, поэтому работает и в shared-режиме
+    app.timeline = TimelineStore(TIMELINE_DIR, TIMELINE_RETENTION) if TIMELINE_ENABLED else None
+
+    REGISTRY.gauge("mbd_graph_nodes", "Services in the graph").set_function(gs.active_nodes_count)
+    REGISTRY.gauge("mbd_graph_edges", "Service-to-service edges in the graph").set_function(
+        lambda: len(gs.edges))
+    REGISTRY.gauge("mbd_graph_logs", "Log records applied to the graph").set_function(
+        lambda: gs.total_logs)
+
     from .routes import bp
     app.register_blueprint(bp)
 
     return app
 
+
+def start_ingest(graph_state, alert_engine) -> IngestPipeline:
+    """Базовые линии, тёплый старт из снапшота, скоринг, очередь ингеста, читатели логов, снапшоттер и история."""
+    snap = None
+    if BASELINE_ENABLED:
+        baselines = BaselineTable.load(BASELINE_FILE)
+        if baselines is not None:
+            alert_engine.baselines = baselines
+            alert_engine.baselines_at = os.path.getmtime(BASELINE_FILE)
+            print(f">>> Loaded latency baselines for {len(baselines)} edges from {BASELINE_FILE}")
+
+    store = SnapshotStore(SNAPSHOT_DIR, SNAPSHOT_KEEP) if SNAPSHOT_ENABLED else None
+
+    if store is not None:
+        t0 = time.perf_counter()
+        snap = store.load_latest()
+        if snap is not None:
+            snap.apply(graph_state, alert_engine)
+            print(f">>> Warm start from snapshot: {len(graph_state.edges)} edges, "
+                  f"{len(snap.offsets)} offsets, {time.perf_counter() - t0:.3f}s")
+
+    scorer = ScoringEngine(graph_state)
+    graph_state.scorer = scorer
+    scorer.start()
+
+    pipeline = IngestPipeline(graph_state, alert_engine, INGEST_QUEUE_MAX_RECORDS, INGEST_POLICY)
+    pipeline.start()
+
+    if INGEST_UDP_PORT is not None:
+        udp = UdpIngestServer(pipeline, INGEST_UDP_HOST, INGEST_UDP_PORT)
+        udp.start()
+        print(f">>> UDP ingest listening on {udp.address[0]}:{udp.address[1]}")
+
+    if LOG_GLOB:
+        print(f">>> Starting DirectoryReader on {LOG_GLOB} (MAIN PROCESS)")
+        reader = DirectoryReader(pipeline, LOG_GLOB, LOG_POLL_INTERVAL, REORDER_WINDOW,
+                                 start_offset=snap.offset_for if snap is not None else None)
+        reader.start()
+    elif INGEST_WORKERS > 0 and SIMULATION_INTERVAL <= 0:
+        print(f">>> Starting sharded ingest with {INGEST_WORKERS} workers (MAIN PROCESS)")
+        reader = ShardedIngest(graph_state, alert_engine, LOG_FILE, INGEST_WORKERS,
+                               INGEST_PUBLISH_INTERVAL,
+                               start_offset=snap.offset_for(LOG_FILE) if snap is not None else 0)
+        reader.start()
+        atexit.register(reader.stop)
+    else:
+        if INGEST_WORKERS > 0:
+            # воркеры читают файл без пауз — симуляция с паузами только в LogReader
+            print(f">>> MBD_INGEST_WORKERS={INGEST_WORKERS} ignored: sharded ingest does not pace replay, "
+                  f"set SIMULATION_INTERVAL = 0 to use it")
+        print(">>> Starting LogReader THREAD (MAIN PROCESS)")
+        reader = LogReader(graph_state, alert_engine, LOG_FILE, SIMULATION_INTERVAL,
+                           start_offset=snap.offset_for(LOG_FILE) if snap is not None else 0,
+                           pipeline=pipeline)
+        t = Thread(target=reader.run_blocking, name="LogReader", daemon=True)
+        t.start()
+
+    # перегрузку видно по очереди писателя: в неё пишут LogReader, DirectoryReader,
+    # /api/ingest и UDP. Отставание файла не годится — симуляция отстаёт намеренно
+    if SAMPLING_ENABLED:
+        sampler = AdaptiveSampler(lambda: pipeline.depth)
+        graph_state.sampler = sampler
+        sampler.start()
+
+    if store is not None:
+        snapshotter = Snapshotter(store, graph_state, alert_engine, [reader], SNAPSHOT_INTERVAL)
+        snapshotter.start()
+        atexit.register(snapshotter.save_now)
+
+    if TIMELINE_ENABLED:
+        recorder = TimelineRecorder(TimelineStore(TIMELINE_DIR, TIMELINE_RETENTION), graph_state,
+                                    TIMELINE_CHECKPOINT_INTERVAL, TIMELINE_DELTA_INTERVAL)
+        recorder.start()
+
+    return pipeline
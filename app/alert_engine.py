@@ -1,16 +1,63 @@
 import statistics
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+from .baselines import BaselineTable, hour_of_week
+from .config import ALERT_THRESHOLD_INTERVAL, BASELINE_Z_CRIT, BASELINE_Z_WARN
+from .metrics import REGISTRY, STAGE_SECONDS
+
+ALERTS_TOTAL = REGISTRY.counter("mbd_alerts_total", "Alerts raised by severity", ["type"])
+_ALERT_TIME = STAGE_SECONDS.labels(stage="alert")
+
+# вес замера в сглаженном z-score ребра; z одного замера ограничен
+# ANOMALY_Z_CAP * z_crit, так что одиночный выброс алерт не поднимает,
+# а серия из двух-четырёх — поднимает
+ANOMALY_SMOOTHING = 0.2
+ANOMALY_Z_CAP = 2.0
+# аномальный замер учится в базовую линию с этим множителем alpha,
+# чтобы инцидент не стал нормой за минуты
+ANOMALY_LEARN_WEIGHT = 0.1
+# нижняя граница std: доля среднего и абсолютный минимум (ms)
+MIN_STD_RATIO = 0.05
+MIN_STD = 1.0
 
 
 class AlertEngine:
-    def __init__(self, graph_state):
+    """
+    Замер с известной базовой линией ребра оценивается z-score по ячейке его
+    часа недели (app/baselines.py) — поиск и арифметика, без обхода рёбер.
+    Пока истории мало, работают старые пороги: медиана + std средних по всем
+    рёбрам, пересчитываемые не чаще ALERT_THRESHOLD_INTERVAL.
+    """
+
+    def __init__(self, graph_state, baselines: Optional[BaselineTable] = None,
+                 z_warn: float = BASELINE_Z_WARN, z_crit: float = BASELINE_Z_CRIT):
         self._gs = graph_state
         self._alerts: List[Dict[str, Any]] = []
+        self.baselines = baselines if baselines is not None else BaselineTable()
+        # время (mtime файла / снапшота), на которое актуальна таблица
+        self.baselines_at = 0.0
+        self.z_warn = z_warn
+        self.z_crit = z_crit
+        # сглаженный z-score по рёбрам; только для рёбер из таблицы, так что ограничен ею
+        self.anomaly: Dict[Tuple[str, str], float] = {}
+        self._thresholds = (150, 250)
+        self._thresholds_at = float("-inf")
 
     def get_alerts(self):
         return list(self._alerts)
 
+    def load_alerts(self, alerts: List[Dict[str, Any]]) -> None:
+        self._alerts = list(alerts)[-200:]
+
     def _compute_adaptive_thresholds(self):
+        now = time.monotonic()
+        if now - self._thresholds_at >= ALERT_THRESHOLD_INTERVAL:
+            self._thresholds = self._cross_edge_thresholds()
+            self._thresholds_at = now
+        return self._thresholds
+
+    def _cross_edge_thresholds(self):
         edges = list(self._gs.edges.values())
         if len(edges) < 5:
             return 150, 250
@@ -45,23 +92,94 @@ class AlertEngine:
         if not status:
             return
 
+        self._raise(status, src, dst, f"avg={edge.avg_latency:.1f} ms (warn={warn:.1f}, crit={crit:.1f})")
+
+    def _raise(self, status: str, src: str, dst: str, details: str, meta: str = "") -> None:
+        ALERTS_TOTAL.labels(type=status).inc()
         self._alerts.append({
             "type": status,
             "title": f"Latency {status.upper()}",
-            "message": f"{src} → {dst} "
-                       f"avg={edge.avg_latency:.1f} ms "
-                       f"(warn={warn:.1f}, crit={crit:.1f})",
+            "message": f"{src} → {dst} {details}",
             "route": f"{src}/{dst}",
-            "meta": ""
+            "meta": meta
         })
 
         if len(self._alerts) > 200:
             self._alerts.pop(0)
 
-    def handle_log(self, src: str, dst: str):
+    def _score(self, key: Tuple[str, str], latency: float, ts: float) -> Optional[Tuple[float, float, float]]:
+        """Учитывает замер в базовой линии и сглаженном z; (z, mean, std) или None, если истории нет."""
+        base = self.baselines.lookup(key, ts)
+        if base is None:
+            # истории ещё нет: копим её
+            self.baselines.observe(key, ts, latency)
+            return None
+
+        mean, std = base
+        z = (latency - mean) / max(std, mean * MIN_STD_RATIO, MIN_STD)
+        score = self.anomaly.get(key, 0.0)
+        score += ANOMALY_SMOOTHING * (min(z, ANOMALY_Z_CAP * self.z_crit) - score)
+        self.anomaly[key] = score
+        self.baselines.observe(key, ts, latency, ANOMALY_LEARN_WEIGHT if z >= self.z_crit else 1.0)
+        return z, mean, std
+
+    def _raise_anomaly(self, src: str, dst: str, latency: float, z: float, mean: float, std: float,
+                       ts: float) -> None:
+        score = self.anomaly[(src, dst)]
+        if score >= self.z_crit:
+            status = "critical"
+        elif score >= self.z_warn:
+            status = "warning"
+        else:
+            return
+        self._raise(status, src, dst,
+                    f"{latency:.1f} ms, z={z:.1f}, smoothed={score:.1f} (baseline {mean:.1f}±{std:.1f} ms)",
+                    meta=f"hour_of_week={hour_of_week(ts)}")
+
+    def score_sample(self, src: str, dst: str, edge, latency: float, ts: float) -> None:
+        scored = self._score((src, dst), latency, ts)
+        if scored is None:
+            # без истории ребро оценивается по соседям
+            self.process_edge(src, dst, edge)
+            return
+        self._raise_anomaly(src, dst, latency, *scored, ts)
+
+    def handle_log(self, src: str, dst: str, latency: Optional[float] = None, ts: Optional[float] = None):
+        """
+        С latency — оценка отдельного замера по базовой линии; без неё —
+        проверка окна ребра по общим порогам.
+        """
+        t0 = time.perf_counter()
         edge = self._gs.edges.get((src, dst))
         if edge:
-            self.process_edge(src, dst, edge)
+            if latency is None:
+                self.process_edge(src, dst, edge)
+            else:
+                self.score_sample(src, dst, edge, latency, time.time() if ts is None else ts)
+        _ALERT_TIME.observe(time.perf_counter() - t0)
+
+    def handle_samples(self, src: str, dst: str, latencies: Sequence[float], ts: Optional[float] = None):
+        """
+        Пачка замеров одного ребра (дельта воркера): базовая линия и сглаженный z
+        учитывают каждый замер, а алерт проверяется один раз — по итогу пачки.
+        """
+        t0 = time.perf_counter()
+        edge = self._gs.edges.get((src, dst))
+        if edge and latencies:
+            ts = time.time() if ts is None else ts
+            last, learning = None, False
+            for latency in latencies:
+                scored = self._score((src, dst), latency, ts)
+                if scored is None:
+                    learning = True
+                else:
+                    last = (latency,) + scored
+            if learning:
+                # история набиралась в этой же пачке — ей ещё нельзя верить
+                self.process_edge(src, dst, edge)
+            elif last is not None:
+                self._raise_anomaly(src, dst, *last, ts)
+        _ALERT_TIME.observe(time.perf_counter() - t0)
 
     def overall_status(self):
         crit_count = sum(1 for a in self._alerts if a["type"] == "critical")
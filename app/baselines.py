@@ -0,0 +1,234 @@
+import argparse
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .compressed import open_log
+from .config import (
+    BASELINE_ALPHA,
+    BASELINE_MAX_EDGES,
+    BASELINE_MIN_SAMPLES,
+    NAME_RULES,
+    READ_CHUNK_SIZE,
+)
+from .csv_parser import BatchParser
+from .normalize import NameNormalizer
+
+# Сезонные базовые линии задержки по рёбрам. У каждого ребра 168 ячеек
+# "час недели" (UTC, 0 = понедельник 00:00) и ячейка ALL — по всем часам:
+# среднее, дисперсия и число замеров. Медленное ребро в БД и быстрое в кэш
+# сравниваются каждое со своей историей, а ночь — с ночью.
+#
+# Онлайн ячейка обновляется EWMA с alpha = max(BASELINE_ALPHA, 1 / (n + 1)):
+# пока замеров мало, это обычное среднее (как при офлайн-сборке), потом —
+# экспоненциальное забывание. Оценка замера — z = (x - mean) / std по ячейке
+# его часа; если в ней меньше BASELINE_MIN_SAMPLES — по ячейке ALL.
+#
+# Офлайн-сборка из архивных CSV (в т.ч. .gz/.bz2/.zst):
+#   python -m app.baselines build --output baselines.mbdb logs/*.csv.gz
+# Таблица хранится в float32 и пишется разреженно — только ячейки с замерами.
+
+SLOTS = 168
+ALL = SLOTS  # индекс ячейки по всем часам
+_WEEK = 7 * 24 * 3600
+# 1970-01-01 — четверг: сдвиг, чтобы час 0 был понедельником
+_EPOCH_SHIFT = 3 * 24 * 3600
+
+MAGIC = b"MBDB"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sHdI")  # magic, версия, alpha, число рёбер
+_CELL = struct.Struct("<BffI")  # ячейка, mean, var, n
+
+Key = Tuple[str, str]
+
+
+def hour_of_week(ts: float) -> int:
+    return int((ts + _EPOCH_SHIFT) % _WEEK) // 3600
+
+
+class _Profile:
+    __slots__ = ("mean", "var", "n")
+
+    def __init__(self):
+        self.mean = array("f", bytes(4 * (SLOTS + 1)))
+        self.var = array("f", bytes(4 * (SLOTS + 1)))
+        self.n = array("I", bytes(4 * (SLOTS + 1)))
+
+    def copy(self) -> "_Profile":
+        p = _Profile.__new__(_Profile)
+        p.mean, p.var, p.n = self.mean[:], self.var[:], self.n[:]
+        return p
+
+
+class BaselineTable:
+    def __init__(self, alpha: float = BASELINE_ALPHA, min_samples: int = BASELINE_MIN_SAMPLES,
+                 max_edges: int = BASELINE_MAX_EDGES):
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.max_edges = max_edges
+        self.profiles: Dict[Key, _Profile] = {}
+
+    def __len__(self) -> int:
+        return len(self.profiles)
+
+    def copy(self) -> "BaselineTable":
+        """Снимок таблицы: копии массивов без разбора ячеек (для снапшота под gs.lock)."""
+        table = BaselineTable(self.alpha, self.min_samples, self.max_edges)
+        table.profiles = {key: p.copy() for key, p in self.profiles.items()}
+        return table
+
+    def lookup(self, key: Key, ts: float) -> Optional[Tuple[float, float]]:
+        """(mean, std) для часа ts или None, если истории ещё мало."""
+        p = self.profiles.get(key)
+        if p is None:
+            return None
+        slot = hour_of_week(ts)
+        if p.n[slot] < self.min_samples:
+            slot = ALL
+            if p.n[slot] < self.min_samples:
+                return None
+        return p.mean[slot], p.var[slot] ** 0.5
+
+    def _cell(self, p: _Profile, slot: int, x: float, weight: float) -> None:
+        n = p.n[slot]
+        alpha = max(self.alpha, 1.0 / (n + 1)) * weight
+        mean = p.mean[slot]
+        diff = x - mean
+        incr = alpha * diff
+        p.mean[slot] = mean + incr
+        p.var[slot] = (1 - alpha) * (p.var[slot] + diff * incr)
+        if n < 0xFFFFFFFF:
+            p.n[slot] = n + 1
+
+    def observe(self, key: Key, ts: float, latency: float, weight: float = 1.0) -> None:
+        """Онлайн-обновление; weight < 1 — замер влияет слабее (аномалия)."""
+        p = self.profiles.get(key)
+        if p is None:
+            if len(self.profiles) >= self.max_edges:
+                return
+            p = self.profiles[key] = _Profile()
+        self._cell(p, hour_of_week(ts), latency, weight)
+        self._cell(p, ALL, latency, weight)
+
+    def set_cell(self, key: Key, slot: int, mean: float, var: float, n: int) -> None:
+        p = self.profiles.get(key)
+        if p is None:
+            p = self.profiles[key] = _Profile()
+        p.mean[slot], p.var[slot], p.n[slot] = mean, var, min(n, 0xFFFFFFFF)
+
+    # ---------- компактная таблица ----------
+
+    def to_bytes(self) -> bytes:
+        out = [_HEADER.pack(MAGIC, FORMAT_VERSION, self.alpha, len(self.profiles))]
+        for (src, dst), p in self.profiles.items():
+            cells = [slot for slot in range(SLOTS + 1) if p.n[slot]]
+            for name in (src, dst):
+                raw = name.encode("utf-8")
+                out.append(struct.pack("<H", len(raw)) + raw)
+            out.append(struct.pack("<H", len(cells)))
+            out.extend(_CELL.pack(slot, p.mean[slot], p.var[slot], p.n[slot]) for slot in cells)
+        return b"".join(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, **kwargs) -> "BaselineTable":
+        magic, version, alpha, n_edges = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("not a baseline table")
+        kwargs.setdefault("alpha", alpha)
+        table = cls(**kwargs)
+        pos = _HEADER.size
+        for _ in range(n_edges):
+            names = []
+            for _ in range(2):
+                (length,) = struct.unpack_from("<H", data, pos)
+                pos += 2
+                names.append(data[pos:pos + length].decode("utf-8"))
+                pos += length
+            (n_cells,) = struct.unpack_from("<H", data, pos)
+            pos += 2
+            for slot, mean, var, n in _CELL.iter_unpack(data[pos:pos + n_cells * _CELL.size]):
+                if slot > ALL:
+                    raise ValueError(f"bad hour-of-week slot {slot}")
+                table.set_cell((names[0], names[1]), slot, mean, var, n)
+            pos += n_cells * _CELL.size
+        return table
+
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.to_bytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> Optional["BaselineTable"]:
+        """Таблица из файла или None, если файла нет или он битый."""
+        try:
+            with open(path, "rb") as f:
+                return cls.from_bytes(f.read(), **kwargs)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error, UnicodeDecodeError) as e:
+            print(f">>> Skip broken baseline table {path}: {e}")
+            return None
+
+
+# ---------- офлайн-сборка ----------
+
+def build(paths: Iterable[str], alpha: float = BASELINE_ALPHA, chunk_size: int = READ_CHUNK_SIZE) -> BaselineTable:
+    """
+    Точные среднее и дисперсия по каждой ячейке за всю историю: суммы копятся
+    по ячейкам в один проход по файлам, без графа и алертов.
+    """
+    # имена схлопываются теми же правилами, что и в GraphState, — ключи совпадут
+    normalize = NameNormalizer(NAME_RULES)
+    sums: Dict[Tuple[str, str, int], List[float]] = {}
+    for path in paths:
+        parser = BatchParser()
+        with open_log(path) as f:
+            while True:
+                chunk = f.read(chunk_size)
+                batch = parser.feed(chunk) if chunk else parser.flush()
+                for src, dst, latency, ts in zip(batch.src, batch.dst, batch.latency, batch.timestamps):
+                    if ts is None:
+                        continue
+                    if normalize:
+                        src, dst = normalize(src), normalize(dst)
+                    for slot in (hour_of_week(ts), ALL):
+                        s = sums.get((src, dst, slot))
+                        if s is None:
+                            s = sums[(src, dst, slot)] = [0, 0.0, 0.0]
+                        s[0] += 1
+                        s[1] += latency
+                        s[2] += latency * latency
+                if not chunk:
+                    break
+
+    table = BaselineTable(alpha=alpha, max_edges=sys.maxsize)
+    for (src, dst, slot), (n, total, squares) in sums.items():
+        mean = total / n
+        table.set_cell((src, dst), slot, mean, max(0.0, squares / n - mean * mean), n)
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build per-edge hour-of-week latency baselines from log files")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="build a baseline table from CSV logs (.gz/.bz2/.zst are fine)")
+    b.add_argument("paths", nargs="+")
+    b.add_argument("--output", required=True)
+    b.add_argument("--alpha", type=float, default=BASELINE_ALPHA)
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    table = build(args.paths, alpha=args.alpha)
+    table.save(args.output)
+    print(f">>> Baselines for {len(table)} edges -> {args.output} "
+          f"({os.path.getsize(args.output)} bytes, {time.perf_counter() - t0:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
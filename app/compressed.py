@@ -0,0 +1,172 @@
+import bz2
+import os
+import zlib
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # .zst читается, только если установлен zstandard
+    zstandard = None
+
+# Сжатые логи (.gz, .bz2, .zst) читаются потоково: сырой файл идёт кусками
+# через инкрементальный декодер, наружу — обычный read(n) распакованных байт,
+# так что разбор остаётся тем же BatchParser по кускам. Ни файл целиком,
+# ни распакованная копия на диске не нужны.
+#
+# Позиция (tell/seek) — в распакованных байтах: её пишут снапшоты и по ней
+# читатель продолжает после рестарта. seek вперёд — это распаковка с начала
+# с выбрасыванием вывода, поэтому тёплый старт со сжатого файла дороже, чем
+# с обычного. Отставание считается по сжатым байтам (raw_tell).
+#
+# Растущий файл (gzip пишется с flush) можно читать как хвост: read() отдаёт
+# всё, что уже декодируется, а недописанный блок декодер держит у себя
+# до следующего read().
+
+GZIP_MAGIC = b"\x1f\x8b"
+BZ2_MAGIC = b"BZh"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+_SUFFIXES = {".gz": "gzip", ".gzip": "gzip", ".bz2": "bz2", ".zst": "zstd", ".zstd": "zstd"}
+
+# сжатых байт за один шаг декодера: вывод растёт с коэффициентом сжатия,
+# так что куски держим меньше READ_CHUNK_SIZE
+RAW_CHUNK = 16 * 1024
+
+
+class CompressionError(Exception):
+    pass
+
+
+_DECODE_ERRORS = (zlib.error, OSError, ValueError, EOFError) + (
+    (zstandard.ZstdError,) if zstandard is not None else ())
+
+
+def detect(path: str) -> Optional[str]:
+    """'gzip' | 'bz2' | 'zstd' по магическим байтам, иначе по расширению; None — обычный файл."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(4)
+    except OSError:
+        head = b""
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    if head.startswith(BZ2_MAGIC) and path.endswith(".bz2"):
+        # "BZh" бывает и началом текстовой строки — без расширения не верим
+        return "bz2"
+    if head:
+        return None
+    # пустой файл: сжатый поток ещё не начали писать
+    return _SUFFIXES.get(os.path.splitext(path)[1].lower())
+
+
+def _new_decoder(kind: str):
+    if kind == "gzip":
+        # 16 + MAX_WBITS: заголовок и crc gzip
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if kind == "bz2":
+        return bz2.BZ2Decompressor()
+    if kind == "zstd":
+        if zstandard is None:
+            raise CompressionError("reading .zst logs requires the zstandard package")
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise CompressionError(f"unknown compression: {kind}")
+
+
+class StreamDecoder:
+    """Инкрементальная распаковка; склеенные потоки (cat a.gz b.gz) читаются подряд."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._d = _new_decoder(kind)
+
+    def feed(self, data: bytes) -> bytes:
+        out = []
+        while data:
+            out.append(self._d.decompress(data))
+            if not getattr(self._d, "eof", False):
+                break
+            # поток закончился: остаток — начало следующего
+            data = self._d.unused_data
+            self._d = _new_decoder(self.kind)
+        return b"".join(out)
+
+
+class DecompressingReader:
+    """Файлоподобный поток распакованных байт: read, seek, tell, close."""
+
+    def __init__(self, path: str, kind: str, offset: int = 0, raw_chunk: int = RAW_CHUNK):
+        self.path = path
+        self.kind = kind
+        self.raw_chunk = raw_chunk
+        self._raw = open(path, "rb")
+        self._decoder = StreamDecoder(kind)
+        self._buf = b""
+        self._pos = 0
+        if offset:
+            self.seek(offset)
+
+    def read(self, n: int = -1) -> bytes:
+        buf = self._buf
+        while n < 0 or len(buf) < n:
+            raw = self._raw.read(self.raw_chunk)
+            if not raw:
+                break
+            try:
+                buf += self._decoder.feed(raw)
+            except _DECODE_ERRORS as e:
+                raise CompressionError(f"{self.path}: corrupt {self.kind} stream: {e}")
+        if n < 0 or len(buf) <= n:
+            out, self._buf = buf, b""
+        else:
+            out, self._buf = buf[:n], buf[n:]
+        self._pos += len(out)
+        return out
+
+    def tell(self) -> int:
+        return self._pos
+
+    def raw_tell(self) -> int:
+        """Сколько сжатых байт уже прочитано из файла."""
+        return self._raw.tell()
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        if whence != 0:
+            raise CompressionError("compressed logs support only absolute seek")
+        if offset < self._pos:
+            self._raw.seek(0)
+            self._decoder = StreamDecoder(self.kind)
+            self._buf = b""
+            self._pos = 0
+        while self._pos < offset:
+            if not self.read(min(offset - self._pos, 1024 * 1024)):
+                break
+        return self._pos
+
+    def fileno(self) -> int:
+        return self._raw.fileno()
+
+    def close(self) -> None:
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_log(path: str, offset: int = 0):
+    """Лог-файл в двоичном режиме с позиции offset; сжатый — через DecompressingReader."""
+    kind = detect(path)
+    if kind is None:
+        f = open(path, "rb")
+        f.seek(offset)
+        return f
+    return DecompressingReader(path, kind, offset)
+
+
+def raw_tell(f) -> int:
+    """Прочитано байт файла на диске — для отставания и проверки ротации."""
+    return f.raw_tell() if isinstance(f, DecompressingReader) else f.tell()
@@ -7,3 +7,107 @@ LOG_FILE = os.path.join(BASE_DIR, "live_logs.csv")
 
 # интервал между "логами" при симуляции (секунды)
 SIMULATION_INTERVAL = 0.1
+
+# снапшоты состояния для быстрого рестарта
+SNAPSHOT_ENABLED = True
+SNAPSHOT_DIR = os.path.join(BASE_DIR, "snapshots")
+SNAPSHOT_INTERVAL = 10.0  # секунды
+SNAPSHOT_KEEP = 3
+
+# история графа для /api/graph?at=: контрольные точки + дельты между ними
+TIMELINE_ENABLED = True
+TIMELINE_DIR = os.path.join(SNAPSHOT_DIR, "timeline")
+TIMELINE_CHECKPOINT_INTERVAL = 300.0  # секунды между полными точками
+TIMELINE_DELTA_INTERVAL = 5.0  # секунды между дельтами (разрешение истории)
+TIMELINE_RETENTION = 24 * 3600  # секунды; None — хранить всё
+
+# сэмплирующий профайлер /api/admin/profile
+PROFILER_ENABLED = True
+PROFILER_MAX_SECONDS = 60.0
+PROFILER_MIN_INTERVAL = 0.001  # секунды между сэмплами
+# если задан, запрос к /api/admin/* должен нести заголовок X-Admin-Token
+ADMIN_TOKEN = os.environ.get("MBD_ADMIN_TOKEN")
+
+# размер куска при чтении лог-файла (байты)
+READ_CHUNK_SIZE = 64 * 1024
+
+# push-ingest: POST /api/ingest и опциональный UDP-приёмник
+INGEST_QUEUE_MAX_RECORDS = 200_000
+INGEST_POLICY = "reject"  # "reject" (429 / ожидание) или "shed_oldest"
+INGEST_MAX_BODY = 16 * 1024 * 1024  # байты
+INGEST_UDP_HOST = "127.0.0.1"
+INGEST_UDP_PORT = None  # например 5514; None — UDP выключен
+
+# несколько лог-файлов: glob вроде os.path.join(BASE_DIR, "logs", "*.csv");
+# если задан, вместо LogReader по LOG_FILE запускается DirectoryReader
+LOG_GLOB = os.environ.get("MBD_LOG_GLOB")
+LOG_POLL_INTERVAL = 0.5  # секунды между проверками новых файлов и роста хвостов
+REORDER_WINDOW = 1.0  # секунды по меткам времени логов
+
+# многопроцессный разбор LOG_FILE: число воркеров, 0 — всё в процессе сервера
+INGEST_WORKERS = int(os.environ.get("MBD_INGEST_WORKERS", "0"))
+INGEST_PUBLISH_INTERVAL = 0.2  # секунды между дельтами воркера
+
+# режим перегрузки (app/sampling.py): пока писатель не успевает за очередью
+# ингеста, окно задержек получает только часть строк, счётчики остаются точными
+SAMPLING_ENABLED = True
+SAMPLING_ENTER_LAG = INGEST_QUEUE_MAX_RECORDS // 2  # записей в очереди, чтобы включить
+SAMPLING_EXIT_LAG = INGEST_QUEUE_MAX_RECORDS // 10  # записей, чтобы выключить
+SAMPLING_MIN_RATE = 0.05  # не меньше этой доли строк применяется целиком
+SAMPLING_OUTLIER_RATIO = 2.0  # задержка >= ratio * avg ребра применяется всегда
+SAMPLING_CHECK_INTERVAL = 1.0  # секунды между подстройками доли
+
+# режим раздачи: "local" — граф в процессе Flask (dev-сервер),
+# "shared" — граф публикует run_ingest.py в разделяемую память, WSGI-воркеры читают
+SERVING_MODE = os.environ.get("MBD_SERVING_MODE", "local")
+SHARED_STATE_NAME = os.environ.get("MBD_SHARED_STATE_NAME", "mbd_graph")
+SHARED_STATE_SIZE = 64 * 1024 * 1024  # байты на оба слота
+SHARED_PUBLISH_INTERVAL = 0.5  # секунды
+# без публикаций дольше этого воркер переподключается к области по имени
+# (писатель мог перезапуститься), а если и там нет свежих данных — отвечает 503
+SHARED_STALE_AFTER = 10 * SHARED_PUBLISH_INTERVAL  # секунды
+
+# бюджет памяти графа (оценка, байты); None — без ограничения
+GRAPH_MAX_BYTES = 256 * 1024 * 1024
+# рёбра без обновлений дольше этого вытесняются (секунды); None — никогда
+GRAPH_EDGE_TTL = None
+GRAPH_SWEEP_INTERVAL = 5.0  # секунды между проходами вытеснения
+# схлопывание имён сервисов (regex, замена), см. app/normalize.py, например:
+#   from .normalize import POD_SUFFIX_RULES; NAME_RULES = POD_SUFFIX_RULES
+NAME_RULES = []
+# то же для маршрутов (srcRoute/dstRoute), например:
+#   from .normalize import ROUTE_ID_RULES; ROUTE_RULES = ROUTE_ID_RULES
+ROUTE_RULES = []
+# предел ?hops= для выборки окрестности сервиса в /api/graph
+GRAPH_MAX_HOPS = 5
+
+# лента последних строк логов (/api/logs?since=)
+RECENT_LOGS_SIZE = 200  # записей в кольце
+LOGS_QUERY_LIMIT = 500  # записей в одном ответе
+
+# сезонные базовые линии задержки для алертов (app/baselines.py);
+# таблица собирается офлайн: python -m app.baselines build --output ... logs/*.csv
+BASELINE_ENABLED = True
+BASELINE_FILE = os.path.join(BASE_DIR, "baselines.mbdb")
+BASELINE_ALPHA = 0.01  # вес нового замера в EWMA ячейки
+BASELINE_MIN_SAMPLES = 30  # замеров в ячейке, чтобы ей верить
+BASELINE_MAX_EDGES = 20_000  # рёбер в таблице (~2 КБ на ребро)
+BASELINE_Z_WARN = 3.0  # сглаженный z-score для warning
+BASELINE_Z_CRIT = 5.0  # и для critical
+# пороги по всем рёбрам (пока у ребра нет базовой линии) пересчитываются не чаще
+ALERT_THRESHOLD_INTERVAL = 1.0  # секунды
+
+# max-flow: источник потока (стоки — сервисы db*)
+FLOW_SOURCE = "api-gateway"
+# what-if сценарии (POST /api/scenarios)
+SCENARIO_WORKERS = 2  # процессы пула; 0 — считать в потоке запроса
+SCENARIO_MAX_BATCH = 32  # сценариев в одном запросе
+SCENARIO_CACHE_SIZE = 512  # результатов в кэше
+SCENARIO_FREEZE_INTERVAL = 5.0  # секунды, сколько живёт замороженная копия графа
+
+# живой гибридный рейтинг узких мест (app/scoring.py)
+SCORE_REFRESH_INTERVAL = 1.0  # секунды между пересчётами
+SCORE_FLOW_BUDGET = 0.05  # секунды max-flow/min-cut на один пересчёт
+SCORE_TRACE_WINDOW = 10_000  # последних путей трейсов в структурном сигнале
+SCORE_TRACE_MAX = 50_000  # незавершённых трейсов в памяти
+SCORE_WEIGHTS = (0.5, 0.25, 0.25)  # структура, задержка, ёмкость
@@ -0,0 +1,425 @@
+import math
+from datetime import datetime, timezone
+from itertools import accumulate, repeat
+from typing import Dict, List, Optional, Tuple
+
+# Пакетный разбор CSV-логов: на вход кусок байт, на выход — колонки
+# (списки) сразу для всех строк куска. Вся работа идёт по bytes, имена
+# сервисов и маршрутов декодируются один раз и берутся из кэша.
+#
+# Поддерживаются две схемы, определяются по числу колонок в строке:
+#   live  (6): timestamp,srcService,srcRoute,dstService,dstRoute,latency_ms
+#   trace (9): traceId,spanId,parentSpanId,timestamp,srcService,srcRoute,
+#              dstService,dstRoute,latency_ms
+
+LIVE_COLUMNS = 6
+TRACE_COLUMNS = 9
+
+_HEADER_PREFIXES = (b"traceid", b"timestamp")
+
+_NAMES: Dict[bytes, str] = {}
+_TIMESTAMPS: Dict[bytes, Optional[float]] = {}
+_CACHE_LIMIT = 100_000
+
+
+def _decode_name(raw: bytes) -> str:
+    return raw.strip().decode("utf-8", errors="replace")
+
+
+def _cached(cache: dict, column, convert) -> list:
+    """
+    Колонка через кэш: один map(dict.get) на всю колонку, конвертация
+    только для промахов. Значения, для которых convert вернул None, не кэшируются.
+    """
+    out = list(map(cache.get, column))
+    if None in out:
+        if len(cache) >= _CACHE_LIMIT:
+            cache.clear()
+        for i, value in enumerate(out):
+            if value is None:
+                raw = column[i]
+                value = convert(raw)
+                if value is not None:
+                    cache[raw] = value
+                out[i] = value
+    return out
+
+
+def _name(raw: bytes) -> str:
+    return _cached(_NAMES, (raw,), _decode_name)[0]
+
+
+def _timestamps(column) -> list:
+    out = list(map(_TIMESTAMPS.get, column))
+    if None not in out:
+        return out
+
+    if len(_TIMESTAMPS) >= _CACHE_LIMIT:
+        _TIMESTAMPS.clear()
+    get = _TIMESTAMPS.get
+    for i, value in enumerate(out):
+        if value is not None:
+            continue
+        raw = column[i]
+        # у trace-логов метки с микросекундами почти все уникальны: кэшируем
+        # секундную часть "YYYY-MM-DDTHH:MM:SS", а дробную добавляем отдельно
+        if len(raw) > 20 and raw[19:20] == b"." and raw.endswith(b"Z"):
+            head = raw[:19]
+            base = get(head)
+            if base is None:
+                base = parse_timestamp(head)
+                if base is None:
+                    continue
+                _TIMESTAMPS[head] = base
+            try:
+                out[i] = base + float(raw[19:-1])
+            except ValueError:
+                pass
+        else:
+            value = parse_timestamp(raw)
+            if value is not None:
+                _TIMESTAMPS[raw] = value
+                out[i] = value
+    return out
+
+
+def parse_timestamp(raw) -> Optional[float]:
+    """ISO-8601 (с 'Z' или смещением) или число -> unix-время в секундах, None если не разобрать."""
+    try:
+        s = raw.decode("ascii") if isinstance(raw, bytes) else raw
+        s = s.strip()
+        if s.endswith("Z"):
+            s = s[:-1] + "+00:00"
+        dt = datetime.fromisoformat(s)
+        if dt.tzinfo is None:
+            # логи без зоны считаем UTC, как и с 'Z'
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+    except (ValueError, UnicodeDecodeError):
+        pass
+    # push-ingest присылает и unix-время числом; nan/inf (и 1e400 из JSON) — не время
+    try:
+        ts = float(raw)
+    except (TypeError, ValueError):
+        return None
+    return ts if math.isfinite(ts) else None
+
+
+class LogBatch:
+    """
+    Колонки разобранных строк. Идентификаторы трейса есть только у trace-схемы.
+    Метки времени и идентификаторы хранятся как bytes и разбираются лениво:
+    большинству потребителей они не нужны.
+    """
+
+    __slots__ = (
+        "raw_timestamps", "src", "src_route", "dst", "dst_route", "latency", "raw_ids",
+        "ends", "consumed", "errors", "empty", "headers",
+        "_timestamps", "_ids",
+    )
+
+    def __init__(self):
+        self.raw_timestamps: List[bytes] = []
+        self.src: List[str] = []
+        self.src_route: List[str] = []
+        self.dst: List[str] = []
+        self.dst_route: List[str] = []
+        self.latency: List[float] = []
+        # (traceId, spanId, parentSpanId) колонками, None для live-схемы
+        self.raw_ids: Optional[Tuple[List[bytes], List[bytes], List[bytes]]] = None
+
+        # конец каждой строки в байтах от начала разобранного блока (если просили)
+        self.ends: Optional[List[int]] = None
+        # сколько байт входа поглощено, включая пустые и битые строки
+        self.consumed: int = 0
+
+        self.errors: int = 0
+        self.empty: int = 0
+        self.headers: int = 0
+
+        self._timestamps: Optional[List[Optional[float]]] = None
+        self._ids: Optional[Tuple[List[str], List[str], List[str]]] = None
+
+    def __len__(self) -> int:
+        return len(self.latency)
+
+    @property
+    def timestamps(self) -> List[Optional[float]]:
+        """Unix-время каждой строки; None, если метку не удалось разобрать."""
+        if self._timestamps is None:
+            self._timestamps = _timestamps(self.raw_timestamps)
+        return self._timestamps
+
+    def _decoded_ids(self) -> Optional[Tuple[List[str], List[str], List[str]]]:
+        if self.raw_ids is None:
+            return None
+        if self._ids is None:
+            self._ids = tuple(
+                [b.decode("utf-8", errors="replace") for b in col] for col in self.raw_ids
+            )
+        return self._ids
+
+    @property
+    def trace_id(self) -> Optional[List[str]]:
+        ids = self._decoded_ids()
+        return ids[0] if ids else None
+
+    @property
+    def span_id(self) -> Optional[List[str]]:
+        ids = self._decoded_ids()
+        return ids[1] if ids else None
+
+    @property
+    def parent_id(self) -> Optional[List[str]]:
+        ids = self._decoded_ids()
+        return ids[2] if ids else None
+
+    def records(self):
+        """(timestamp, src, src_route, dst, dst_route, latency) построчно."""
+        return zip(self.timestamps, self.src, self.src_route, self.dst, self.dst_route, self.latency)
+
+    def slice(self, start: int, stop: int) -> "LogBatch":
+        """Строки [start:stop]; consumed — байты до конца строки stop-1 (нужны ends)."""
+        part = LogBatch()
+        part.raw_timestamps = self.raw_timestamps[start:stop]
+        part.src = self.src[start:stop]
+        part.src_route = self.src_route[start:stop]
+        part.dst = self.dst[start:stop]
+        part.dst_route = self.dst_route[start:stop]
+        part.latency = self.latency[start:stop]
+        if self.raw_ids is not None:
+            part.raw_ids = tuple(col[start:stop] for col in self.raw_ids)
+        if self.ends is not None:
+            part.ends = self.ends[start:stop]
+            part.consumed = part.ends[-1] if part.ends else 0
+        return part
+
+    def extend(self, other: "LogBatch") -> None:
+        n, m = len(self), len(other)
+        if other.raw_ids is not None or self.raw_ids is not None:
+            mine = self.raw_ids or ([b""] * n, [b""] * n, [b""] * n)
+            theirs = other.raw_ids or ([b""] * m, [b""] * m, [b""] * m)
+            self.raw_ids = tuple(list(a) + list(b) for a, b in zip(mine, theirs))
+
+        self.raw_timestamps = list(self.raw_timestamps) + list(other.raw_timestamps)
+        self.src.extend(other.src)
+        self.src_route.extend(other.src_route)
+        self.dst.extend(other.dst)
+        self.dst_route.extend(other.dst_route)
+        self.latency.extend(other.latency)
+
+        if self.ends is not None and other.ends is not None:
+            self.ends.extend(e + self.consumed for e in other.ends)
+        self.consumed += other.consumed
+        self.errors += other.errors
+        self.empty += other.empty
+        self.headers += other.headers
+
+        self._timestamps = None
+        self._ids = None
+
+
+def _is_header(row: List[bytes]) -> bool:
+    return row[0].strip().lower().startswith(_HEADER_PREFIXES)
+
+
+def _split_flat(block: bytes):
+    """
+    Колонки блока без построчной работы: переводы строк становятся запятыми,
+    весь блок режется одним split, колонки — срезы с шагом width.
+    Возвращает (width, cols) или None, если строки блока не однородны.
+    """
+    n = block.count(b"\n")
+    if block.endswith(b"\n"):
+        block = block[:-1]
+    else:
+        n += 1
+
+    # ',\n' вместо '\n': первое поле каждой строки, кроме первой, начинается
+    # с '\n' — по их числу в первой колонке проверяем, что все строки одной ширины
+    flat = block.replace(b"\n", b",\n").split(b",")
+    width, extra = divmod(len(flat), n)
+    if extra or width not in (LIVE_COLUMNS, TRACE_COLUMNS):
+        return None
+
+    first = b"".join(flat[0::width])
+    if first.count(b"\n") != n - 1:
+        return None
+
+    cols = [first.split(b"\n")] + [flat[i::width] for i in range(1, width)]
+    return width, cols
+
+
+def _split_lines(lines: List[bytes]):
+    """То же для уже нарезанных строк (когда нужны смещения строк)."""
+    commas = set(map(bytes.count, lines, repeat(b",")))
+    if len(commas) != 1:
+        return None
+    width = commas.pop() + 1
+    if width not in (LIVE_COLUMNS, TRACE_COLUMNS):
+        return None
+    flat = b",".join(lines).split(b",")
+    return width, [flat[i::width] for i in range(width)]
+
+
+def _fast_columns(batch: LogBatch, width: int, cols: List[List[bytes]]) -> bool:
+    """Разбор однородного блока целиком по колонкам. False — есть битые строки."""
+    if width == LIVE_COLUMNS:
+        ts_c, src_c, sr_c, dst_c, dr_c, lat_c = cols
+    else:
+        tid_c, sid_c, pid_c, ts_c, src_c, sr_c, dst_c, dr_c, lat_c = cols
+
+    try:
+        latency = list(map(float, lat_c))
+    except ValueError:
+        return False
+
+    batch.raw_timestamps = ts_c
+    batch.latency = latency
+    batch.src = _cached(_NAMES, src_c, _decode_name)
+    batch.src_route = _cached(_NAMES, sr_c, _decode_name)
+    batch.dst = _cached(_NAMES, dst_c, _decode_name)
+    batch.dst_route = _cached(_NAMES, dr_c, _decode_name)
+
+    if width == TRACE_COLUMNS:
+        batch.raw_ids = (tid_c, sid_c, pid_c)
+    return True
+
+
+def _slow_rows(batch: LogBatch, rows: List[List[bytes]], ends: Optional[List[int]]) -> None:
+    """Построчный разбор с подсчётом ошибок — для смешанных и битых блоков."""
+    has_trace = any(len(r) == TRACE_COLUMNS for r in rows)
+    if has_trace:
+        batch.raw_ids = ([], [], [])
+    kept_ends: Optional[List[int]] = [] if ends is not None else None
+
+    for i, row in enumerate(rows):
+        width = len(row)
+        if width == 1 and not row[0].strip():
+            batch.empty += 1
+            continue
+        if width not in (LIVE_COLUMNS, TRACE_COLUMNS):
+            batch.errors += 1
+            continue
+        if _is_header(row):
+            batch.headers += 1
+            continue
+
+        if width == LIVE_COLUMNS:
+            ts_b, src_b, sr_b, dst_b, dr_b, lat_b = row
+            ids = (b"", b"", b"")
+        else:
+            tid_b, sid_b, pid_b, ts_b, src_b, sr_b, dst_b, dr_b, lat_b = row
+            ids = (tid_b.strip(), sid_b.strip(), pid_b.strip())
+
+        try:
+            latency = float(lat_b)
+        except ValueError:
+            batch.errors += 1
+            continue
+        batch.raw_timestamps.append(ts_b)
+        batch.src.append(_name(src_b))
+        batch.src_route.append(_name(sr_b))
+        batch.dst.append(_name(dst_b))
+        batch.dst_route.append(_name(dr_b))
+        batch.latency.append(latency)
+        if has_trace:
+            for col, value in zip(batch.raw_ids, ids):
+                col.append(value)
+        if kept_ends is not None:
+            kept_ends.append(ends[i])
+
+    batch.ends = kept_ends
+
+
+def parse_block(block: bytes, track_offsets: bool = False) -> LogBatch:
+    """Разбирает блок целых строк (последняя строка может быть без '\\n')."""
+    batch = LogBatch()
+    batch.consumed = len(block)
+    if not block:
+        batch.ends = [] if track_offsets else None
+        return batch
+
+    # заголовок встречается только первой строкой файла
+    header = block[:9].lower().startswith(_HEADER_PREFIXES)
+
+    if not track_offsets and b"\r" not in block and b"\x00" not in block:
+        body = block
+        if header:
+            cut = block.find(b"\n")
+            body = block[cut + 1:] if cut >= 0 else b""
+        split = _split_flat(body) if body else None
+        if split and _fast_columns(batch, *split):
+            batch.headers = int(header)
+            return batch
+        if header and not body:
+            batch.headers = 1
+            return batch
+
+    lines = block.split(b"\n")
+    if lines[-1] == b"":
+        lines.pop()
+
+    ends = list(accumulate(len(line) + 1 for line in lines)) if track_offsets else None
+    if ends and not block.endswith(b"\n"):
+        ends[-1] -= 1
+
+    if b"\r" in block:
+        lines = [line.rstrip(b"\r") for line in lines]
+
+    start = 1 if header else 0
+    body_lines = lines[start:] if start else lines
+    split = _split_lines(body_lines) if body_lines else None
+    if split and _fast_columns(batch, *split):
+        batch.headers = start
+        if ends is not None:
+            batch.ends = ends[start:] if start else ends
+        return batch
+
+    _slow_rows(batch, [line.split(b",") for line in lines], ends)
+    return batch
+
+
+class BatchParser:
+    """
+    Потоковый парсер: feed() принимает произвольные куски байт,
+    хвост без перевода строки остаётся до следующего куска.
+    """
+
+    def __init__(self, track_offsets: bool = False):
+        self.track_offsets = track_offsets
+        self._rest = b""
+
+        self.rows = 0
+        self.errors = 0
+        self.empty = 0
+        self.headers = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._rest)
+
+    def _account(self, batch: LogBatch) -> LogBatch:
+        self.rows += len(batch)
+        self.errors += batch.errors
+        self.empty += batch.empty
+        self.headers += batch.headers
+        return batch
+
+    def feed(self, data: bytes) -> LogBatch:
+        if self._rest:
+            data = self._rest + data
+        cut = data.rfind(b"\n")
+        if cut < 0:
+            self._rest = data
+            return parse_block(b"", self.track_offsets)
+        self._rest = data[cut + 1:]
+        return self._account(parse_block(data[:cut + 1], self.track_offsets))
+
+    def flush(self) -> LogBatch:
+        """Разбирает остаток как последнюю строку (конец файла)."""
+        rest, self._rest = self._rest, b""
+        return self._account(parse_block(rest, self.track_offsets))
+
+    def reset(self) -> None:
+        self._rest = b""
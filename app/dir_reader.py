@@ -0,0 +1,302 @@
+import asyncio
+import glob
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from threading import Thread
+from typing import Callable, Deque, Dict, List, Optional, Set
+
+from .compressed import CompressionError, DecompressingReader, open_log, raw_tell
+from .config import READ_CHUNK_SIZE
+from .csv_parser import BatchParser, LogBatch
+from .ingest import IngestPipeline, QueueFull
+from .metrics import REGISTRY, STAGE_SECONDS
+
+DIR_FILES = REGISTRY.gauge("mbd_dir_reader_files", "Log files tailed by the directory reader")
+DIR_LAG = REGISTRY.gauge("mbd_dir_reader_lag_bytes", "Unread bytes summed over all tailed files")
+DIR_LINES = REGISTRY.counter(
+    "mbd_dir_reader_lines_total", "Log lines read by the directory reader by result", ["result"]
+)
+REORDER_BUFFERED = REGISTRY.gauge("mbd_reorder_buffer_records", "Records held in the timestamp reorder buffer")
+REORDER_LATE = REGISTRY.counter(
+    "mbd_reorder_late_total", "Records released after a newer timestamp (outside the reorder window)"
+)
+_PARSE_TIME = STAGE_SECONDS.labels(stage="parse")
+
+_NO_TS = float("-inf")
+
+# Один event loop на все файлы: чтение обычного файла из page cache не
+# блокирует надолго, поэтому читаем прямо в корутинах, кусками по chunk_size,
+# и отдаём управление после каждого куска, чтобы ни один файл не забивал остальные.
+
+
+class _Chunk:
+    """Прочитанный кусок файла: смещение можно зафиксировать, когда применены все его строки."""
+
+    __slots__ = ("end", "pending")
+
+    def __init__(self, end: int, pending: int):
+        self.end = end
+        self.pending = pending
+
+
+class _Tail:
+    def __init__(self, path: str, offset: int):
+        self.path = path
+        self.file = open_log(path, offset)
+        self.inode = os.fstat(self.file.fileno()).st_ino
+
+        # position — всё до него применено; read_pos — докуда прочитано
+        self.position = offset
+        self.read_pos = offset
+        self.parser = BatchParser()
+        self.chunks: Deque[_Chunk] = deque()
+        self.closed = False
+
+    def commit(self) -> None:
+        """Вызывается писателем под gs.lock после применения строк этого файла."""
+        chunks = self.chunks
+        while chunks and chunks[0].pending == 0:
+            self.position = chunks.popleft().end
+
+    def lag(self) -> int:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return 0
+        if isinstance(self.file, DecompressingReader):
+            # позиции сжатого файла в распакованных байтах — считаем по сжатым
+            return max(0, size - self.file.raw_tell())
+        return max(0, size - self.position)
+
+    def rotated(self) -> bool:
+        """Файл по пути подменили (logrotate) или обрезали."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return True
+        return st.st_ino != self.inode or st.st_size < raw_tell(self.file)
+
+    def close(self) -> None:
+        self.closed = True
+        self.file.close()
+
+
+class DirectoryReader:
+    """
+    Хвосты всех файлов по glob-шаблону в одном asyncio-цикле. Строки сводятся
+    в общий поток через буфер переупорядочивания: запись уходит в IngestPipeline,
+    когда самая свежая увиденная метка времени обогнала её на reorder_window
+    секунд, или когда входящих данных не было дольше reorder_window.
+    """
+
+    def __init__(self, pipeline: IngestPipeline, pattern: str, poll_interval: float = 0.5,
+                 reorder_window: float = 1.0, chunk_size: int = READ_CHUNK_SIZE,
+                 max_buffered: int = 50_000, emit_batch: int = 2048,
+                 start_offset: Optional[Callable[[str], int]] = None):
+        self.pipeline = pipeline
+        self.pattern = pattern
+        self.poll_interval = poll_interval
+        self.reorder_window = reorder_window
+        self.chunk_size = chunk_size
+        self.max_buffered = max_buffered
+        self.emit_batch = emit_batch
+        self._start_offset = start_offset
+
+        self.tails: Dict[str, _Tail] = {}
+        # файлы, которые не прочитать (битое сжатие, нет zstandard): не
+        # переоткрываем на каждом проходе, пока они не пропадут из glob
+        self.skipped: Set[str] = set()
+        # (timestamp, seq, batch, row, tail, chunk)
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._max_ts = _NO_TS
+        self._released_ts = _NO_TS
+        self._last_input = time.monotonic()
+
+        self._parsed = DIR_LINES.labels(result="parsed")
+        self._dropped = DIR_LINES.labels(result="dropped")
+        self._empty = DIR_LINES.labels(result="empty")
+        DIR_FILES.set_function(lambda: len(self.tails))
+        DIR_LAG.set_function(self.lag_bytes)
+        REORDER_BUFFERED.set_function(lambda: len(self._heap))
+
+    def lag_bytes(self) -> int:
+        return sum(t.lag() for t in list(self.tails.values()))
+
+    def offsets(self) -> Dict[str, int]:
+        return {path: t.position for path, t in list(self.tails.items())}
+
+    # ---------- файлы ----------
+
+    def _open(self, path: str, offset: Optional[int] = None) -> Optional[_Tail]:
+        if offset is None:
+            offset = self._start_offset(path) if self._start_offset else 0
+        try:
+            tail = _Tail(path, offset)
+        except OSError as e:
+            print(f">>> Cannot open {path}: {e}")
+            return None
+        except CompressionError as e:
+            print(f">>> Skipping {path}: {e}")
+            self.skipped.add(path)
+            return None
+        self.tails[path] = tail
+        return tail
+
+    async def _scan(self):
+        while True:
+            found = set(glob.glob(self.pattern))
+            self.skipped &= found
+            for path in sorted(found - set(self.tails) - self.skipped):
+                tail = self._open(path)
+                if tail is not None:
+                    asyncio.ensure_future(self._follow(tail))
+            for path in set(self.tails) - found:
+                # удалённый файл: дочитывать нечего
+                self.tails.pop(path).close()
+            await asyncio.sleep(self.poll_interval)
+
+    async def _follow(self, tail: _Tail):
+        while not tail.closed:
+            while len(self._heap) >= self.max_buffered:
+                await asyncio.sleep(0.01)
+
+            try:
+                chunk = tail.file.read(self.chunk_size)
+            except (OSError, ValueError):
+                return
+            except CompressionError as e:
+                # дочитанное до ошибки уже в буфере; хвост остаётся в tails, чтобы его не переоткрыть
+                print(f">>> Skipping rest of {tail.path}: {e}")
+                self._ingest(tail, b"", final=True)
+                return
+            if chunk:
+                self._ingest(tail, chunk)
+                await asyncio.sleep(0)
+                continue
+
+            if tail.rotated():
+                # старый файл дочитан — хвост начинаем заново с нового
+                self._ingest(tail, b"", final=True)
+                tail.close()
+                if self.tails.get(tail.path) is tail:
+                    del self.tails[tail.path]
+                    if os.path.exists(tail.path):
+                        new = self._open(tail.path, offset=0)
+                        if new is not None:
+                            asyncio.ensure_future(self._follow(new))
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    def _ingest(self, tail: _Tail, data: bytes, final: bool = False) -> None:
+        base = tail.read_pos
+        t0 = time.perf_counter()
+        batch = tail.parser.flush() if final else tail.parser.feed(data)
+        _PARSE_TIME.observe(time.perf_counter() - t0)
+        tail.read_pos = base + batch.consumed
+
+        self._parsed.inc(len(batch))
+        if batch.errors:
+            self._dropped.inc(batch.errors)
+        if batch.empty:
+            self._empty.inc(batch.empty)
+
+        n = len(batch)
+        chunk = _Chunk(tail.read_pos, n)
+        tail.chunks.append(chunk)
+        if n == 0:
+            return
+
+        self._last_input = time.monotonic()
+        push, seq, heap = heapq.heappush, self._seq, self._heap
+        for i, ts in enumerate(batch.timestamps):
+            if ts is None:
+                # без метки времени упорядочивать не по чему — отпускаем сразу
+                ts = _NO_TS
+            elif ts > self._max_ts:
+                self._max_ts = ts
+            push(heap, (ts, next(seq), batch, i, tail, chunk))
+
+    # ---------- буфер переупорядочивания ----------
+
+    def _release(self, everything: bool = False) -> List[tuple]:
+        heap = self._heap
+        watermark = float("inf") if everything else self._max_ts - self.reorder_window
+        out = []
+        while heap and heap[0][0] <= watermark and len(out) < self.emit_batch:
+            out.append(heapq.heappop(heap))
+        return out
+
+    def _build(self, entries: List[tuple]):
+        batch = LogBatch()
+        ts_col, src, src_route, dst, dst_route, latency = (
+            batch.raw_timestamps, batch.src, batch.src_route, batch.dst, batch.dst_route, batch.latency
+        )
+        # идентификаторы трейса — если они есть хоть у одной строки (trace-схема)
+        ids = None
+        if any(e[2].raw_ids is not None for e in entries):
+            ids = batch.raw_ids = ([], [], [])
+        pending: Dict[_Chunk, int] = {}
+        tails = set()
+        late = 0
+        for ts, _, b, i, tail, chunk in entries:
+            if ts >= self._released_ts:
+                self._released_ts = ts
+            elif ts != _NO_TS:
+                late += 1
+            ts_col.append(b.raw_timestamps[i])
+            src.append(b.src[i])
+            src_route.append(b.src_route[i])
+            dst.append(b.dst[i])
+            dst_route.append(b.dst_route[i])
+            latency.append(b.latency[i])
+            if ids is not None:
+                for col, raw in zip(ids, b.raw_ids or (None, None, None)):
+                    col.append(raw[i] if raw is not None else b"")
+            pending[chunk] = pending.get(chunk, 0) + 1
+            tails.add(tail)
+        if late:
+            REORDER_LATE.inc(late)
+
+        def on_applied():
+            for chunk, count in pending.items():
+                chunk.pending -= count
+            for tail in tails:
+                tail.commit()
+
+        return batch, on_applied
+
+    async def _emit(self):
+        tick = max(0.01, min(self.poll_interval, self.reorder_window / 4))
+        while True:
+            idle = time.monotonic() - self._last_input > self.reorder_window
+            entries = self._release(everything=idle)
+            if not entries:
+                await asyncio.sleep(tick)
+                continue
+
+            batch, on_applied = self._build(entries)
+            # ждём места, не блокируя цикл, — хвосты тем временем упрутся в max_buffered
+            while self.pipeline.free < len(batch) and self.pipeline.depth:
+                await asyncio.sleep(0.05)
+            while True:
+                try:
+                    self.pipeline.submit(batch, source="dir", on_applied=on_applied)
+                    break
+                except QueueFull:
+                    await asyncio.sleep(0.05)
+            await asyncio.sleep(0)
+
+    async def run(self):
+        await asyncio.gather(self._scan(), self._emit())
+
+    def run_blocking(self):
+        asyncio.run(self.run())
+
+    def start(self) -> Thread:
+        t = Thread(target=self.run_blocking, name="DirectoryReader", daemon=True)
+        t.start()
+        return t
@@ -1,39 +1,85 @@
 import networkx as nx
-from typing import Dict, Tuple
+from typing import Dict, Iterable, List, Tuple
+from .metrics import STAGE_SECONDS
 from .models import EdgeMetrics, NodeMetrics
 
+_ANALYZE_TIME = STAGE_SECONDS.labels(stage="analyze")
+
+# пропускная способность ребра без замеров задержки
+FALLBACK_CAPACITY = 9999.0
+
+
+def is_db(name: str) -> bool:
+    """Сервис-БД (db-*, DB-*) — сток для max-flow и конец пути трейса."""
+    return name.lower().startswith("db")
+
+
+def default_sinks(node_names: Iterable[str]) -> List[str]:
+    names = list(node_names)
+    sinks = [name for name in names if is_db(name)]
+    return sinks or names
+
 
 class FlowAnalyzer:
-    def __init__(self, source_node: str = "api-gateway"):
+    def __init__(self, source_node: str = "api-gateway", verbose: bool = True):
         self.source_node = source_node
+        # verbose=False — без построчного отчёта (what-if сценарии, фоновые пересчёты)
+        self.verbose = verbose
 
     @staticmethod
     def edge_capacity(metrics: EdgeMetrics) -> float:
         if metrics.avg_latency and metrics.avg_latency > 0:
             return 1.0 / metrics.avg_latency
-        return 9999.0  # fallback
+        return FALLBACK_CAPACITY
+
+    def _log(self, *args) -> None:
+        if self.verbose:
+            print(*args)
 
     def analyze(
         self,
         nodes: Dict[str, NodeMetrics],
         edges: Dict[Tuple[str, str], EdgeMetrics],
     ) -> tuple[float, set[Tuple[str, str]]]:
+        with _ANALYZE_TIME.time():
+            return self._analyze(nodes, edges)
 
-        print("\n================= ПЕРЕСЧЁТ ПОТОКОВ (MAX-FLOW / MIN-CUT) =================")
+    def _analyze(
+        self,
+        nodes: Dict[str, NodeMetrics],
+        edges: Dict[Tuple[str, str], EdgeMetrics],
+    ) -> tuple[float, set[Tuple[str, str]]]:
 
-        G = nx.DiGraph()
+        self._log("\n================= ПЕРЕСЧЁТ ПОТОКОВ (MAX-FLOW / MIN-CUT) =================")
 
-        print("Добавляем рёбра в граф:")
+        capacities = {}
+        self._log("Добавляем рёбра в граф:")
         for (src, dst), metrics in edges.items():
             cap = self.edge_capacity(metrics)
-            print(f"  {src} → {dst}: avg={metrics.avg_latency:.1f} ms, capacity={cap:.5f}, calls={metrics.count}")
-            G.add_edge(src, dst, capacity=cap)
+            self._log(f"  {src} → {dst}: avg={metrics.avg_latency:.1f} ms, capacity={cap:.5f}, calls={metrics.count}")
+            capacities[(src, dst)] = cap
+
+        total_flow, bottlenecks = self.analyze_capacities(nodes, capacities)
+
+        self._log("\n================= ИТОГИ ПОТОКОВ =================")
+        self._log(f"Глобальный максимальный поток: {total_flow}")
+        self._log("Найденные бутылочные горлышки:", bottlenecks)
+        self._log("=======================================================================\n")
+
+        return total_flow, bottlenecks
 
-        sinks = [name for name in nodes if name.startswith("db")]
-        if not sinks:
-            sinks = list(nodes.keys())
+    def analyze_capacities(
+        self,
+        node_names: Iterable[str],
+        capacities: Dict[Tuple[str, str], float],
+    ) -> tuple[float, set[Tuple[str, str]]]:
+        """Max-flow от source_node до стоков и рёбра min-cut по заданным пропускным способностям."""
+        G = nx.DiGraph()
+        for (src, dst), cap in capacities.items():
+            G.add_edge(src, dst, capacity=cap)
 
-        print("\nСтоки (targets):", sinks)
+        sinks = default_sinks(node_names)
+        self._log("\nСтоки (targets):", sinks)
 
         total_flow = 0.0
         bottlenecks: set[Tuple[str, str]] = set()
@@ -42,40 +88,27 @@ class FlowAnalyzer:
             if target == self.source_node:
                 continue
 
-            print(f"\n--- Анализ пути: {self.source_node} → {target} ---")
+            self._log(f"\n--- Анализ пути: {self.source_node} → {target} ---")
 
             try:
-                flow_val, _ = nx.maximum_flow(G, self.source_node, target)
+                # разрез с учётом пропускных способностей: его величина и есть max-flow,
+                # рёбра разреза — те, что ограничивают поток
+                flow_val, (reachable, _) = nx.minimum_cut(G, self.source_node, target)
                 total_flow += flow_val
-                print(f"Максимальный поток = {flow_val:.5f}")
+                self._log(f"Максимальный поток = {flow_val:.5f}")
 
-                cut = nx.minimum_edge_cut(G, self.source_node, target)
+                cut = [(u, v) for u in reachable for v in G.successors(u) if v not in reachable]
 
                 if not cut:
-                    print("Min-cut пустой — узких мест нет.")
+                    self._log("Min-cut пустой — узких мест нет.")
                 else:
-                    print("Min-cut рёбра (узкие места):")
+                    self._log("Min-cut рёбра (узкие места):")
                     for u, v in cut:
-                        m = edges.get((u, v))
-                        if m:
-                            avg = m.avg_latency
-                            cap = self.edge_capacity(m)
-                            cnt = m.count
-                            print(
-                                f"  {u} → {v}: avg={avg:.1f} ms, capacity={cap:.5f}, calls={cnt}"
-                            )
-                            print("    Причина: это ребро ограничивает поток и попало в min-cut.")
-                        else:
-                            print(f"  {u} → {v}: нет метрик, но ребро в min-cut.")
+                        self._log(f"  {u} → {v}: capacity={capacities[(u, v)]:.5f}")
                         bottlenecks.add((u, v))
 
             except Exception as e:
-                print(f"[ОШИБКА] Не удалось вычислить поток до {target}: {e}")
+                self._log(f"[ОШИБКА] Не удалось вычислить поток до {target}: {e}")
                 continue
 
-        print("\n================= ИТОГИ ПОТОКОВ =================")
-        print(f"Глобальный максимальный поток: {round(total_flow, 4)}")
-        print("Найденные бутылочные горлышки:", bottlenecks)
-        print("=======================================================================\n")
-
         return round(total_flow, 4), bottlenecks
@@ -0,0 +1,203 @@
+import heapq
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# Индексы для выборок из графа без полного export():
+#   - списки смежности для k-hop окрестности сервиса;
+#   - отсортированные рейтинги рёбер (задержка, p99, гибридный score) для top-K;
+#   - множества узлов по статусу для фильтров.
+#
+# На ингесте индекс только помечает затронутые рёбра и узлы (set.add),
+# пересчёт значений и перестановка в рейтингах — при первом запросе после
+# изменений и только для помеченных. p99 по окну ребра стоит сортировки
+# окна, поэтому делать его на каждую строку лога нельзя.
+
+Key = Tuple[str, str]
+
+# порядок значений в кортеже, который возвращает edge_values
+SORT_KEYS = ("latency", "p99", "score")
+STATUSES = ("normal", "warning", "critical")
+
+# insort сдвигает список рейтинга на каждое ребро, то есть O(E) за вставку.
+# Если помечена заметная доля рёбер (после снапшота, слияния дельт воркеров,
+# пересчёта score всех рёбер), рейтинги дешевле отсортировать заново
+REBUILD_DIRTY_SHARE = 0.125
+
+
+class GraphIndex:
+    def __init__(self, edge_values: Callable[[Key], Tuple[float, float, float]],
+                 node_status: Callable[[str], str]):
+        self._edge_values = edge_values
+        self._node_status = node_status
+
+        self.out: Dict[str, Set[str]] = {}
+        self.inc: Dict[str, Set[str]] = {}
+
+        self.values: Dict[Key, Tuple[float, float, float]] = {}
+        # по рейтингу на метрику: (-значение, ключ) по возрастанию = по убыванию значения
+        self._rank: List[List[Tuple[float, Key]]] = [[] for _ in SORT_KEYS]
+        self.status: Dict[str, str] = {}
+        self.by_status: Dict[str, Set[str]] = {s: set() for s in STATUSES}
+
+        self._dirty_edges: Set[Key] = set()
+        self._dirty_nodes: Set[str] = set()
+
+    # ---------- изменения графа (вызываются под gs.lock) ----------
+
+    def add_edge(self, key: Key) -> None:
+        src, dst = key
+        self.out.setdefault(src, set()).add(dst)
+        self.inc.setdefault(dst, set()).add(src)
+        self.out.setdefault(dst, set())
+        self.inc.setdefault(src, set())
+        self._dirty_edges.add(key)
+        self._dirty_nodes.add(dst)
+        self._dirty_nodes.add(src)
+
+    def touch(self, key: Key) -> None:
+        self._dirty_edges.add(key)
+        self._dirty_nodes.add(key[1])
+
+    def touch_node(self, name: str) -> None:
+        """Изменились метрики узла (например, bottleneck_score) — рёбра в него тоже."""
+        self._dirty_nodes.add(name)
+        for src in self.inc.get(name, ()):
+            self._dirty_edges.add((src, name))
+
+    def remove_edge(self, key: Key) -> None:
+        src, dst = key
+        self.out.get(src, set()).discard(dst)
+        self.inc.get(dst, set()).discard(src)
+        self._unrank(key)
+        self._dirty_edges.discard(key)
+        self._dirty_nodes.add(dst)
+
+    def remove_node(self, name: str) -> None:
+        self.out.pop(name, None)
+        self.inc.pop(name, None)
+        status = self.status.pop(name, None)
+        if status is not None:
+            self.by_status[status].discard(name)
+        self._dirty_nodes.discard(name)
+
+    def rebuild(self, edges: Iterable[Key], nodes: Iterable[str] = ()) -> None:
+        """С нуля — после подмены графа целиком (снапшот)."""
+        self.out, self.inc, self.values, self.status = {}, {}, {}, {}
+        self._rank = [[] for _ in SORT_KEYS]
+        self.by_status = {s: set() for s in STATUSES}
+        self._dirty_edges, self._dirty_nodes = set(), set()
+        for name in nodes:
+            self.out.setdefault(name, set())
+            self.inc.setdefault(name, set())
+            self._dirty_nodes.add(name)
+        for key in edges:
+            self.add_edge(key)
+
+    # ---------- ленивый пересчёт ----------
+
+    def _unrank(self, key: Key) -> None:
+        old = self.values.pop(key, None)
+        if old is None:
+            return
+        for rank, value in zip(self._rank, old):
+            i = bisect_left(rank, (-value, key))
+            if i < len(rank) and rank[i][1] == key:
+                del rank[i]
+
+    def _rerank(self) -> None:
+        for i, rank in enumerate(self._rank):
+            rank[:] = sorted((-values[i], key) for key, values in self.values.items())
+
+    def refresh(self) -> None:
+        if self._dirty_edges:
+            if len(self._dirty_edges) > REBUILD_DIRTY_SHARE * len(self.values):
+                for key in self._dirty_edges:
+                    values = self._edge_values(key)
+                    if values is None:
+                        # ребро успели вытеснить
+                        self.values.pop(key, None)
+                    else:
+                        self.values[key] = values
+                self._rerank()
+            else:
+                for key in self._dirty_edges:
+                    self._unrank(key)
+                    values = self._edge_values(key)
+                    if values is None:
+                        continue
+                    self.values[key] = values
+                    for rank, value in zip(self._rank, values):
+                        insort(rank, (-value, key))
+            self._dirty_edges.clear()
+
+        if self._dirty_nodes:
+            for name in self._dirty_nodes:
+                if name not in self.out:
+                    continue
+                new = self._node_status(name)
+                old = self.status.get(name)
+                if old != new:
+                    if old is not None:
+                        self.by_status[old].discard(name)
+                    self.by_status.setdefault(new, set()).add(name)
+                    self.status[name] = new
+            self._dirty_nodes.clear()
+
+    # ---------- выборки ----------
+
+    def khop(self, service: str, hops: int) -> Set[str]:
+        """Сервисы не дальше hops шагов от service в обе стороны."""
+        seen = {service}
+        frontier = deque([(service, 0)])
+        while frontier:
+            name, depth = frontier.popleft()
+            if depth == hops:
+                continue
+            for nxt in self.out.get(name, ()) | self.inc.get(name, ()):
+                if nxt not in seen:
+                    seen.add(nxt)
+                    frontier.append((nxt, depth + 1))
+        return seen
+
+    def ranking(self, sort: str) -> List[Tuple[float, Key]]:
+        """Весь рейтинг метрики: (-значение, ребро) по убыванию значения. Только для чтения."""
+        return self._rank[SORT_KEYS.index(sort)]
+
+    def top(self, sort: str, k: int, edges: Optional[Iterable[Key]] = None) -> List[Key]:
+        """K рёбер с наибольшим значением метрики — из рейтинга или из данного подмножества."""
+        i = SORT_KEYS.index(sort)
+        if edges is None:
+            return [key for _, key in self._rank[i][:k]]
+        values = self.values
+        return heapq.nlargest(k, (e for e in edges if e in values), key=lambda e: values[e][i])
+
+    def select(self, service: Optional[str] = None, hops: int = 1, top: Optional[int] = None,
+               sort: str = "latency", statuses: Optional[Iterable[str]] = None):
+        """
+        (узлы, рёбра) выборки; None вместо множества — «все».
+          service+hops — окрестность сервиса;
+          statuses     — сервисы с этими статусами и рёбра в них (вызывающие — как контекст);
+          top+sort     — K худших рёбер среди оставшихся.
+        """
+        self.refresh()
+        nodes: Optional[Set[str]] = self.khop(service, hops) if service is not None else None
+        edges: Optional[List[Key]] = None
+
+        targets: Set[str] = set()
+        if statuses:
+            for status in statuses:
+                targets |= self.by_status.get(status, set())
+            if nodes is not None:
+                targets &= nodes
+            edges = [(src, dst) for dst in targets for src in self.inc.get(dst, ())
+                     if nodes is None or src in nodes]
+        elif nodes is not None:
+            edges = [(src, dst) for src in nodes for dst in self.out.get(src, ()) if dst in nodes]
+
+        if top is not None:
+            edges = self.top(sort, top, edges)
+            nodes = {name for key in edges for name in key}
+        elif statuses:
+            nodes = targets | {name for key in edges for name in key}
+        return nodes, edges
@@ -1,37 +1,365 @@
 # app/graph_state.py
-from typing import Dict, Tuple
-from collections import deque
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from threading import RLock
+import time
 
-from .models import NodeMetrics, EdgeMetrics
+from .config import (
+    GRAPH_EDGE_TTL,
+    GRAPH_MAX_BYTES,
+    GRAPH_SWEEP_INTERVAL,
+    NAME_RULES,
+    RECENT_LOGS_SIZE,
+    ROUTE_RULES,
+)
+from .models import NodeMetrics, EdgeMetrics, latency_status
+from .graph_index import GraphIndex
+from .log_buffer import LogRingBuffer
+from .metrics import REGISTRY, STAGE_SECONDS
+from .normalize import NameNormalizer
+
+_UPDATE_TIME = STAGE_SECONDS.labels(stage="update")
+_EXPORT_TIME = STAGE_SECONDS.labels(stage="export")
+_SWEEP_TIME = STAGE_SECONDS.labels(stage="sweep")
+
+GRAPH_EVICTED = REGISTRY.counter(
+    "mbd_graph_evicted_total", "Edges and nodes evicted from the graph by reason", ["kind", "reason"]
+)
+GRAPH_BYTES = REGISTRY.gauge("mbd_graph_bytes", "Estimated memory held by graph nodes and edges")
+
+# оценка памяти узла: NodeMetrics с пустыми списками, имя, слот словаря
+_NODE_BYTES = 600
+
+RouteKey = Tuple[str, str, str, str]  # (src, src_route, dst, dst_route)
+
+
+def route_view(service: str, rows, bottlenecks=()) -> dict:
+    """
+    Подграф маршрутов вокруг service. rows — (route_key, count, last_latency, avg_latency)
+    для рёбер, у которых service — источник или приёмник. Узел — пара (сервис, маршрут),
+    сервисы отдаются родительскими (compound) узлами.
+    """
+    bottlenecks = set(bottlenecks)
+    nodes: Dict[str, dict] = {}
+    parents: Dict[str, dict] = {}
+    incoming: Dict[str, List[Tuple[int, float]]] = {}
+    edges_out = []
+
+    def node_id(svc: str, route: str) -> str:
+        if svc not in parents:
+            parents[svc] = {"id": svc, "label": svc, "level": "service", "focus": svc == service}
+        nid = f"{svc}::{route}"
+        if nid not in nodes:
+            nodes[nid] = {"id": nid, "label": route or "*", "parent": svc, "service": svc,
+                          "route": route, "level": "route"}
+            incoming[nid] = []
+        return nid
+
+    for (src, sr, dst, dr), count, last, avg in rows:
+        a, b = node_id(src, sr), node_id(dst, dr)
+        incoming[b].append((count, avg))
+        edges_out.append({
+            "id": f"{a}->{b}",
+            "source": a,
+            "target": b,
+            "latency": last,
+            "avg_latency": avg,
+            "capacity": round(1.0 / avg, 4) if avg else None,
+            "count": count,
+            "is_bottleneck": (src, dst) in bottlenecks,
+        })
+
+    for nid, node in nodes.items():
+        calls = incoming[nid]
+        load = sum(c for c, _ in calls)
+        avg = sum(c * a for c, a in calls) / load if load else 0.0
+        node.update({"load": load, "avg_latency": avg, "status": latency_status(avg), "bottleneck_score": 0.0})
+
+    return {
+        "service": service,
+        "level": "route",
+        "nodes": list(parents.values()) + list(nodes.values()),
+        "edges": edges_out,
+        "bottlenecks": [f"{u}->{v}" for (u, v) in bottlenecks if service in (u, v)],
+    }
 
 
 class GraphState:
-    def __init__(self):
+    def __init__(self, max_bytes: Optional[int] = GRAPH_MAX_BYTES, edge_ttl: Optional[float] = GRAPH_EDGE_TTL,
+                 sweep_interval: float = GRAPH_SWEEP_INTERVAL, name_rules: Sequence[Tuple[str, str]] = NAME_RULES,
+                 route_rules: Sequence[Tuple[str, str]] = ROUTE_RULES):
         self.nodes: Dict[str, NodeMetrics] = {}
         self.edges: Dict[Tuple[str, str], EdgeMetrics] = {}
+        # второй уровень: рёбра между маршрутами и индекс "ребро сервисов -> его маршруты"
+        self.route_edges: Dict[RouteKey, EdgeMetrics] = {}
+        self._routes_by_edge: Dict[Tuple[str, str], Set[RouteKey]] = {}
+        # смежность, рейтинги рёбер и статусы узлов для выборок без полного export
+        self.index = GraphIndex(self._edge_values, self._node_status)
+        # ScoringEngine, если запущен: гибридный score рёбер и bottleneck_score узлов
+        self.scorer = None
+        # AdaptiveSampler, если ингест может перегружаться (см. app/sampling.py)
+        self.sampler = None
+
+        # бюджет памяти: рёбра, простаивающие дольше edge_ttl, вытесняются,
+        # а при превышении max_bytes — самые давно не обновлявшиеся (LRU)
+        self.max_bytes = max_bytes
+        self.edge_ttl = edge_ttl
+        self.sweep_interval = sweep_interval
+        self.normalize = NameNormalizer(name_rules)
+        self.normalize_route = NameNormalizer(route_rules)
+        self.bytes_used = 0
+        self.evicted_edges = 0
+        self.evicted_nodes = 0
+        self.evicted_logs = 0  # строки, учтённые в total_logs рёбрами, которых уже нет
+        self._last_sweep = time.time()
 
         self.total_logs: int = 0
-        self.recent_logs = deque(maxlen=200)
+        self.recent_logs = LogRingBuffer(RECENT_LOGS_SIZE)
+        # растёт при любом изменении рёбер — по нему кэшируют производные расчёты
+        self.version: int = 0
 
         self.bottleneck_edges = set()
         self.global_max_flow: float = 0.0
 
+        # держится писателем на время применения строки лога и снапшотом
+        # на время копирования, чтобы состояние и смещение читателя совпадали
+        self.lock = RLock()
+
     def _ensure_node(self, name: str) -> NodeMetrics:
         if name not in self.nodes:
             self.nodes[name] = NodeMetrics(name=name)
         return self.nodes[name]
 
-    def update_from_log(self, src: str, dst: str, latency: float) -> None:
+    def _route_edge(self, key: Tuple[str, str], src_route: str, dst_route: str) -> EdgeMetrics:
+        if self.normalize_route:
+            src_route, dst_route = self.normalize_route(src_route), self.normalize_route(dst_route)
+        rkey = (key[0], src_route, key[1], dst_route)
+        edge = self.route_edges.get(rkey)
+        if edge is None:
+            edge = self.route_edges[rkey] = EdgeMetrics()
+            self._routes_by_edge.setdefault(key, set()).add(rkey)
+        return edge
+
+    def reindex(self) -> None:
+        """Перестраивает индексы после подмены nodes/edges целиком (снапшот)."""
+        self.index.rebuild(self.edges, self.nodes)
+
+    def set_route_edges(self, route_edges: Dict[RouteKey, EdgeMetrics]) -> None:
+        """Подменяет рёбра маршрутов целиком (снапшот) и перестраивает индекс."""
+        self.route_edges = route_edges
+        self._routes_by_edge = {}
+        for rkey in route_edges:
+            self._routes_by_edge.setdefault((rkey[0], rkey[2]), set()).add(rkey)
+
+    def update_from_log(self, src: str, dst: str, latency: float,
+                        src_route: str = "", dst_route: str = "") -> Tuple[str, str]:
+        """
+        Обновляет ребро сервисов и, если известны маршруты, ребро маршрутов — одним шагом.
+        Возвращает ключ ребра после нормализации имён — по нему ищут ребро алерты.
+        """
+        t0 = time.perf_counter()
+        now = time.time()
         self.total_logs += 1
+        self.version += 1
 
+        if self.normalize:
+            src, dst = self.normalize(src), self.normalize(dst)
         self._ensure_node(src)
         self._ensure_node(dst)
 
         key = (src, dst)
-        if key not in self.edges:
-            self.edges[key] = EdgeMetrics()
+        edge = self.edges.get(key)
+        if edge is None:
+            edge = self.edges[key] = EdgeMetrics()
+            self.index.add_edge(key)
+        else:
+            self.index.touch(key)
+
+        edge.update(latency)
+        edge.last_seen = now
+        if src_route or dst_route:
+            route = self._route_edge(key, src_route, dst_route)
+            route.update(latency)
+            route.last_seen = now
+
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+        _UPDATE_TIME.observe(time.perf_counter() - t0)
+        return key
+
+    def count_from_log(self, src: str, dst: str, latency: float, src_route: str = "",
+                       dst_route: str = "", outlier_ratio: float = 2.0) -> Optional[Tuple[str, str]]:
+        """
+        Строка, не попавшая в выборку: только count и last_latency, без окна и индекса.
+        None — ребра ещё нет или задержка — выброс: такую строку нужно применить
+        целиком через update_from_log.
+        """
+        if self.normalize:
+            src, dst = self.normalize(src), self.normalize(dst)
+        key = (src, dst)
+        edge = self.edges.get(key)
+        if edge is None or latency >= edge.avg_latency * outlier_ratio:
+            return None
+
+        now = time.time()
+        self.total_logs += 1
+        self.version += 1
+        edge.count_only(latency)
+        edge.last_seen = now
+        if src_route or dst_route:
+            route = self._route_edge(key, src_route, dst_route)
+            route.count_only(latency)
+            route.last_seen = now
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+        return key
+
+    def merge_delta(self, delta: Dict[RouteKey, tuple]) -> List[Tuple[str, str]]:
+        """
+        Дельта воркера {(src, src_route, dst, dst_route): (count, last_latency, recent)} -> граф.
+        Рёбра сервисов собираются из рёбер маршрутов. Возвращает затронутые рёбра сервисов.
+        """
+        t0 = time.perf_counter()
+        now = time.time()
+        touched = {}
+        for (src, sr, dst, dr), (count, last, recent) in delta.items():
+            if self.normalize:
+                src, dst = self.normalize(src), self.normalize(dst)
+            self._ensure_node(src)
+            self._ensure_node(dst)
+            key = (src, dst)
+            edge = self.edges.get(key)
+            if edge is None:
+                edge = self.edges[key] = EdgeMetrics()
+                self.index.add_edge(key)
+            else:
+                self.index.touch(key)
+            edge.merge(count, last, recent)
+            edge.last_seen = now
+            if sr or dr:
+                route = self._route_edge(key, sr, dr)
+                route.merge(count, last, recent)
+                route.last_seen = now
+            self.total_logs += count
+            self.version += 1
+            touched[key] = None
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+        _UPDATE_TIME.observe(time.perf_counter() - t0)
+        return list(touched)
+
+    # ---------- бюджет памяти ----------
+
+    def _evict_edge(self, key: Tuple[str, str], reason: str, forget: bool = True) -> None:
+        """forget=False — скорер забудет ребро позже, одним вызовом на весь sweep."""
+        self.evicted_logs += self.edges.pop(key).count
+        self.index.remove_edge(key)
+        if forget and self.scorer is not None:
+            self.scorer.forget((key,))
+        self.version += 1
+        self.bottleneck_edges.discard(key)
+        self.evicted_edges += 1
+        GRAPH_EVICTED.labels(kind="edge", reason=reason).inc()
+        # маршруты живут только внутри своего ребра сервисов
+        for rkey in self._routes_by_edge.pop(key, ()):
+            del self.route_edges[rkey]
+            GRAPH_EVICTED.labels(kind="route_edge", reason=reason).inc()
+
+    def _evict_route_edge(self, rkey: RouteKey, reason: str) -> None:
+        del self.route_edges[rkey]
+        key = (rkey[0], rkey[2])
+        routes = self._routes_by_edge.get(key)
+        if routes is not None:
+            routes.discard(rkey)
+            if not routes:
+                del self._routes_by_edge[key]
+        GRAPH_EVICTED.labels(kind="route_edge", reason=reason).inc()
 
-        self.edges[key].update(latency)
+    def sweep(self, now: Optional[float] = None) -> None:
+        """TTL и LRU по бюджету. Вызывается под lock, раз в sweep_interval из update_from_log."""
+        t0 = time.perf_counter()
+        now = time.time() if now is None else now
+        self._last_sweep = now
+        evicted: List[Tuple[str, str]] = []
+
+        if self.edge_ttl is not None:
+            cutoff = now - self.edge_ttl
+            for key in [k for k, m in self.edges.items() if m.last_seen < cutoff]:
+                self._evict_edge(key, "ttl", forget=False)
+                evicted.append(key)
+            for rkey in [k for k, m in self.route_edges.items() if m.last_seen < cutoff]:
+                self._evict_route_edge(rkey, "ttl")
+
+        edge_bytes = {key: m.nbytes() for key, m in self.edges.items()}
+        route_bytes = {rkey: m.nbytes() for rkey, m in self.route_edges.items()}
+        used = sum(edge_bytes.values()) + sum(route_bytes.values()) + len(self.nodes) * _NODE_BYTES
+        if self.max_bytes is not None and used > self.max_bytes:
+            # вытесняем с запасом до 90% бюджета, чтобы не чистить на каждом проходе;
+            # сначала маршруты — сервисный уровень дешевле и нужнее для общей картины
+            target = self.max_bytes * 0.9
+            for rkey in sorted(self.route_edges, key=lambda k: self.route_edges[k].last_seen):
+                if used <= target:
+                    break
+                used -= route_bytes[rkey]
+                self._evict_route_edge(rkey, "budget")
+            for key in sorted(self.edges, key=lambda k: self.edges[k].last_seen):
+                if used <= target:
+                    break
+                used -= edge_bytes[key]
+                used -= sum(route_bytes.get(r, 0) for r in self._routes_by_edge.get(key, ()))
+                self._evict_edge(key, "budget", forget=False)
+                evicted.append(key)
+        if evicted and self.scorer is not None:
+            self.scorer.forget(evicted)
+
+        # узлы существуют только как концы рёбер
+        alive = {name for key in self.edges for name in key}
+        for name in [n for n in self.nodes if n not in alive]:
+            del self.nodes[name]
+            self.index.remove_node(name)
+            self.evicted_nodes += 1
+            used -= _NODE_BYTES
+            GRAPH_EVICTED.labels(kind="node", reason="orphan").inc()
+
+        self.bytes_used = used
+        GRAPH_BYTES.set(used)
+        _SWEEP_TIME.observe(time.perf_counter() - t0)
+
+    def memory_stats(self) -> dict:
+        return {
+            "live_edges": len(self.edges),
+            "live_route_edges": len(self.route_edges),
+            "live_nodes": len(self.nodes),
+            "evicted_edges": self.evicted_edges,
+            "evicted_nodes": self.evicted_nodes,
+            "evicted_logs": self.evicted_logs,
+            "bytes_used": self.bytes_used,
+            "max_bytes": self.max_bytes,
+        }
+
+    # ---------- значения для индекса ----------
+
+    def _node_avg(self, name: str) -> float:
+        total = count = 0.0
+        for src in self.index.inc.get(name, ()):
+            m = self.edges[(src, name)]
+            total += m.window_sum
+            count += m.window_size
+        return total / count if count else 0.0
+
+    def _node_status(self, name: str) -> str:
+        node = self.nodes.get(name)
+        if node is not None and node._forced_status is not None:
+            return node._forced_status
+        return latency_status(self._node_avg(name))
+
+    def _edge_values(self, key: Tuple[str, str]) -> Optional[Tuple[float, float, float]]:
+        m = self.edges.get(key)
+        if m is None:
+            return None
+        score = self.scorer.edge_scores.get(key, 0.0) if self.scorer is not None else 0.0
+        return m.avg_latency, m.percentile(99), score
+
+    # ---------- экспорт ----------
 
     def _compute_incoming_edges(self):
         incoming = {name: [] for name in self.nodes}
@@ -49,45 +377,50 @@ class GraphState:
         avg = {}
         for node, edges in incoming_edges.items():
             if edges:
-                total = sum(sum(m.latencies) for m in edges)
-                count = sum(len(m.latencies) for m in edges)
+                total = sum(m.window_sum for m in edges)
+                count = sum(m.window_size for m in edges)
                 avg[node] = total / count if count > 0 else 0.0
             else:
                 avg[node] = 0.0
         return avg
 
+    def _node_row(self, name: str, load: int, avg: float) -> dict:
+        node = self.nodes[name]
+        return {
+            "id": name,
+            "label": name,
+            "load": load,
+            "avg_latency": avg,
+            # списки задержек NodeMetrics не ведутся — статус по входящим рёбрам
+            "status": node._forced_status or latency_status(avg),
+            "bottleneck_score": node.bottleneck_score,
+        }
+
+    def _edge_row(self, key: Tuple[str, str], m: EdgeMetrics) -> dict:
+        src, dst = key
+        return {
+            "id": f"{src}->{dst}",
+            "source": src,
+            "target": dst,
+            "latency": m.last_latency,
+            "avg_latency": m.avg_latency,
+            "capacity": round(1.0 / m.avg_latency, 4) if m.avg_latency else None,
+            "is_bottleneck": key in self.bottleneck_edges,
+            "score": self.scorer.edge_scores.get(key, 0.0) if self.scorer is not None else 0.0,
+        }
+
     def export(self) -> dict:
+        # под lock: писатель может добавлять и вытеснять рёбра во время обхода
+        with self.lock, _EXPORT_TIME.time():
+            return self._export()
+
+    def _export(self) -> dict:
         incoming_edges = self._compute_incoming_edges()
         load = self._compute_node_load(incoming_edges)
         avg_latency = self._compute_node_avg_latency(incoming_edges)
 
-        nodes_out = []
-        for name in self.nodes:
-            node = self.nodes[name]
-            nodes_out.append(
-                {
-                    "id": name,
-                    "label": name,
-                    "load": load[name],
-                    "avg_latency": avg_latency[name],
-                    "status": node.status,
-                    "bottleneck_score": node.bottleneck_score,
-                }
-            )
-
-        edges_out = []
-        for (src, dst), m in self.edges.items():
-            edges_out.append(
-                {
-                    "id": f"{src}->{dst}",
-                    "source": src,
-                    "target": dst,
-                    "latency": m.last_latency,
-                    "avg_latency": m.avg_latency,
-                    "capacity": round(1.0 / m.avg_latency, 4) if m.avg_latency else None,
-                    "is_bottleneck": (src, dst) in self.bottleneck_edges,
-                }
-            )
+        nodes_out = [self._node_row(name, load[name], avg_latency[name]) for name in self.nodes]
+        edges_out = [self._edge_row(key, m) for key, m in self.edges.items()]
 
         return {
             "nodes": nodes_out,
@@ -96,5 +429,61 @@ class GraphState:
             "bottlenecks": [f"{u}->{v}" for (u, v) in self.bottleneck_edges],
         }
 
+    def export_query(self, service: Optional[str] = None, hops: int = 1, top: Optional[int] = None,
+                     sort: str = "latency", statuses: Optional[Sequence[str]] = None) -> Optional[dict]:
+        """
+        Часть графа по индексам (см. GraphIndex.select): работа пропорциональна
+        выборке, а не всему графу. None — сервиса нет в графе.
+        """
+        with self.lock, _EXPORT_TIME.time():
+            if service is not None and service not in self.nodes:
+                return None
+            nodes, edges = self.index.select(service, hops, top, sort, statuses)
+            if nodes is None:
+                nodes = self.nodes
+            if edges is None:
+                edges = self.edges
+
+            nodes_out = []
+            for name in nodes:
+                load = sum(self.edges[(src, name)].count for src in self.index.inc.get(name, ()))
+                nodes_out.append(self._node_row(name, load, self._node_avg(name)))
+            values = self.index.values
+            edges_out = []
+            for key in edges:
+                row = self._edge_row(key, self.edges[key])
+                row["p99"] = values[key][1] if key in values else 0.0
+                edges_out.append(row)
+
+            return {
+                "nodes": nodes_out,
+                "edges": edges_out,
+                "max_flow": self.global_max_flow,
+                "bottlenecks": [f"{u}->{v}" for (u, v) in self.bottleneck_edges
+                                if u in nodes and v in nodes],
+                "total_nodes": len(self.nodes),
+                "total_edges": len(self.edges),
+            }
+
+    def route_rows(self, service: str) -> Optional[list]:
+        """Рёбра маршрутов, где service — источник или приёмник; None, если сервиса нет."""
+        if service not in self.nodes:
+            return None
+        rows = []
+        for key, rkeys in self._routes_by_edge.items():
+            if service in key:
+                for rkey in rkeys:
+                    m = self.route_edges[rkey]
+                    rows.append((rkey, m.count, m.last_latency, m.avg_latency))
+        return rows
+
+    def export_routes(self, service: str) -> Optional[dict]:
+        """Маршрутный подграф одного сервиса — запрашивается отдельно, по требованию."""
+        with self.lock, _EXPORT_TIME.time():
+            rows = self.route_rows(service)
+            if rows is None:
+                return None
+            return route_view(service, rows, self.bottleneck_edges)
+
     def active_nodes_count(self) -> int:
         return len(self.nodes)
@@ -0,0 +1,343 @@
+import json
+import socket
+import time
+from collections import deque
+from threading import Condition, Thread
+from typing import Callable, Deque, Optional, Tuple
+
+from .csv_parser import LogBatch, parse_block, _cached, _NAMES, _decode_name
+from .metrics import REGISTRY, STAGE_SECONDS
+
+INGEST_RECORDS = REGISTRY.counter(
+    "mbd_ingest_records_total", "Records offered to the ingest queue by source and result", ["source", "result"]
+)
+INGEST_QUEUE_DEPTH = REGISTRY.gauge("mbd_ingest_queue_depth", "Records waiting in the ingest queue")
+INGEST_QUEUE_BATCHES = REGISTRY.gauge("mbd_ingest_queue_batches", "Batches waiting in the ingest queue")
+_APPLY_TIME = STAGE_SECONDS.labels(stage="apply")
+
+POLICY_REJECT = "reject"
+POLICY_SHED_OLDEST = "shed_oldest"
+
+# сколько записей писатель применяет за один захват gs.lock
+APPLY_SLICE = 512
+
+
+def apply_batch(graph_state, alert_engine, batch: LogBatch, start: int = 0, stop: Optional[int] = None) -> None:
+    """Применяет записи batch[start:stop] к графу и движку алертов. Вызывается под gs.lock."""
+    stop = len(batch) if stop is None else stop
+    src, dst, latency = batch.src, batch.dst, batch.latency
+    src_route, dst_route = batch.src_route, batch.dst_route
+    scorer = graph_state.scorer
+    ids = batch.raw_ids is not None and scorer is not None
+    if ids:
+        trace_id, span_id, parent_id = batch.trace_id, batch.span_id, batch.parent_id
+    sampler = graph_state.sampler
+    sampling = sampler is not None and sampler.rate < 1.0
+    logs, now = graph_state.recent_logs, time.time()
+    # час недели для базовых линий — по времени записи, а не приёма
+    timestamps = batch.timestamps
+    counted = 0
+    for i in range(start, stop):
+        s, d, lat = src[i], dst[i], latency[i]
+        key = None
+        if sampling and not sampler.keep():
+            # перегрузка: окно и алерты не трогаем, если это не выброс
+            key = graph_state.count_from_log(s, d, lat, src_route[i], dst_route[i], sampler.outlier_ratio)
+        if key is not None:
+            counted += 1
+        else:
+            key = graph_state.update_from_log(s, d, lat, src_route[i], dst_route[i])
+            logs.append(key[0], key[1], lat, now)
+            alert_engine.handle_log(key[0], key[1], lat, timestamps[i] or now)
+            if scorer is not None:
+                scorer.touch(key)
+        # trace-схема: спан идёт в поиск самого медленного шага пути (без пропусков —
+        # иначе у потомков пропадёт родитель)
+        if ids and trace_id[i]:
+            scorer.observe_span(trace_id[i], span_id[i], parent_id[i], key, lat)
+    if sampler is not None:
+        sampler.record(stop - start - counted, counted)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class IngestPipeline:
+    """
+    Ограниченная очередь пакетов и единственный писатель, который применяет
+    их к GraphState/AlertEngine. Граница считается в записях, не в пакетах.
+
+    Политики при переполнении:
+      reject      — submit() отказывает (HTTP отвечает 429), либо ждёт при block=True;
+      shed_oldest — из головы очереди выбрасываются самые старые пакеты.
+                    Их on_applied писатель всё равно вызывает в порядке очереди:
+                    строки потеряны, и смещение файла должно пройти мимо них.
+    """
+
+    def __init__(self, graph_state, alert_engine, max_records: int = 100_000, policy: str = POLICY_REJECT):
+        if policy not in (POLICY_REJECT, POLICY_SHED_OLDEST):
+            raise ValueError(f"unknown ingest policy: {policy}")
+        self._gs = graph_state
+        self._ae = alert_engine
+        self.max_records = max_records
+        self.policy = policy
+
+        self._queue: Deque[Tuple[LogBatch, str, Optional[Callable[[], None]]]] = deque()
+        self._records = 0
+        # пакет, который писатель сейчас применяет (уже не в очереди)
+        self._inflight = 0
+        self._cond = Condition()
+        self._thread: Optional[Thread] = None
+
+        INGEST_QUEUE_DEPTH.set_function(lambda: self._records)
+        INGEST_QUEUE_BATCHES.set_function(lambda: len(self._queue))
+
+    @property
+    def depth(self) -> int:
+        return self._records
+
+    @property
+    def free(self) -> int:
+        return max(0, self.max_records - self._records)
+
+    def submit(self, batch: LogBatch, source: str = "api", block: bool = False,
+               timeout: Optional[float] = None, on_applied: Optional[Callable[[], None]] = None) -> int:
+        """
+        Ставит пакет в очередь. Возвращает число выброшенных из очереди записей
+        (только для shed_oldest). При reject и переполнении бросает QueueFull.
+        on_applied вызывается писателем под gs.lock сразу после применения пакета.
+        """
+        n = len(batch)
+        if n == 0 and on_applied is None:
+            return 0
+
+        shed = 0
+        # пустые пакеты на месте выброшенных — только ради их on_applied
+        placeholders = []
+        with self._cond:
+            if self._records + n > self.max_records and self._queue:
+                if self.policy == POLICY_SHED_OLDEST:
+                    while self._queue and self._records + n > self.max_records:
+                        old, old_source, old_applied = self._queue.popleft()
+                        self._records -= len(old)
+                        shed += len(old)
+                        INGEST_RECORDS.labels(source=old_source, result="shed").inc(len(old))
+                        if old_applied is not None:
+                            placeholders.append((LogBatch(), old_source, old_applied))
+                elif block:
+                    deadline = None if timeout is None else time.monotonic() + timeout
+                    while self._queue and self._records + n > self.max_records:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+
+                if self._queue and self._records + n > self.max_records:
+                    INGEST_RECORDS.labels(source=source, result="rejected").inc(n)
+                    raise QueueFull(f"ingest queue is full ({self._records}/{self.max_records} records)")
+
+            self._queue.extendleft(reversed(placeholders))
+            self._queue.append((batch, source, on_applied))
+            self._records += n
+            self._cond.notify_all()
+
+        INGEST_RECORDS.labels(source=source, result="accepted").inc(n)
+        return shed
+
+    def _take(self, timeout: Optional[float] = None):
+        with self._cond:
+            while not self._queue:
+                if not self._cond.wait(timeout):
+                    return None
+            item = self._queue.popleft()
+            self._records -= len(item[0])
+            self._inflight += 1
+            self._cond.notify_all()
+            return item
+
+    def _done(self) -> None:
+        with self._cond:
+            self._inflight -= 1
+            self._cond.notify_all()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт, пока очередь опустеет и писатель применит последний пакет."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._inflight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def _apply(self, batch: LogBatch, on_applied: Optional[Callable[[], None]]) -> None:
+        t0 = time.perf_counter()
+        n = len(batch)
+        for start in range(0, n, APPLY_SLICE):
+            with self._gs.lock:
+                apply_batch(self._gs, self._ae, batch, start, min(n, start + APPLY_SLICE))
+        if on_applied is not None:
+            with self._gs.lock:
+                on_applied()
+        _APPLY_TIME.observe(time.perf_counter() - t0)
+
+    def drain(self) -> int:
+        """Применяет всё, что сейчас в очереди, в текущем потоке."""
+        applied = 0
+        while True:
+            item = self._take(timeout=0)
+            if item is None:
+                return applied
+            batch, _, on_applied = item
+            try:
+                self._apply(batch, on_applied)
+            finally:
+                self._done()
+            applied += len(batch)
+
+    def run_blocking(self):
+        while True:
+            item = self._take()
+            if item is None:
+                continue
+            batch, _, on_applied = item
+            try:
+                self._apply(batch, on_applied)
+            except Exception as e:
+                print(f">>> Ingest writer error: {e}")
+            finally:
+                self._done()
+
+    def start(self) -> Thread:
+        self._thread = Thread(target=self.run_blocking, name="IngestWriter", daemon=True)
+        self._thread.start()
+        return self._thread
+
+
+# ---------- разбор входных форматов ----------
+
+_NDJSON_KEYS = {
+    "timestamp": ("timestamp", "ts"),
+    "src": ("srcService", "src"),
+    "src_route": ("srcRoute", "src_route"),
+    "dst": ("dstService", "dst"),
+    "dst_route": ("dstRoute", "dst_route"),
+    "latency": ("latency_ms", "latency"),
+    "trace_id": ("traceId", "trace_id"),
+    "span_id": ("spanId", "span_id"),
+    "parent_id": ("parentSpanId", "parent_span_id"),
+}
+
+
+def _field(record: dict, name: str, default=None):
+    for key in _NDJSON_KEYS[name]:
+        if key in record:
+            return record[key]
+    return default
+
+
+def parse_ndjson(data: bytes) -> LogBatch:
+    """NDJSON (объект на строку) или JSON-массив объектов -> LogBatch."""
+    batch = LogBatch()
+    batch.consumed = len(data)
+
+    stripped = data.lstrip()
+    if stripped.startswith(b"["):
+        try:
+            records = json.loads(stripped)
+        except ValueError:
+            batch.errors += 1
+            return batch
+    else:
+        records = []
+        for line in data.split(b"\n"):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                batch.errors += 1
+
+    src, src_route, dst, dst_route = [], [], [], []
+    ids = ([], [], [])
+    with_ids = False
+    for rec in records:
+        if not isinstance(rec, dict):
+            batch.errors += 1
+            continue
+        s, d, lat = _field(rec, "src"), _field(rec, "dst"), _field(rec, "latency")
+        if not s or not d:
+            batch.errors += 1
+            continue
+        try:
+            lat = float(lat)
+        except (TypeError, ValueError):
+            batch.errors += 1
+            continue
+
+        ts = _field(rec, "timestamp", "")
+        batch.raw_timestamps.append(str(ts).encode("utf-8"))
+        batch.latency.append(lat)
+        src.append(str(s).encode("utf-8"))
+        dst.append(str(d).encode("utf-8"))
+        src_route.append(str(_field(rec, "src_route", "")).encode("utf-8"))
+        dst_route.append(str(_field(rec, "dst_route", "")).encode("utf-8"))
+
+        trace = _field(rec, "trace_id")
+        with_ids = with_ids or trace is not None
+        ids[0].append(str(trace or "").encode("utf-8"))
+        ids[1].append(str(_field(rec, "span_id", "") or "").encode("utf-8"))
+        ids[2].append(str(_field(rec, "parent_id", "") or "").encode("utf-8"))
+
+    # имена идут через тот же кэш, что и у CSV, — одинаковые строки для ключей графа
+    batch.src = _cached(_NAMES, src, _decode_name)
+    batch.src_route = _cached(_NAMES, src_route, _decode_name)
+    batch.dst = _cached(_NAMES, dst, _decode_name)
+    batch.dst_route = _cached(_NAMES, dst_route, _decode_name)
+    if with_ids:
+        batch.raw_ids = ids
+    return batch
+
+
+def parse_payload(data: bytes, content_type: str = "") -> LogBatch:
+    content_type = (content_type or "").lower()
+    if "json" in content_type:
+        return parse_ndjson(data)
+    if "csv" in content_type or "text/plain" in content_type:
+        return parse_block(data)
+    # без типа — по первому значимому символу
+    head = data.lstrip()[:1]
+    return parse_ndjson(data) if head in (b"{", b"[") else parse_block(data)
+
+
+class UdpIngestServer:
+    """Датаграмма = одна или несколько строк CSV/NDJSON. При переполнении очереди — потеря."""
+
+    def __init__(self, pipeline: IngestPipeline, host: str, port: int, bufsize: int = 65535):
+        self.pipeline = pipeline
+        self.bufsize = bufsize
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.address = self.sock.getsockname()
+
+    def run_blocking(self):
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(self.bufsize)
+            except OSError:
+                return
+            batch = parse_payload(data)
+            try:
+                self.pipeline.submit(batch, source="udp")
+            except QueueFull:
+                pass
+
+    def start(self) -> Thread:
+        t = Thread(target=self.run_blocking, name="UdpIngest", daemon=True)
+        t.start()
+        return t
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,158 @@
+from array import array
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Последние строки логов для ленты на дашборде. Раньше на каждую строку
+# ингеста собиралась f-строка, даже если ленту никто не смотрит; теперь
+# в кольце лежат только id сервисов (интернированные), задержка и время,
+# а текст собирается при ответе /api/logs.
+#
+# У каждой записи возрастающий seq: клиент передаёт последний увиденный
+# (?since=) и получает только новые записи. Кольцо хранит seq в
+# [next_seq - capacity, next_seq); если клиент отстал сильнее или limit
+# отрезал старые из подходящих записей, ответ помечается truncated —
+# курсор next всё равно ставится на конец, лента показывает самые свежие.
+
+Entry = Tuple[int, str, str, float, float]  # seq, src, dst, latency, ts
+
+
+def format_line(src: str, dst: str, latency: float) -> str:
+    return f"{src} → {dst}  {latency} ms"
+
+
+class LogRingBuffer:
+    def __init__(self, capacity: int = 200):
+        self.capacity = capacity
+        self._src = array("I", bytes(4 * capacity))
+        self._dst = array("I", bytes(4 * capacity))
+        self._latency = array("d", bytes(8 * capacity))
+        self._ts = array("d", bytes(8 * capacity))
+        self._names: List[str] = []
+        self._ids: Dict[str, int] = {}
+        # seq следующей записи; seq начинаются с 1, since=0 — "с самого начала"
+        self.next_seq = 1
+        # seq, с которого в кольце есть записи (после load — первая загруженная)
+        self._base = 1
+        # писатель — поток ингеста, читатель — запросы /api/logs и снапшот
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return self.next_seq - self.first_seq
+
+    @property
+    def first_seq(self) -> int:
+        return max(self._base, self.next_seq - self.capacity)
+
+    def _intern(self, name: str) -> int:
+        i = self._ids.get(name)
+        if i is None:
+            i = self._ids[name] = len(self._names)
+            self._names.append(name)
+        return i
+
+    def _compact(self) -> None:
+        """Оставляет в таблице имён только те, что есть в живых записях."""
+        names: List[str] = []
+        ids: Dict[str, int] = {}
+        old = self._names
+        for col in (self._src, self._dst):
+            for slot in self._slots():
+                name = old[col[slot]]
+                i = ids.get(name)
+                if i is None:
+                    i = ids[name] = len(names)
+                    names.append(name)
+                col[slot] = i
+        self._names, self._ids = names, ids
+
+    def _slots(self) -> Iterable[int]:
+        cap = self.capacity
+        return (seq % cap for seq in range(self.first_seq, self.next_seq))
+
+    def append(self, src: str, dst: str, latency: float, ts: float) -> None:
+        with self._lock:
+            if len(self._names) >= 4 * self.capacity:
+                # имена сервисов меняются (поды, вытеснение) — таблицу не растим бесконечно
+                self._compact()
+            slot = self.next_seq % self.capacity
+            self._src[slot] = self._intern(src)
+            self._dst[slot] = self._intern(dst)
+            self._latency[slot] = latency
+            self._ts[slot] = ts
+            self.next_seq += 1
+
+    def extend(self, entries: Iterable[Tuple[str, str, float, float]]) -> None:
+        for src, dst, latency, ts in entries:
+            self.append(src, dst, latency, ts)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._names, self._ids = [], {}
+            self.next_seq = self._base = 1
+
+    def entries(self, since: int = 0, service: Optional[str] = None, min_latency: Optional[float] = None,
+                limit: Optional[int] = None) -> List[Entry]:
+        """Записи с seq > since по возрастанию seq; limit — самые новые из подходящих."""
+        return self._select(since, service, min_latency, limit)[0]
+
+    def _select(self, since: int, service: Optional[str], min_latency: Optional[float],
+                limit: Optional[int]) -> Tuple[List[Entry], int, bool]:
+        """Записи, next_seq на тот же момент и признак потери (кольцо или limit отрезали строки)."""
+        with self._lock:
+            next_seq, first_seq = self.next_seq, self.first_seq
+            if since >= next_seq:
+                # seq с сервера, который начал счёт заново (рестарт без снапшота)
+                since = 0
+            start = max(since + 1, first_seq)
+            names, cap = self._names, self.capacity
+            src_col, dst_col, lat_col, ts_col = self._src, self._dst, self._latency, self._ts
+            out: List[Entry] = []
+            for seq in range(start, next_seq):
+                slot = seq % cap
+                latency = lat_col[slot]
+                if min_latency is not None and latency < min_latency:
+                    continue
+                src, dst = names[src_col[slot]], names[dst_col[slot]]
+                if service is not None and service != src and service != dst:
+                    continue
+                out.append((seq, src, dst, latency, ts_col[slot]))
+        cut = limit is not None and len(out) > limit
+        if cut:
+            out = out[-limit:]
+        # клиент отстал больше чем на capacity записей — часть ленты потеряна
+        return out, next_seq, cut or 0 < since < first_seq - 1
+
+    def query(self, since: int = 0, service: Optional[str] = None, min_latency: Optional[float] = None,
+              limit: Optional[int] = None) -> dict:
+        """Ответ /api/logs: записи после since и курсор для следующего запроса."""
+        entries, next_seq, truncated = self._select(since, service, min_latency, limit)
+        return {
+            "logs": [
+                {"seq": seq, "ts": ts, "src": src, "dst": dst, "latency": latency,
+                 "line": format_line(src, dst, latency)}
+                for seq, src, dst, latency, ts in entries
+            ],
+            "next": next_seq - 1,
+            "truncated": truncated,
+        }
+
+    def dump(self) -> Tuple[int, List[Entry]]:
+        """(next_seq, записи) — для снапшота и публикации в shared memory."""
+        entries, next_seq, _ = self._select(0, None, None, None)
+        return next_seq, entries
+
+    def load(self, next_seq: int, entries: Iterable[Tuple[int, str, str, float, float]]) -> None:
+        """Восстанавливает кольцо из dump(): те же seq, что были у записей."""
+        entries = list(entries)[-self.capacity:]
+        self.clear()
+        with self._lock:
+            # записи идут подряд по seq (как отдаёт dump), кольцо начинается с первой
+            self._base = self.next_seq = entries[0][0] if entries else next_seq
+            for seq, src, dst, latency, ts in entries:
+                slot = seq % self.capacity
+                self._src[slot] = self._intern(src)
+                self._dst[slot] = self._intern(dst)
+                self._latency[slot] = latency
+                self._ts[slot] = ts
+                self.next_seq = seq + 1
+            self.next_seq = max(self.next_seq, next_seq)
@@ -1,52 +1,144 @@
+import os
 import time
 from .alert_engine import AlertEngine
+from .compressed import DecompressingReader, open_log
+from .config import READ_CHUNK_SIZE
+from .csv_parser import BatchParser, LogBatch, LIVE_COLUMNS, TRACE_COLUMNS
+from .ingest import apply_batch
+from .metrics import REGISTRY, STAGE_SECONDS
+
+READER_LINES = REGISTRY.counter(
+    "mbd_reader_lines_total", "Log lines read by result (parsed, dropped, empty)", ["file", "result"]
+)
+READER_LAG = REGISTRY.gauge(
+    "mbd_reader_lag_bytes", "Bytes between the reader position and the end of the file", ["file"]
+)
+READER_POSITION = REGISTRY.gauge(
+    "mbd_reader_position_bytes", "Current reader offset in the log file", ["file"]
+)
+_PARSE_TIME = STAGE_SECONDS.labels(stage="parse")
 
 
 class LogReader:
-    def __init__(self, graph_state, alert_engine: AlertEngine, log_file: str, interval: float):
+    def __init__(self, graph_state, alert_engine: AlertEngine, log_file: str, interval: float,
+                 start_offset: int = 0, chunk_size: int = READ_CHUNK_SIZE, pipeline=None):
         self._gs = graph_state
         self._ae = alert_engine
+        # если задан IngestPipeline, пакеты применяет его писатель, а не этот поток
+        self.pipeline = pipeline
         self.log_file = log_file
         self.interval = interval
+        self.chunk_size = chunk_size
+
+        # байтовое смещение первой ещё не применённой строки
+        self.position = start_offset
+        # смещение, до которого файл уже прочитан (с очередью может опережать position)
+        self._read_pos = start_offset
+        self._pass = 0
+        # открытый поток; у сжатого файла позиции в распакованных байтах
+        self._stream = None
+
+        self._parsed = READER_LINES.labels(file=log_file, result="parsed")
+        self._dropped = READER_LINES.labels(file=log_file, result="dropped")
+        self._empty = READER_LINES.labels(file=log_file, result="empty")
+        READER_LAG.labels(file=log_file).set_function(self.lag_bytes)
+        READER_POSITION.labels(file=log_file).set_function(lambda: self.position)
+
+    def lag_bytes(self) -> int:
+        try:
+            size = os.path.getsize(self.log_file)
+        except OSError:
+            return 0
+        stream = self._stream
+        if isinstance(stream, DecompressingReader):
+            # позиция сжатого лога в распакованных байтах — сравнимы только сжатые
+            return max(0, size - stream.raw_tell())
+        return max(0, size - self.position)
+
+    def offsets(self) -> dict:
+        return {self.log_file: self.position}
 
     def parse_line(self, line: str):
         try:
             parts = line.strip().split(",")
-            if len(parts) < 6:
+            if len(parts) == LIVE_COLUMNS:
+                _, src, src_route, dst, dst_route, latency = parts
+            elif len(parts) == TRACE_COLUMNS:
+                src, src_route, dst, dst_route, latency = parts[4:9]
+            else:
                 return None
-
-            _, src, _, dst, _, latency = parts
-            return src, dst, float(latency)
+            return src, dst, float(latency), src_route, dst_route
         except Exception:
             return None
 
-    def run_blocking(self):
-        while True:
-            try:
-                with open(self.log_file, "r") as f:
-                    while True:
-                        line = f.readline()
+    def _advance(self, pass_no: int, offset: int):
+        def done():
+            # после перемотки файла старые смещения уже не актуальны
+            if pass_no == self._pass:
+                self.position = offset
+        return done
 
-                        if not line:
-                            f.seek(0)
-                            time.sleep(self.interval)
-                            continue
+    def _apply_batch(self, batch: LogBatch, base: int) -> None:
+        self._parsed.inc(len(batch))
+        if batch.errors:
+            self._dropped.inc(batch.errors)
+        if batch.empty:
+            self._empty.inc(batch.empty)
 
-                        if line.strip() == "":
-                            continue
+        if self.pipeline is not None:
+            # блокирующая постановка: файл подождёт, пока писатель разгребёт очередь
+            tail = batch
+            if self.interval > 0:
+                for i in range(len(batch)):
+                    self.pipeline.submit(batch.slice(i, i + 1), source="file", block=True,
+                                         on_applied=self._advance(self._pass, base + batch.ends[i]))
+                    time.sleep(self.interval)
+                # остаются только пустые и битые строки в конце куска
+                tail = LogBatch()
+            self.pipeline.submit(tail, source="file", block=True,
+                                 on_applied=self._advance(self._pass, base + batch.consumed))
+            return
 
-                        parsed = self.parse_line(line)
-                        if not parsed:
-                            continue
+        if self.interval > 0:
+            # режим симуляции: по одной записи с паузой, смещение — после каждой
+            for i in range(len(batch)):
+                with self._gs.lock:
+                    apply_batch(self._gs, self._ae, batch, i, i + 1)
+                    self.position = base + batch.ends[i]
+                time.sleep(self.interval)
+            with self._gs.lock:
+                self.position = base + batch.consumed
+            return
 
-                        src, dst, latency = parsed
+        with self._gs.lock:
+            apply_batch(self._gs, self._ae, batch)
+            self.position = base + batch.consumed
+
+    def run_blocking(self):
+        while True:
+            try:
+                self._read_pos = self.position
+                with open_log(self.log_file, self._read_pos) as f:
+                    self._stream = f
+                    parser = BatchParser(track_offsets=self.interval > 0)
+                    while True:
+                        chunk = f.read(self.chunk_size)
+                        base = self._read_pos
 
-                        self._gs.update_from_log(src, dst, latency)
-                        self._gs.recent_logs.append(f"{src} → {dst}  {latency} ms")
+                        t0 = time.perf_counter()
+                        batch = parser.feed(chunk) if chunk else parser.flush()
+                        _PARSE_TIME.observe(time.perf_counter() - t0)
 
-                        self._ae.handle_log(src, dst)
+                        self._read_pos = base + batch.consumed
+                        self._apply_batch(batch, base)
 
-                        time.sleep(self.interval)
+                        if not chunk:
+                            f.seek(0)
+                            self._pass += 1
+                            self._read_pos = 0
+                            with self._gs.lock:
+                                self.position = 0
+                            time.sleep(self.interval)
             except Exception:
                 time.sleep(self.interval)
                 continue
@@ -1,8 +1,18 @@
+from array import array
 from dataclasses import dataclass, field
 import statistics
 from typing import List, Optional
 
 
+def latency_status(avg: float) -> str:
+    """Статус по средней задержке, мс: тот же порог для сервиса и маршрута."""
+    if avg > 200:
+        return "critical"
+    elif avg > 100:
+        return "warning"
+    return "normal"
+
+
 @dataclass
 class NodeMetrics:
     name: str
@@ -69,37 +79,113 @@ class NodeMetrics:
             return self._forced_status
 
         base_avg = self.incoming_avg_latency or self.total_avg_latency
-
-        if base_avg > 200:
-            return "critical"
-        elif base_avg > 100:
-            return "warning"
-        return "normal"
+        return latency_status(base_avg)
 
     @status.setter
     def status(self, value: str) -> None:
         self._forced_status = value
 
 
+# окно последних задержек ребра
+EDGE_WINDOW = 200
+
+
 @dataclass
 class EdgeMetrics:
-    latencies: List[float] = field(default_factory=list)
+    """
+    Последние EDGE_WINDOW задержек лежат в кольцевом буфере array('d')
+    (8 байт на значение вместо объекта float в списке), сумма окна
+    ведётся инкрементно — avg_latency не обходит окно.
+    """
+
     last_latency: float = 0.0
     count: int = 0
+    # time.time() последнего обновления — для вытеснения простаивающих рёбер
+    last_seen: float = 0.0
+
+    _ring: array = field(default_factory=lambda: array("d"), repr=False)
+    _head: int = field(default=0, repr=False)
+    _sum: float = field(default=0.0, repr=False)
+
+    @property
+    def latencies(self) -> List[float]:
+        """Окно задержек от старых к новым."""
+        ring, head = self._ring, self._head
+        return ring[head:].tolist() + ring[:head].tolist()
+
+    @latencies.setter
+    def latencies(self, values: List[float]) -> None:
+        self._ring = array("d", values[-EDGE_WINDOW:])
+        self._head = 0
+        self._sum = sum(self._ring)
+
+    @property
+    def window_size(self) -> int:
+        return len(self._ring)
+
+    @property
+    def window_sum(self) -> float:
+        return self._sum
 
     @property
     def avg_latency(self) -> float:
-        return statistics.mean(self.latencies) if self.latencies else 0.0
+        n = len(self._ring)
+        return self._sum / n if n else 0.0
+
+    def percentile(self, q: float) -> float:
+        """q-й перцентиль окна (0..100), ближайший ранг."""
+        n = len(self._ring)
+        if not n:
+            return 0.0
+        ordered = sorted(self._ring)
+        return ordered[min(n - 1, int(q / 100.0 * n))]
 
     @property
     def trend(self) -> float:
-        if len(self.latencies) < 3:
+        ring = self._ring
+        n = len(ring)
+        if n < 3:
             return 0.0
-        return self.latencies[-1] - self.latencies[-3]
+        head = self._head
+        return ring[(head - 1) % n] - ring[(head - 3) % n]
+
+    def _push(self, latency: float) -> None:
+        ring = self._ring
+        if len(ring) < EDGE_WINDOW:
+            ring.append(latency)
+            self._sum += latency
+            return
+        head = self._head
+        self._sum += latency - ring[head]
+        ring[head] = latency
+        head += 1
+        if head == EDGE_WINDOW:
+            head = 0
+            # раз в оборот пересчитываем сумму, чтобы не копилась ошибка округления
+            self._sum = sum(ring)
+        self._head = head
 
     def update(self, latency: float) -> None:
         self.last_latency = latency
-        self.latencies.append(latency)
         self.count += 1
-        if len(self.latencies) > 200:
-            self.latencies.pop(0)
+        self._push(latency)
+
+    def count_only(self, latency: float) -> None:
+        """Учитывает вызов без записи в окно (сэмплирование при перегрузке)."""
+        self.last_latency = latency
+        self.count += 1
+
+    def merge(self, count: int, last_latency: float, recent: List[float]) -> None:
+        """Вливает частичный агрегат: count вызовов, из них последние — recent."""
+        self.last_latency = last_latency
+        self.count += count
+        for latency in recent[-EDGE_WINDOW:]:
+            self._push(latency)
+
+    def nbytes(self) -> int:
+        """Оценка памяти ребра: объект, кольцевой буфер и запись в словаре рёбер."""
+        return _EDGE_OVERHEAD + self._ring.buffer_info()[1] * self._ring.itemsize
+
+
+# объект EdgeMetrics с полями, ключ-кортеж и слот словаря (CPython 3.11, 64 бит)
+_EDGE_OVERHEAD = 400
@@ -0,0 +1,49 @@
+import re
+from typing import Dict, List, Sequence, Tuple
+
+# Правила схлопывания имён с высокой кардинальностью: (regex, замена),
+# применяются по порядку. Готовые наборы можно перечислить в config.NAME_RULES.
+
+# checkout-7f9c8d6b5-x2kqz -> checkout (под Deployment)
+POD_SUFFIX_RULES: List[Tuple[str, str]] = [
+    (r"-[0-9a-z]{8,10}-[0-9a-z]{5}$", ""),
+]
+
+# orders-3 -> orders (под StatefulSet); не для имён вида svc-0001
+ORDINAL_SUFFIX_RULES: List[Tuple[str, str]] = [
+    (r"-\d+$", ""),
+]
+
+# /orders/123/items/550e8400-e29b-41d4-a716-446655440000 -> /orders/{id}/items/{id}
+ROUTE_ID_RULES: List[Tuple[str, str]] = [
+    (r"/[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}(?=/|$)", "/{id}"),
+    (r"/\d+(?=/|$)", "/{id}"),
+]
+
+# /v2/orders -> /{v}/orders
+VERSION_RULES: List[Tuple[str, str]] = [
+    (r"(?<=/)v\d+(?=/|$)", "{v}"),
+]
+
+
+class NameNormalizer:
+    """Применяет правила к именам; результат кэшируется, так что повторное имя — один lookup."""
+
+    def __init__(self, rules: Sequence[Tuple[str, str]], cache_limit: int = 100_000):
+        self.rules = [(re.compile(pattern), repl) for pattern, repl in rules]
+        self.cache_limit = cache_limit
+        self._cache: Dict[str, str] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    def __call__(self, name: str) -> str:
+        out = self._cache.get(name)
+        if out is None:
+            out = name
+            for pattern, repl in self.rules:
+                out = pattern.sub(repl, out)
+            if len(self._cache) >= self.cache_limit:
+                self._cache.clear()
+            self._cache[name] = out
+        return out
@@ -0,0 +1,165 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from .metrics import REGISTRY
+
+PROFILE_SAMPLES = REGISTRY.counter("mbd_profiler_samples_total", "Stacks captured by the sampling profiler")
+
+# Одновременно работает только один профиль: сэмплер держит GIL на время
+# обхода стеков, и два параллельных профиля удвоили бы накладные расходы.
+_busy = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _frame_label(code) -> str:
+    name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    # ';' — разделитель в collapsed-формате
+    return name.replace(";", ":")
+
+
+class SamplingProfiler:
+    def __init__(self, seconds: float, interval: float = 0.005, max_depth: int = 128):
+        self.seconds = seconds
+        self.interval = interval
+        self.max_depth = max_depth
+
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.thread_samples: Counter = Counter()
+        self.elapsed = 0.0
+        self.sampler_time = 0.0
+        # насколько позже запланированного просыпается сэмплер: при борьбе
+        # за GIL это число растёт, даже если потоки в стеках выглядят "спящими"
+        self.tick_delay = 0.0
+
+    def _thread_names(self) -> Dict[int, str]:
+        return {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+
+    def _sample_once(self, own_ident: int, names: Dict[int, str]) -> None:
+        frames = sys._current_frames()
+        for ident, frame in frames.items():
+            if ident == own_ident:
+                continue
+
+            stack: List[str] = []
+            f = frame
+            while f is not None and len(stack) < self.max_depth:
+                stack.append(_frame_label(f.f_code))
+                f = f.f_back
+            stack.reverse()
+
+            name = names.get(ident)
+            if name is None:
+                # поток появился после начала профиля
+                names.update(self._thread_names())
+                name = names.get(ident, f"thread-{ident}")
+
+            self.stacks[(name,) + tuple(stack)] += 1
+            self.thread_samples[name] += 1
+        self.samples += 1
+
+    def run(self) -> "SamplingProfiler":
+        if not _busy.acquire(blocking=False):
+            raise ProfilerBusy("another profile is already running")
+        try:
+            own = threading.get_ident()
+            names = self._thread_names()
+            start = time.perf_counter()
+            deadline = start + self.seconds
+            next_at = start
+
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+
+                t0 = time.perf_counter()
+                self.tick_delay += max(0.0, t0 - next_at)
+                self._sample_once(own, names)
+                self.sampler_time += time.perf_counter() - t0
+
+                next_at += self.interval
+                # последний сон не выходит за срок профиля
+                delay = min(next_at, deadline) - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # не успеваем — пропускаем тики, а не копим долг
+                    next_at = time.perf_counter()
+
+            self.elapsed = time.perf_counter() - start
+            PROFILE_SAMPLES.inc(self.samples)
+            return self
+        finally:
+            _busy.release()
+
+    # ---------- форматы вывода ----------
+
+    def collapsed(self) -> str:
+        """Формат flamegraph.pl / inferno: 'thread;frame;frame count' построчно."""
+        lines = [f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()]
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> dict:
+        """Sampled-профиль для https://www.speedscope.app, по профилю на поток."""
+        frame_index: Dict[str, int] = {}
+        frames: List[dict] = []
+
+        def idx(label: str) -> int:
+            i = frame_index.get(label)
+            if i is None:
+                i = len(frames)
+                frame_index[label] = i
+                frames.append({"name": label})
+            return i
+
+        by_thread: Dict[str, List[Tuple[List[int], int]]] = {}
+        for stack, count in self.stacks.items():
+            thread, frames_ = stack[0], stack[1:]
+            by_thread.setdefault(thread, []).append(([idx(fr) for fr in frames_], count))
+
+        profiles = []
+        for thread, entries in sorted(by_thread.items()):
+            total = sum(c for _, c in entries)
+            profiles.append({
+                "type": "sampled",
+                "name": thread,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": total * self.interval,
+                "samples": [s for s, _ in entries],
+                "weights": [c * self.interval for _, c in entries],
+            })
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+            "name": f"mbd profile {self.seconds}s @ {self.interval * 1000:.1f}ms",
+            "exporter": "microservice-bottleneck-detector",
+        }
+
+    def summary(self) -> dict:
+        return {
+            "seconds": round(self.elapsed, 3),
+            "interval": self.interval,
+            "samples": self.samples,
+            # доля времени, которую сам сэмплер держал GIL
+            "overhead": round(self.sampler_time / self.elapsed, 4) if self.elapsed else 0.0,
+            "mean_tick_delay_ms": round(self.tick_delay / self.samples * 1000, 3) if self.samples else 0.0,
+            "threads": dict(self.thread_samples),
+        }
+
+
+def profile(seconds: float, interval: float, max_seconds: float, min_interval: float) -> SamplingProfiler:
+    seconds = max(0.1, min(float(seconds), max_seconds))
+    # интервал длиннее профиля дал бы не больше одного сэмпла, а inf не уснуть
+    interval = min(max(min_interval, float(interval)), seconds)
+    return SamplingProfiler(seconds, interval).run()
@@ -1,7 +1,55 @@
-from flask import Blueprint, jsonify, render_template, current_app
+import time
+from contextlib import nullcontext
+
+from flask import Blueprint, Response, abort, g, jsonify, render_template, current_app, request
+
+from .config import (
+    ADMIN_TOKEN,
+    GRAPH_MAX_HOPS,
+    INGEST_MAX_BODY,
+    LOGS_QUERY_LIMIT,
+    PROFILER_ENABLED,
+    PROFILER_MAX_SECONDS,
+    PROFILER_MIN_INTERVAL,
+)
+from .csv_parser import parse_timestamp
+from .graph_index import SORT_KEYS, STATUSES
+from .ingest import QueueFull, parse_payload
+from .metrics import REGISTRY
+from .profiler import ProfilerBusy, profile
+from .scenarios import ScenarioError
+from .shared_state import SharedStateError
+from .timeline import MAX_AT
 
 bp = Blueprint("main", __name__)
 
+HTTP_SECONDS = REGISTRY.histogram(
+    "mbd_http_request_seconds", "HTTP request handling time by endpoint", ["endpoint"]
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    "mbd_http_requests_total", "HTTP requests by endpoint and status", ["endpoint", "status"]
+)
+
+
+@bp.before_request
+def _start_timer():
+    g._request_t0 = time.perf_counter()
+
+
+@bp.after_request
+def _record_request(response):
+    t0 = g.pop("_request_t0", None)
+    endpoint = request.endpoint or "unknown"
+    if t0 is not None:
+        HTTP_SECONDS.labels(endpoint=endpoint).observe(time.perf_counter() - t0)
+    HTTP_REQUESTS.labels(endpoint=endpoint, status=response.status_code).inc()
+    return response
+
+
+@bp.errorhandler(SharedStateError)
+def _shared_state_unavailable(e):
+    return jsonify({"error": str(e)}), 503
+
 
 @bp.route("/")
 def index_page():
@@ -10,14 +58,118 @@ def index_page():
 
 @bp.route("/api/graph")
 def api_graph():
+    """
+    По умолчанию — граф сервисов или его выборка (см. _graph_query).
+    ?service=X&level=route — маршрутный подграф одного сервиса: строится
+    только по запросу, чтобы основной ответ оставался компактным.
+    ?at=<ISO-8601 или unix-время> — граф сервисов на момент at из истории
+    (время ингеста, с точностью TIMELINE_DELTA_INTERVAL).
+    """
+    if "at" in request.args:
+        return _graph_at(request.args["at"])
+    gs = current_app.graph_state
+    level = request.args.get("level", "service")
+    if level == "service":
+        return _graph_query(gs)
+    if level != "route":
+        return jsonify({"error": f"unknown level: {level}"}), 400
+
+    service = request.args.get("service")
+    if not service:
+        return jsonify({"error": "level=route requires service"}), 400
+    view = gs.export_routes(service)
+    if view is None:
+        return jsonify({"error": f"unknown service: {service}"}), 404
+    return jsonify(view)
+
+
+def _graph_at(raw: str):
+    timeline = current_app.timeline
+    if timeline is None:
+        return jsonify({"error": "timeline is disabled"}), 404
+    at = parse_timestamp(raw)
+    if at is None or not 0 <= at <= MAX_AT:
+        return jsonify({"error": f"bad timestamp: {raw}"}), 400
+    state = timeline.state_at(at)
+    if state is None:
+        bounds = timeline.bounds()
+        since = f" (history starts at {bounds[0]:.3f})" if bounds else ""
+        return jsonify({"error": f"no history at {at:.3f}{since}"}), 404
+    out = state.export()
+    out["at"] = at
+    out["state_at"] = state.at
+    return jsonify(out)
+
+
+def _graph_query(gs):
+    """
+    Без параметров — весь граф. Параметры выборки (можно сочетать):
+      service=X&hops=K       — окрестность сервиса на K шагов в обе стороны;
+      status=critical,warning — сервисы с этими статусами и рёбра в них;
+      top=K&sort=latency|p99|score — K худших рёбер.
+    """
+    args = request.args
+    service = args.get("service")
+    statuses = [s for s in args.get("status", "").split(",") if s]
+    top = args.get("top", type=int)
+    if service is None and not statuses and top is None:
+        return jsonify(gs.export())
+
+    hops = args.get("hops", 1, type=int)
+    sort = args.get("sort", "latency")
+    if not 0 <= hops <= GRAPH_MAX_HOPS:
+        return jsonify({"error": f"hops must be between 0 and {GRAPH_MAX_HOPS}"}), 400
+    if top is not None and top <= 0:
+        return jsonify({"error": "top must be positive"}), 400
+    if sort not in SORT_KEYS:
+        return jsonify({"error": f"unknown sort: {sort}"}), 400
+    unknown = [s for s in statuses if s not in STATUSES]
+    if unknown:
+        return jsonify({"error": f"unknown status: {','.join(unknown)}"}), 400
+
+    view = gs.export_query(service, hops, top, sort, statuses)
+    if view is None:
+        return jsonify({"error": f"unknown service: {service}"}), 404
+    return jsonify(view)
+
+
+@bp.route("/api/scores")
+def api_scores():
+    """Гибридный рейтинг узких мест: top рёбер по score и узлы по bottleneck_score."""
     gs = current_app.graph_state
-    return jsonify(gs.export())
+    top = request.args.get("top", 20, type=int)
+    if top <= 0:
+        return jsonify({"error": "top must be positive"}), 400
+
+    view = gs.export_query(None, 1, top, "score", None)
+    # составляющие score есть только там, где работает скоринг (не в shared-воркере)
+    scorer = getattr(gs, "scorer", None)
+    if scorer is not None:
+        for e in view["edges"]:
+            e.update(scorer.components((e["source"], e["target"])))
+
+    nodes = sorted(gs.export()["nodes"], key=lambda n: n["bottleneck_score"], reverse=True)
+    return jsonify({
+        "edges": view["edges"],
+        "nodes": [n for n in nodes[:top] if n["bottleneck_score"] > 0],
+        "scoring": scorer.stats() if scorer is not None else None,
+    })
 
 
 @bp.route("/api/logs")
 def api_logs():
+    """
+    Лента последних строк. ?since=<seq> — только записи новее (курсор из поля next
+    прошлого ответа); фильтры: service=X (источник или приёмник), min_latency=N.
+    """
+    args = request.args
+    since = args.get("since", 0, type=int)
+    min_latency = args.get("min_latency", type=float)
+    limit = args.get("limit", LOGS_QUERY_LIMIT, type=int)
+    if since < 0 or limit <= 0:
+        return jsonify({"error": "since must be >= 0 and limit positive"}), 400
     gs = current_app.graph_state
-    return jsonify({"logs": list(gs.recent_logs)})
+    return jsonify(gs.recent_logs.query(since, args.get("service"), min_latency, min(limit, LOGS_QUERY_LIMIT)))
 
 
 @bp.route("/api/alerts")
@@ -31,14 +183,103 @@ def api_stats():
     gs = current_app.graph_state
     ae = current_app.alert_engine
 
-    derived_total_logs = sum(e.count for e in gs.edges.values())
-    gs.total_logs = derived_total_logs
+    sampler = getattr(gs, "sampler", None)
 
-    return jsonify(
-        {
-            "total_logs": derived_total_logs,
+    # total_logs ведёт ингест и он монотонен: строки вытесненных рёбер
+    # в нём остаются и отдельно видны в memory.evicted_logs
+    with getattr(gs, "lock", nullcontext()):
+        stats = {
+            "total_logs": gs.total_logs,
             "active_nodes": gs.active_nodes_count(),
-            "status": ae.overall_status(),
             "max_flow": gs.global_max_flow,
+            "memory": gs.memory_stats(),
         }
-    )
+    stats["status"] = ae.overall_status()
+    # доля строк, попавших в окна задержек: < 1 — avg/p99 по выборке
+    stats["sampling"] = sampler.stats() if sampler is not None else None
+    return jsonify(stats)
+
+
+@bp.route("/api/metrics")
+def api_metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@bp.route("/api/ingest", methods=["POST"])
+def api_ingest():
+    """
+    Пакет спанов: NDJSON / JSON-массив (application/json, application/x-ndjson)
+    или CSV в формате лог-файла (text/csv). 202 — пакет в очереди,
+    429 — очередь полна, повторить через Retry-After.
+    """
+    pipeline = current_app.ingest_pipeline
+    if pipeline is None:
+        return jsonify({"error": "ingest is not running in this process"}), 503
+
+    if request.content_length is not None and request.content_length > INGEST_MAX_BODY:
+        return jsonify({"error": f"body larger than {INGEST_MAX_BODY} bytes"}), 413
+    data = request.get_data(cache=False)
+    if len(data) > INGEST_MAX_BODY:
+        return jsonify({"error": f"body larger than {INGEST_MAX_BODY} bytes"}), 413
+
+    batch = parse_payload(data, request.content_type)
+    try:
+        shed = pipeline.submit(batch, source="http")
+    except QueueFull as e:
+        resp = jsonify({"error": str(e), "queued": pipeline.depth})
+        resp.status_code = 429
+        resp.headers["Retry-After"] = "1"
+        return resp
+
+    return jsonify({
+        "accepted": len(batch),
+        "errors": batch.errors,
+        "shed": shed,
+        "queued": pipeline.depth,
+    }), 202
+
+
+@bp.route("/api/scenarios", methods=["POST"])
+def api_scenarios():
+    """
+    What-if по пропускной способности: {"scenarios": [...], "source": "api-gateway"}.
+    Формат сценария — в app/scenarios.py. Считается по замороженной копии
+    графа в пуле процессов, результаты кэшируются по версии графа.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "expected a JSON object"}), 400
+    try:
+        result = current_app.scenario_engine.run(body.get("scenarios"), body.get("source"))
+    except ScenarioError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+
+def _require_admin():
+    if ADMIN_TOKEN and request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        abort(403)
+
+
+@bp.route("/api/admin/profile")
+def api_admin_profile():
+    _require_admin()
+    if not PROFILER_ENABLED:
+        abort(404)
+
+    seconds = request.args.get("seconds", 5.0, type=float)
+    interval = request.args.get("interval", 0.005, type=float)
+    fmt = request.args.get("format", "collapsed")
+    if fmt not in ("collapsed", "speedscope", "summary"):
+        return jsonify({"error": f"unknown format: {fmt}"}), 400
+
+    try:
+        prof = profile(seconds, interval, PROFILER_MAX_SECONDS, PROFILER_MIN_INTERVAL)
+    except ProfilerBusy as e:
+        return jsonify({"error": str(e)}), 409
+
+    if fmt == "collapsed":
+        return Response(prof.collapsed(), mimetype="text/plain")
+    if fmt == "speedscope":
+        return jsonify(prof.speedscope())
+    return jsonify(prof.summary())
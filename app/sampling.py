@@ -0,0 +1,112 @@
+import random
+from threading import Event, Thread
+from typing import Callable, Optional
+
+from .config import (
+    SAMPLING_CHECK_INTERVAL,
+    SAMPLING_ENTER_LAG,
+    SAMPLING_EXIT_LAG,
+    SAMPLING_MIN_RATE,
+    SAMPLING_OUTLIER_RATIO,
+)
+from .metrics import REGISTRY
+
+SAMPLING_RATE = REGISTRY.gauge("mbd_sampling_rate", "Share of latency observations applied in full (1 = no sampling)")
+SAMPLING_RECORDS = REGISTRY.counter(
+    "mbd_sampling_records_total", "Records by sampling decision (full or counted only)", ["result"]
+)
+
+# Режим перегрузки ингеста. Пока писатель успевает, каждая строка проходит
+# полный путь: окно задержек, индекс, алерты, recent_logs. Когда отставание
+# (в сервере — записи в очереди IngestPipeline) растёт выше enter_lag,
+# строка с вероятностью 1 - rate только
+# учитывается: count и last_latency ребра точные, окно и алерты не трогаются
+# (алерты смотрят только на окно, так что пропуск их не меняет).
+# Выбросы — задержка >= outlier_ratio * avg ребра — применяются всегда,
+# чтобы всплески не терялись именно во время инцидента.
+#
+# rate подстраивается раз в check_interval: пока отставание растёт или стоит
+# выше enter_lag (очередь ограничена и упирается в потолок) — вдвое меньше
+# (не ниже min_rate), пока сокращается — плавно обратно. Режим
+# выключается, только когда отставание упало ниже exit_lag (гистерезис).
+
+
+class AdaptiveSampler:
+    def __init__(self, lag: Callable[[], float], enter_lag: float = SAMPLING_ENTER_LAG,
+                 exit_lag: float = SAMPLING_EXIT_LAG, min_rate: float = SAMPLING_MIN_RATE,
+                 outlier_ratio: float = SAMPLING_OUTLIER_RATIO, check_interval: float = SAMPLING_CHECK_INTERVAL,
+                 seed: Optional[int] = None):
+        self._lag = lag
+        self.enter_lag = enter_lag
+        self.exit_lag = exit_lag
+        self.min_rate = min_rate
+        self.outlier_ratio = outlier_ratio
+        self.check_interval = check_interval
+
+        self.rate = 1.0
+        self.active = False
+        self.last_lag = 0.0
+        self.activations = 0
+        self.full = 0
+        self.counted = 0
+        self._rng = random.Random(seed)
+        self._full = SAMPLING_RECORDS.labels(result="full")
+        self._counted = SAMPLING_RECORDS.labels(result="counted")
+        self._stop = Event()
+        SAMPLING_RATE.set_function(lambda: self.rate)
+
+    def keep(self) -> bool:
+        """Применять ли запись целиком; выбросы проверяет GraphState.count_from_log."""
+        return self.rate >= 1.0 or self._rng.random() < self.rate
+
+    def record(self, full: int, counted: int) -> None:
+        """Итог пакета: сколько записей применено целиком и сколько только учтено."""
+        self.full += full
+        self.counted += counted
+        if full:
+            self._full.inc(full)
+        if counted:
+            self._counted.inc(counted)
+
+    def adjust(self) -> None:
+        lag = float(self._lag())
+        if not self.active:
+            if lag > self.enter_lag:
+                self.active = True
+                self.activations += 1
+                self.rate = 0.5
+                print(f">>> Ingest overloaded (lag {lag:.0f}): sampling latencies at {self.rate:.2f}")
+        elif lag < self.exit_lag:
+            self.active = False
+            self.rate = 1.0
+            print(f">>> Ingest caught up (lag {lag:.0f}): sampling off")
+        elif lag > self.last_lag or (lag == self.last_lag and lag > self.enter_lag):
+            self.rate = max(self.min_rate, self.rate / 2)
+        elif lag < self.last_lag:
+            self.rate = min(1.0, self.rate + 0.1)
+        self.last_lag = lag
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "rate": round(self.rate, 4),
+            "lag": self.last_lag,
+            "activations": self.activations,
+            "full": self.full,
+            "counted": self.counted,
+        }
+
+    def run_blocking(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.adjust()
+            except Exception as e:
+                print(f">>> Sampler error: {e}")
+
+    def start(self) -> Thread:
+        t = Thread(target=self.run_blocking, name="AdaptiveSampler", daemon=True)
+        t.start()
+        return t
+
+    def stop(self) -> None:
+        self._stop.set()
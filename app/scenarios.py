@@ -0,0 +1,291 @@
+import json
+import math
+import multiprocessing as mp
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from .config import (
+    FLOW_SOURCE,
+    SCENARIO_CACHE_SIZE,
+    SCENARIO_FREEZE_INTERVAL,
+    SCENARIO_MAX_BATCH,
+    SCENARIO_WORKERS,
+)
+from .flow_analyzer import FALLBACK_CAPACITY, FlowAnalyzer
+from .metrics import REGISTRY, STAGE_SECONDS
+
+SCENARIO_RESULTS = REGISTRY.counter(
+    "mbd_scenarios_total", "What-if scenarios answered, from cache or computed", ["result"]
+)
+_SCENARIO_TIME = STAGE_SECONDS.labels(stage="scenario")
+
+# What-if анализ пропускной способности. Сценарий — набор правок поверх
+# замороженной копии графа:
+#   scale     {"db-user": 2}          — сервис в 2 раза быстрее: ёмкость входящих рёбер x2
+#   replicas  {"auth-service": 1}     — ещё одна реплика: ёмкость входящих рёбер x(1 + n)
+#   capacity  {"a->b": 0.05}          — ёмкость ребра задаётся явно
+#   add_edges [{"source": "a", "target": "b", "capacity": 0.1}]
+#             — новое ребро; без capacity — как у лучшего входящего ребра target
+# Ответ — max-flow и рёбра min-cut каждого сценария и их отличие от базы.
+
+Key = Tuple[str, str]
+
+
+class ScenarioError(ValueError):
+    pass
+
+
+@dataclass
+class FrozenGraph:
+    """Копия ёмкостей графа на момент version; по ней считаются все сценарии пачки."""
+    version: int
+    frozen_at: float
+    nodes: Tuple[str, ...]
+    capacities: Dict[Key, float]
+
+
+def _edge_key(raw: str) -> Key:
+    src, sep, dst = str(raw).partition("->")
+    if not sep or not src or not dst:
+        raise ScenarioError(f"edge must look like 'src->dst': {raw!r}")
+    return src, dst
+
+
+def _number(value, what: str, minimum: float = 0.0) -> float:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ScenarioError(f"{what} must be a number")
+    if not math.isfinite(value) or value < minimum:
+        raise ScenarioError(f"{what} must be a finite number >= {minimum}")
+    return value
+
+
+def _mapping(raw: dict, field: str) -> dict:
+    value = raw.get(field) or {}
+    if not isinstance(value, dict):
+        raise ScenarioError(f"{field} must be an object")
+    return value
+
+
+def parse_scenario(raw) -> dict:
+    """Проверяет сценарий и приводит к каноническому виду — он же ключ кэша."""
+    if not isinstance(raw, dict):
+        raise ScenarioError("scenario must be an object")
+    unknown = set(raw) - {"name", "scale", "replicas", "capacity", "add_edges"}
+    if unknown:
+        raise ScenarioError(f"unknown scenario fields: {', '.join(sorted(unknown))}")
+
+    scale = {str(k): _number(v, f"scale[{k}]") for k, v in _mapping(raw, "scale").items()}
+    replicas = {str(k): int(_number(v, f"replicas[{k}]", 1)) for k, v in _mapping(raw, "replicas").items()}
+    capacity = {}
+    for k, v in _mapping(raw, "capacity").items():
+        _edge_key(k)
+        capacity[str(k)] = _number(v, f"capacity[{k}]")
+
+    raw_edges = raw.get("add_edges") or []
+    if not isinstance(raw_edges, list):
+        raise ScenarioError("add_edges must be a list")
+    add_edges = []
+    for e in raw_edges:
+        if not isinstance(e, dict) or not e.get("source") or not e.get("target"):
+            raise ScenarioError("add_edges items need source and target")
+        cap = e.get("capacity")
+        add_edges.append([str(e["source"]), str(e["target"]),
+                          None if cap is None else _number(cap, "add_edges capacity")])
+
+    return {
+        "scale": scale,
+        "replicas": replicas,
+        "capacity": capacity,
+        "add_edges": sorted(add_edges, key=lambda e: (e[0], e[1])),
+    }
+
+
+def scenario_key(scenario: dict) -> str:
+    return json.dumps(scenario, sort_keys=True, separators=(",", ":"))
+
+
+def apply_scenario(graph: FrozenGraph, scenario: dict) -> Tuple[List[str], Dict[Key, float]]:
+    caps = dict(graph.capacities)
+    nodes = list(graph.nodes)
+    known = set(nodes)
+
+    factors: Dict[str, float] = {}
+    for service, factor in scenario["scale"].items():
+        factors[service] = factors.get(service, 1.0) * factor
+    for service, n in scenario["replicas"].items():
+        factors[service] = factors.get(service, 1.0) * (1 + n)
+    if factors:
+        for (src, dst), cap in caps.items():
+            if dst in factors:
+                caps[(src, dst)] = cap * factors[dst]
+
+    for edge, cap in scenario["capacity"].items():
+        caps[_edge_key(edge)] = cap
+
+    for src, dst, cap in scenario["add_edges"]:
+        if cap is None:
+            incoming = [c for (_, d), c in caps.items() if d == dst]
+            cap = max(incoming) if incoming else FALLBACK_CAPACITY
+        caps[(src, dst)] = cap
+        for name in (src, dst):
+            if name not in known:
+                known.add(name)
+                nodes.append(name)
+    return nodes, caps
+
+
+def evaluate_batch(graph: FrozenGraph, source: str, scenarios: List[dict]) -> List[Tuple[float, List[Key]]]:
+    """Выполняется в процессе пула: max-flow и min-cut для каждого сценария."""
+    analyzer = FlowAnalyzer(source_node=source, verbose=False)
+    out = []
+    for scenario in scenarios:
+        nodes, caps = apply_scenario(graph, scenario)
+        flow, cut = analyzer.analyze_capacities(nodes, caps)
+        out.append((flow, sorted(cut)))
+    return out
+
+
+_BASELINE = parse_scenario({})
+
+
+class ScenarioEngine:
+    """
+    Пул процессов для what-if сценариев и кэш результатов по
+    (версия замороженного графа, источник, сценарий).
+    """
+
+    def __init__(self, graph_state, workers: int = SCENARIO_WORKERS, cache_size: int = SCENARIO_CACHE_SIZE,
+                 freeze_interval: float = SCENARIO_FREEZE_INTERVAL, source: str = FLOW_SOURCE,
+                 max_batch: int = SCENARIO_MAX_BATCH):
+        self._gs = graph_state
+        self.workers = workers
+        self.cache_size = cache_size
+        self.freeze_interval = freeze_interval
+        self.source = source
+        self.max_batch = max_batch
+
+        self._lock = Lock()
+        self._frozen: Optional[FrozenGraph] = None
+        self._cache: "OrderedDict[tuple, Tuple[float, List[Key]]]" = OrderedDict()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: в процессе сервера уже работают потоки ингеста
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=mp.get_context("spawn"))
+        return self._pool
+
+    def freeze(self) -> FrozenGraph:
+        """
+        Замороженная копия ёмкостей. При живом ингесте версия меняется на каждой
+        строке лога, поэтому копия переиспользуется freeze_interval секунд —
+        иначе кэш по версии никогда бы не срабатывал.
+        """
+        with self._lock:
+            frozen = self._frozen
+            now = time.time()
+            if frozen is not None and (frozen.version == self._gs.version
+                                       or now - frozen.frozen_at < self.freeze_interval):
+                return frozen
+
+        # версия и граф — одним снимком; у SharedGraphView блокировки нет,
+        # его поколение и так неизменяемо
+        gs = self._gs
+        with getattr(gs, "lock", nullcontext()):
+            version = gs.version
+            export = gs.export()
+        # ёмкость — 1 / неокруглённое среднее, как у живого max-flow (ScoringEngine):
+        # поле capacity в export округлено до 4 знаков и у медленных рёбер равно 0
+        capacities = {
+            (e["source"], e["target"]): 1.0 / e["avg_latency"] if e["avg_latency"] > 0 else FALLBACK_CAPACITY
+            for e in export["edges"]
+        }
+        frozen = FrozenGraph(version, time.time(), tuple(n["id"] for n in export["nodes"]), capacities)
+        with self._lock:
+            self._frozen = frozen
+        return frozen
+
+    def _compute(self, graph: FrozenGraph, source: str, scenarios: List[dict]) -> List[Tuple[float, List[Key]]]:
+        if self.workers <= 0 or len(scenarios) == 1:
+            return evaluate_batch(graph, source, scenarios)
+        # граф уходит в процесс один раз на пачку, а не на каждый сценарий
+        n = min(self.workers, len(scenarios))
+        chunks = [scenarios[i::n] for i in range(n)]
+        futures = [self._get_pool().submit(evaluate_batch, graph, source, chunk) for chunk in chunks]
+        results: List[Optional[Tuple[float, List[Key]]]] = [None] * len(scenarios)
+        for i, future in enumerate(futures):
+            for j, result in enumerate(future.result()):
+                results[i + j * n] = result
+        return results
+
+    def run(self, raw_scenarios, source: Optional[str] = None) -> dict:
+        if not isinstance(raw_scenarios, list) or not raw_scenarios:
+            raise ScenarioError("scenarios must be a non-empty list")
+        if len(raw_scenarios) > self.max_batch:
+            raise ScenarioError(f"at most {self.max_batch} scenarios per request")
+        if source is None:
+            source = self.source
+        elif not isinstance(source, str) or not source:
+            raise ScenarioError("source must be a non-empty string")
+        parsed = [parse_scenario(raw) for raw in raw_scenarios]
+
+        with _SCENARIO_TIME.time():
+            graph = self.freeze()
+            keys = [(graph.version, source, scenario_key(s)) for s in [_BASELINE] + parsed]
+
+            with self._lock:
+                known = {k: self._cache[k] for k in keys if k in self._cache}
+                for k in known:
+                    self._cache.move_to_end(k)
+            todo: Dict[tuple, dict] = {}
+            for k, s in zip(keys, [_BASELINE] + parsed):
+                if k not in known:
+                    todo.setdefault(k, s)
+
+            if todo:
+                computed = dict(zip(todo, self._compute(graph, source, list(todo.values()))))
+                with self._lock:
+                    for k, result in computed.items():
+                        self._cache[k] = result
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+                known.update(computed)
+
+        SCENARIO_RESULTS.labels(result="cached").inc(len(keys) - len(todo))
+        SCENARIO_RESULTS.labels(result="computed").inc(len(todo))
+
+        base_flow, base_cut = known[keys[0]]
+        base_set = set(base_cut)
+        results = []
+        for raw, k in zip(raw_scenarios, keys[1:]):
+            flow, cut = known[k]
+            cut_set = set(cut)
+            results.append({
+                "name": raw.get("name"),
+                "max_flow": flow,
+                "max_flow_delta": round(flow - base_flow, 4),
+                "min_cut": [f"{u}->{v}" for u, v in cut],
+                "min_cut_added": [f"{u}->{v}" for u, v in cut if (u, v) not in base_set],
+                "min_cut_removed": [f"{u}->{v}" for u, v in base_cut if (u, v) not in cut_set],
+                "cached": k not in todo,
+            })
+
+        return {
+            "snapshot_version": graph.version,
+            "snapshot_age": round(time.time() - graph.frozen_at, 3),
+            "source": source,
+            "baseline": {"max_flow": base_flow, "min_cut": [f"{u}->{v}" for u, v in base_cut]},
+            "scenarios": results,
+        }
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
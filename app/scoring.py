@@ -0,0 +1,302 @@
+import time
+from collections import OrderedDict, deque
+from threading import Event, Thread
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+import networkx as nx
+
+from .config import (
+    FLOW_SOURCE,
+    SCORE_FLOW_BUDGET,
+    SCORE_REFRESH_INTERVAL,
+    SCORE_TRACE_MAX,
+    SCORE_TRACE_WINDOW,
+    SCORE_WEIGHTS,
+)
+from .flow_analyzer import FALLBACK_CAPACITY, default_sinks, is_db
+from .metrics import REGISTRY, STAGE_SECONDS
+
+SCORE_FLOW_SINKS = REGISTRY.counter("mbd_score_flow_sinks_total", "Per-sink min-cut recomputations")
+SCORE_TRACES = REGISTRY.gauge("mbd_score_open_traces", "Traces held for path bottleneck tracking")
+_SCORE_TIME = STAGE_SECONDS.labels(stage="score")
+
+# Живой гибридный рейтинг узких мест (как _hybrid_phase в tests/bottleneck_test.py),
+# но без пересчёта с нуля. Сигналы ребра:
+#   trace_struct — сколько путей трейсов (от корня до db-*) имеют самый медленный
+#                  шаг на этом ребре; максимум по пути протягивается от родителя
+#                  к потомку при приходе спана, окно — SCORE_TRACE_WINDOW путей;
+#   flow_struct  — для скольких стоков ребро в min-cut; стоки пересчитываются
+#                  по кругу, не дольше SCORE_FLOW_BUDGET секунд за тик;
+#   latency      — avg / LATENCY_CRIT, не больше 1;
+#   capacity     — штраф 1 - cap / max_cap.
+# score = W_STRUCT * struct / max_struct + W_LAT * latency + W_CAP * capacity.
+# Узел: bottleneck_score = сумма trace_struct + flow_struct его рёбер.
+
+Key = Tuple[str, str]
+
+LATENCY_CRIT = 200.0  # ms, как порог critical в models.latency_status
+# нормировки сдвигаются с каждой строкой лога; полный пересчёт — только если
+# они ушли дальше этой доли, иначе пересчитываются изменившиеся рёбра
+RENORM_TOLERANCE = 0.01
+
+
+class _Trace:
+    __slots__ = ("spans", "pending")
+
+    def __init__(self):
+        # span_id -> (задержка, ребро) самого медленного шага на пути от корня
+        self.spans: Dict[str, Tuple[float, Key]] = {}
+        # родитель ещё не пришёл: parent_id -> [(span_id, ребро, задержка)]
+        self.pending: Dict[str, List[Tuple[str, Key, float]]] = {}
+
+
+class ScoringEngine:
+    def __init__(self, graph_state, source: str = FLOW_SOURCE, refresh_interval: float = SCORE_REFRESH_INTERVAL,
+                 flow_budget: float = SCORE_FLOW_BUDGET, trace_window: int = SCORE_TRACE_WINDOW,
+                 max_traces: int = SCORE_TRACE_MAX, weights: Tuple[float, float, float] = SCORE_WEIGHTS):
+        self._gs = graph_state
+        self.source = source
+        self.refresh_interval = refresh_interval
+        self.flow_budget = flow_budget
+        self.max_traces = max_traces
+        self.w_struct, self.w_lat, self.w_cap = weights
+
+        self._traces: "OrderedDict[str, _Trace]" = OrderedDict()
+        self._hits: Deque[Key] = deque()
+        self.trace_window = trace_window
+
+        self.trace_struct: Dict[Key, int] = {}
+        self.flow_struct: Dict[Key, int] = {}
+        self._node_struct: Dict[str, int] = {}
+
+        self._cuts: Dict[str, Set[Key]] = {}
+        self._flows: Dict[str, float] = {}
+        self._sink_queue: Deque[str] = deque()
+        self._round_version: Optional[int] = None
+
+        self.edge_scores: Dict[Key, float] = {}
+        self._norm = (0.0, 0.0)
+        self._dirty_edges: Set[Key] = set()
+        self._dirty_nodes: Set[str] = set()
+        self.last_refresh_ms = 0.0
+        self._stop = Event()
+
+    # ---------- сигналы с ингеста (под gs.lock) ----------
+
+    def touch(self, key: Key) -> None:
+        """Ребро обновилось — его latency/capacity сигналы поменялись."""
+        self._dirty_edges.add(key)
+
+    def observe_span(self, trace_id: str, span_id: str, parent_id: str, key: Key, latency: float) -> None:
+        trace = self._traces.get(trace_id)
+        if trace is None:
+            trace = self._traces[trace_id] = _Trace()
+            if len(self._traces) > self.max_traces:
+                self._close_trace(self._traces.popitem(last=False)[1])
+        else:
+            self._traces.move_to_end(trace_id)
+
+        if parent_id and parent_id not in trace.spans:
+            trace.pending.setdefault(parent_id, []).append((span_id, key, latency))
+            return
+        self._resolve(trace, span_id, key, latency, trace.spans.get(parent_id) if parent_id else None)
+
+    def _resolve(self, trace: _Trace, span_id: str, key: Key, latency: float,
+                 base: Optional[Tuple[float, Key]]) -> None:
+        stack = [(span_id, key, latency, base)]
+        while stack:
+            sid, k, lat, base = stack.pop()
+            best = (lat, k) if base is None or lat > base[0] else base
+            trace.spans[sid] = best
+            if is_db(k[1]):
+                # путь от корня дошёл до БД: его узкое место — best
+                self._hit(best[1])
+            for child in trace.pending.pop(sid, ()):
+                stack.append((*child, best))
+
+    def _close_trace(self, trace: _Trace) -> None:
+        # родители так и не пришли — как в офлайн-анализе, такие спаны считаются корнями
+        for children in list(trace.pending.values()):
+            for sid, k, lat in children:
+                self._resolve(trace, sid, k, lat, None)
+        trace.pending.clear()
+
+    def _hit(self, key: Key) -> None:
+        self._hits.append(key)
+        self._add(self.trace_struct, key, 1)
+        if len(self._hits) > self.trace_window:
+            self._add(self.trace_struct, self._hits.popleft(), -1)
+
+    def _add(self, counts: Dict[Key, int], key: Key, delta: int) -> None:
+        value = counts.get(key, 0) + delta
+        if value:
+            counts[key] = value
+        else:
+            counts.pop(key, None)
+        for name in key:
+            self._node_struct[name] = self._node_struct.get(name, 0) + delta
+            self._dirty_nodes.add(name)
+        self._dirty_edges.add(key)
+
+    def forget(self, keys: Iterable[Key]) -> None:
+        """Рёбра вытеснены из графа — все за один проход sweep."""
+        keys = set(keys)
+        for key in keys:
+            for counts in (self.trace_struct, self.flow_struct):
+                n = counts.get(key)
+                if n:
+                    self._add(counts, key, -n)
+            self.edge_scores.pop(key, None)
+        self._dirty_edges -= keys
+        # счётчики обнулены — ребро не должно вычитаться ещё раз, когда его
+        # путь выйдет из окна или сток пересчитает разрез; окно — один проход
+        if not keys.isdisjoint(self._hits):
+            self._hits = deque(k for k in self._hits if k not in keys)
+        for cut in self._cuts.values():
+            cut -= keys
+
+    # ---------- max-flow по бюджету ----------
+
+    def _refresh_flow(self) -> List[Tuple[str, float, Set[Key]]]:
+        """Пересчитывает min-cut части стоков; вызывается без gs.lock."""
+        gs = self._gs
+        with gs.lock:
+            version = gs.version
+            nodes = list(gs.nodes)
+            capacities = [
+                (src, dst, 1.0 / m.avg_latency if m.avg_latency > 0 else FALLBACK_CAPACITY)
+                for (src, dst), m in gs.edges.items()
+            ]
+
+        sinks = [s for s in default_sinks(nodes) if s != self.source]
+        if not self._sink_queue:
+            # новый круг — только если граф изменился с начала предыдущего
+            if version == self._round_version:
+                return []
+            self._round_version = version
+            self._sink_queue.extend(sinks)
+        if self.source not in nodes or not self._sink_queue:
+            return []
+
+        G = nx.DiGraph()
+        G.add_weighted_edges_from(capacities, weight="capacity")
+        alive = set(sinks)
+        deadline = time.perf_counter() + self.flow_budget
+        results = []
+        # хотя бы один сток за тик, даже если бюджет меньше одного расчёта
+        while self._sink_queue and (not results or time.perf_counter() < deadline):
+            sink = self._sink_queue.popleft()
+            if sink not in alive or sink not in G:
+                results.append((sink, 0.0, set()))
+                continue
+            try:
+                flow, (reachable, _) = nx.minimum_cut(G, self.source, sink)
+            except nx.NetworkXException:
+                flow, reachable = 0.0, set()
+            cut = {(u, v) for u in reachable for v in G.successors(u) if v not in reachable}
+            results.append((sink, flow, cut))
+            SCORE_FLOW_SINKS.inc()
+        return results
+
+    def _apply_flow(self, results: List[Tuple[str, float, Set[Key]]]) -> None:
+        for sink, flow, cut in results:
+            old = self._cuts.pop(sink, set())
+            for key in old - cut:
+                self._add(self.flow_struct, key, -1)
+            for key in cut - old:
+                self._add(self.flow_struct, key, 1)
+            self._flows.pop(sink, None)
+            if cut or flow:
+                self._cuts[sink] = cut
+                self._flows[sink] = flow
+
+        gs = self._gs
+        gs.global_max_flow = round(sum(self._flows.values()), 4)
+        gs.bottleneck_edges = {key for key in self.flow_struct if key in gs.edges}
+
+    # ---------- гибридный рейтинг ----------
+
+    def _rescore(self) -> None:
+        gs = self._gs
+        combined = self.trace_struct.copy()
+        for key, n in self.flow_struct.items():
+            combined[key] = combined.get(key, 0) + n
+        max_struct = max(combined.values(), default=0)
+
+        # минимальная средняя задержка = максимальная ёмкость; берём из рейтинга индекса
+        gs.index.refresh()
+        ranked = gs.index.ranking("latency")
+        min_avg = next((-neg for neg, _ in reversed(ranked) if -neg > 0), 0.0)
+
+        old_struct, old_avg = self._norm
+        drift = abs(min_avg - old_avg) > RENORM_TOLERANCE * max(old_avg, 1e-9)
+        if max_struct != old_struct or drift:
+            self._norm = (max_struct, min_avg)
+            keys = gs.edges.keys()
+        else:
+            max_struct, min_avg = old_struct, old_avg
+            keys = self._dirty_edges
+
+        for key in list(keys):
+            m = gs.edges.get(key)
+            if m is None:
+                continue
+            s_norm = combined.get(key, 0) / max_struct if max_struct else 0.0
+            avg = m.avg_latency
+            lat_norm = min(avg / LATENCY_CRIT, 1.0) if avg > 0 else 0.0
+            cap_penalty = max(0.0, min(1.0 - min_avg / avg, 1.0)) if avg > 0 and min_avg > 0 else 0.0
+            score = self.w_struct * s_norm + self.w_lat * lat_norm + self.w_cap * cap_penalty
+            if self.edge_scores.get(key) != score:
+                self.edge_scores[key] = score
+                gs.index.touch(key)
+        self._dirty_edges.clear()
+
+        for name in self._dirty_nodes:
+            node = gs.nodes.get(name)
+            score = self._node_struct.get(name, 0)
+            if not score:
+                self._node_struct.pop(name, None)
+            if node is not None and node.bottleneck_score != score:
+                node.bottleneck_score = float(score)
+                gs.index.touch_node(name)
+        self._dirty_nodes.clear()
+
+    def refresh(self) -> None:
+        t0 = time.perf_counter()
+        results = self._refresh_flow()
+        with self._gs.lock, _SCORE_TIME.time():
+            if results:
+                self._apply_flow(results)
+            self._rescore()
+            SCORE_TRACES.set(len(self._traces))
+        self.last_refresh_ms = round((time.perf_counter() - t0) * 1000, 3)
+
+    def components(self, key: Key) -> dict:
+        return {
+            "score": self.edge_scores.get(key, 0.0),
+            "trace_struct": self.trace_struct.get(key, 0),
+            "flow_struct": self.flow_struct.get(key, 0),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "open_traces": len(self._traces),
+            "trace_paths": len(self._hits),
+            "flow_sinks": len(self._cuts),
+            "last_refresh_ms": self.last_refresh_ms,
+        }
+
+    def run_blocking(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f">>> Scoring refresh error: {e}")
+
+    def start(self) -> Thread:
+        t = Thread(target=self.run_blocking, name="ScoringEngine", daemon=True)
+        t.start()
+        return t
+
+    def stop(self) -> None:
+        self._stop.set()
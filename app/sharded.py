@@ -0,0 +1,236 @@
+import multiprocessing as mp
+import queue
+import time
+from collections import deque
+from threading import Thread
+from typing import Dict, List, Optional, Tuple
+
+from .compressed import open_log
+from .config import READ_CHUNK_SIZE, RECENT_LOGS_SIZE
+from .csv_parser import parse_block
+from .metrics import REGISTRY, STAGE_SECONDS
+
+SHARD_RECORDS = REGISTRY.counter(
+    "mbd_shard_records_total", "Records aggregated by ingest worker processes", ["worker"]
+)
+SHARD_DELTAS = REGISTRY.counter("mbd_shard_deltas_total", "Aggregate deltas merged into the graph")
+SHARD_INFLIGHT = REGISTRY.gauge("mbd_shard_inflight_chunks", "Chunks sent to workers but not merged yet")
+_MERGE_TIME = STAGE_SECONDS.labels(stage="merge")
+
+# Многопроцессный режим: сервер читает файл кусками целых строк и раздаёт
+# их воркерам по кругу. Воркер сам разбирает куски и копит по рёбрам
+# частичные агрегаты (число вызовов, последняя задержка, хвост задержек) —
+# они складываются в любом порядке, поэтому рёбра не нужно закреплять
+# за воркерами. Раз в publish_interval воркер отдаёт накопленную дельту,
+# сервер вливает её в GraphState через EdgeMetrics.merge.
+#
+# Файл читается на полной скорости: построчной паузы симуляции
+# (SIMULATION_INTERVAL) здесь нет, поэтому start_ingest включает этот режим
+# только при SIMULATION_INTERVAL = 0.
+
+RECENT = 200  # как окно EdgeMetrics.latencies
+RECENT_LOGS = RECENT_LOGS_SIZE  # как GraphState.recent_logs
+
+
+def _worker_main(index: int, inbox, outbox, publish_interval: float) -> None:
+    agg: Dict[Tuple[str, str, str, str], list] = {}
+    logs: deque = deque(maxlen=RECENT_LOGS)
+    acked: List[int] = []
+    records = errors = 0
+    next_publish = time.monotonic() + publish_interval
+
+    def publish():
+        nonlocal agg, acked, records, errors
+        if acked or agg:
+            delta = {key: (a[0], a[1], list(a[2])) for key, a in agg.items()}
+            outbox.put((index, delta, acked, list(logs), records, errors))
+        agg, acked, records, errors = {}, [], 0, 0
+        logs.clear()
+
+    while True:
+        try:
+            item = inbox.get(timeout=max(0.0, next_publish - time.monotonic()))
+        except queue.Empty:
+            item = ()
+        if item is None:
+            publish()
+            return
+
+        if item:
+            seq, block = item
+            batch = parse_block(block)
+            get = agg.get
+            # ключ — ребро маршрутов: рёбра сервисов GraphState соберёт из них при слиянии
+            for src, sr, dst, dr, latency in zip(batch.src, batch.src_route, batch.dst, batch.dst_route,
+                                                 batch.latency):
+                key = (src, sr, dst, dr)
+                a = get(key)
+                if a is None:
+                    a = agg[key] = [0, 0.0, deque(maxlen=RECENT)]
+                a[0] += 1
+                a[1] = latency
+                a[2].append(latency)
+            n = len(batch)
+            if n:
+                tail = range(max(0, n - RECENT_LOGS), n)
+                now = time.time()
+                logs.extend((batch.src[i], batch.dst[i], batch.latency[i], now) for i in tail)
+            records += n
+            errors += batch.errors
+            acked.append(seq)
+
+        if time.monotonic() >= next_publish:
+            publish()
+            next_publish = time.monotonic() + publish_interval
+
+
+class ShardedIngest:
+    """
+    Разбор и агрегация в N процессах, слияние дельт и алерты — в этом.
+    Смещение в файле фиксируется, когда слиты все куски до него.
+    """
+
+    def __init__(self, graph_state, alert_engine, log_file: str, workers: int,
+                 publish_interval: float = 0.2,
+                 chunk_size: int = READ_CHUNK_SIZE, max_inflight: int = 8, start_offset: int = 0):
+        self._gs = graph_state
+        self._ae = alert_engine
+        self.log_file = log_file
+        self.workers = workers
+        self.publish_interval = publish_interval
+        self.chunk_size = chunk_size
+
+        self.position = start_offset
+        self._read_pos = start_offset
+        self._pass = 0
+
+        # seq куска -> (проход, смещение конца); коммитим по порядку seq
+        self._chunks: Dict[int, Tuple[int, int]] = {}
+        self._merged = set()
+        self._next_commit = 0
+        self._seq = 0
+
+        # spawn, а не fork: в процессе сервера уже работают потоки
+        ctx = mp.get_context("spawn")
+        self._inboxes = [ctx.Queue(maxsize=max_inflight) for _ in range(workers)]
+        self._outbox = ctx.Queue()
+        self._procs = [
+            ctx.Process(target=_worker_main, args=(i, self._inboxes[i], self._outbox, publish_interval),
+                        name=f"IngestWorker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        self._records = [SHARD_RECORDS.labels(worker=str(i)) for i in range(workers)]
+        SHARD_INFLIGHT.set_function(lambda: len(self._chunks))
+
+    def offsets(self) -> dict:
+        return {self.log_file: self.position}
+
+    # ---------- раздача ----------
+
+    def submit_block(self, block: bytes, end: Optional[int] = None) -> None:
+        """Блок целых строк -> следующему воркеру; end — смещение конца блока в файле."""
+        seq = self._seq
+        self._seq += 1
+        self._chunks[seq] = (self._pass, end if end is not None else -1)
+        # при заполненной очереди воркера ждём — это и есть обратное давление на чтение
+        self._inboxes[seq % self.workers].put((seq, block))
+
+    def _read_file(self):
+        while True:
+            try:
+                self._read_pos = self.position
+                with open_log(self.log_file, self._read_pos) as f:
+                    rest = b""
+                    while True:
+                        chunk = f.read(self.chunk_size)
+                        if chunk:
+                            data = rest + chunk
+                            cut = data.rfind(b"\n") + 1
+                            rest = data[cut:]
+                            if cut:
+                                self._read_pos += cut
+                                self.submit_block(data[:cut], self._read_pos)
+                            continue
+
+                        if rest:
+                            self._read_pos += len(rest)
+                            self.submit_block(rest, self._read_pos)
+                            rest = b""
+                        # как LogReader: дошли до конца — проигрываем файл заново
+                        f.seek(0)
+                        self._pass += 1
+                        self._read_pos = 0
+                        with self._gs.lock:
+                            self.position = 0
+            except Exception as e:
+                print(f">>> Sharded reader error: {e}")
+                time.sleep(0.1)
+
+    # ---------- слияние ----------
+
+    def merge(self, delta: dict, logs: List[tuple]) -> None:
+        """Вливает дельту воркера в граф. Вызывается под gs.lock."""
+        touched = self._gs.merge_delta(delta)
+        normalize = self._gs.normalize
+        if normalize:
+            logs = [(normalize(src), normalize(dst), latency, ts) for src, dst, latency, ts in logs]
+        self._gs.recent_logs.extend(logs)
+        # трейсы воркеры не пересылают: в этом режиме у скоринга нет trace-сигнала
+        scorer = self._gs.scorer
+        if scorer is not None:
+            for key in touched:
+                scorer.touch(key)
+
+        # базовые линии учат каждый замер из хвоста дельты, но алерт проверяется
+        # раз на ребро сервисов; меток времени воркеры не пересылают — час недели по приёму
+        if self._ae is not None:
+            now = time.time()
+            samples: Dict[Tuple[str, str], List[float]] = {}
+            for (src, _, dst, _), (_, _, recent) in delta.items():
+                if normalize:
+                    src, dst = normalize(src), normalize(dst)
+                samples.setdefault((src, dst), []).extend(recent)
+            for (src, dst), latencies in samples.items():
+                self._ae.handle_samples(src, dst, latencies, now)
+
+    def _commit(self, acked: List[int]) -> None:
+        self._merged.update(acked)
+        while self._next_commit in self._merged:
+            self._merged.discard(self._next_commit)
+            pass_no, end = self._chunks.pop(self._next_commit)
+            if pass_no == self._pass and end >= 0:
+                self.position = end
+            self._next_commit += 1
+
+    def _merge_loop(self):
+        while True:
+            index, delta, acked, logs, records, errors = self._outbox.get()
+            t0 = time.perf_counter()
+            with self._gs.lock:
+                self.merge(delta, logs)
+                self._commit(acked)
+            _MERGE_TIME.observe(time.perf_counter() - t0)
+            SHARD_DELTAS.inc()
+            self._records[index].inc(records)
+
+    def start(self, read_file: bool = True) -> None:
+        for p in self._procs:
+            p.start()
+        Thread(target=self._merge_loop, name="ShardMerger", daemon=True).start()
+        if read_file:
+            Thread(target=self._read_file, name="ShardedReader", daemon=True).start()
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт, пока все отправленные куски будут слиты."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._chunks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self) -> None:
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for p in self._procs:
+            p.join(timeout=5)
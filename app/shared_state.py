@@ -0,0 +1,458 @@
+import json
+import random
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+from threading import Event, Thread
+from typing import Dict, List, Optional, Tuple
+
+from .config import RECENT_LOGS_SIZE, SHARED_STALE_AFTER
+from .graph_index import GraphIndex
+from .graph_state import route_view
+from .log_buffer import LogRingBuffer
+from .metrics import REGISTRY
+
+SHARED_PUBLISHES = REGISTRY.counter("mbd_shared_publishes_total", "Graph versions published to shared memory")
+SHARED_OVERFLOWS = REGISTRY.counter(
+    "mbd_shared_overflows_total", "Publishes skipped because the payload did not fit the shared slot"
+)
+SHARED_RETRIES = REGISTRY.counter("mbd_shared_read_retries_total", "Reads retried because a write was in progress")
+SHARED_BYTES = REGISTRY.gauge("mbd_shared_payload_bytes", "Size of the last published graph payload")
+
+# Разделяемая область для режима MBD_SERVING_MODE=shared: один процесс
+# ингеста (run_ingest.py) публикует граф, любое число WSGI-воркеров читает.
+#
+# Раскладка: заголовок области + два слота (двойной буфер). Писатель пишет
+# в неактивный слот и затем переключает active. У каждого слота свой
+# seqlock-счётчик: нечётный — идёт запись. Читатель берёт активный слот,
+# читает payload и проверяет, что счётчик не изменился, иначе повторяет.
+# Конфликт возможен, только если за время чтения прошло две публикации.
+#
+# Payload слота: таблица строк + массивы фиксированных записей для узлов, рёбер
+# и рёбер маршрутов + небольшой JSON с алертами и последними логами. Воркер
+# разбирает payload в dict один раз на поколение (не zero-copy): ответы
+# маршрутов — те же dict, что у GraphState.export, а разбор делится между
+# всеми запросами поколения.
+#
+# Перезапущенный писатель удаляет старую область и создаёт новую под тем же
+# именем; воркер, держащий старое отображение, видел бы замершее поколение.
+# Поэтому у области есть instance (случайный id писателя), а слот хранит
+# время публикации: если данные старше SHARED_STALE_AFTER, воркер заново
+# открывает область по имени, и если свежих данных нет и там — SharedStateError (503).
+
+MAGIC = b"MBDG"
+LAYOUT_VERSION = 5
+
+_REGION = struct.Struct("<4sIIIQQ")   # magic, layout, active, instance, generation, slot_size
+_SLOT = struct.Struct("<QQQd")        # seq, generation, length, published_at
+_HEAD = struct.Struct("<QdIIIII")     # total_logs, max_flow, strings, nodes, edges, routes, extra_len
+_NODE = struct.Struct("<IQdId")       # name, load, avg_latency, status, bottleneck_score
+_EDGE = struct.Struct("<IIQddddB")    # src, dst, count, last_latency, avg_latency, p99, score, is_bottleneck
+_ROUTE = struct.Struct("<IIIIQdd")    # src, src_route, dst, dst_route, count, last_latency, avg_latency
+
+_REGION_SIZE = 64
+_SLOT_HEADER = _SLOT.size
+
+
+class SharedStateError(Exception):
+    pass
+
+
+def _encode(export: dict, counts: Dict[Tuple[str, str], int], total_logs: int, extra: dict,
+            routes: List[tuple] = (), p99: Optional[Dict[Tuple[str, str], float]] = None) -> bytes:
+    p99 = p99 or {}
+    strings: Dict[str, int] = {}
+
+    def sid(s: str) -> int:
+        i = strings.get(s)
+        if i is None:
+            i = strings[s] = len(strings)
+        return i
+
+    nodes = b"".join(
+        _NODE.pack(sid(n["id"]), n["load"], n["avg_latency"], sid(n["status"]), n["bottleneck_score"])
+        for n in export["nodes"]
+    )
+    edges = b"".join(
+        _EDGE.pack(sid(e["source"]), sid(e["target"]), counts.get((e["source"], e["target"]), 0),
+                   e["latency"], e["avg_latency"], p99.get((e["source"], e["target"]), 0.0), e["score"],
+                   e["is_bottleneck"])
+        for e in export["edges"]
+    )
+    route_b = b"".join(
+        _ROUTE.pack(sid(src), sid(sr), sid(dst), sid(dr), count, last, avg)
+        for (src, sr, dst, dr), count, last, avg in routes
+    )
+    extra_b = json.dumps(extra, ensure_ascii=False).encode("utf-8")
+
+    blobs = [s.encode("utf-8") for s in strings]
+    ends, acc = [], 0
+    for b in blobs:
+        acc += len(b)
+        ends.append(acc)
+
+    return b"".join([
+        _HEAD.pack(total_logs, export["max_flow"], len(blobs), len(export["nodes"]), len(export["edges"]),
+                   len(routes), len(extra_b)),
+        struct.pack(f"<{len(ends)}I", *ends),
+        b"".join(blobs),
+        nodes,
+        edges,
+        route_b,
+        extra_b,
+    ])
+
+
+class SharedGraph:
+    """Разобранная версия графа; одна на поколение, общая для всех запросов воркера."""
+
+    def __init__(self, generation: int, published_at: float, payload: memoryview, instance: int = 0):
+        self.instance = instance
+        self.generation = generation
+        self.published_at = published_at
+
+        total_logs, max_flow, n_str, n_nodes, n_edges, n_routes, extra_len = _HEAD.unpack_from(payload, 0)
+        pos = _HEAD.size
+        ends = struct.unpack_from(f"<{n_str}I", payload, pos)
+        pos += 4 * n_str
+        blob = bytes(payload[pos:pos + (ends[-1] if ends else 0)])
+        pos += len(blob)
+        strings, start = [], 0
+        for end in ends:
+            strings.append(blob[start:end].decode("utf-8"))
+            start = end
+
+        nodes_out = []
+        for name, load, avg, status, score in _NODE.iter_unpack(payload[pos:pos + n_nodes * _NODE.size]):
+            nodes_out.append({
+                "id": strings[name],
+                "label": strings[name],
+                "load": load,
+                "avg_latency": avg,
+                "status": strings[status],
+                "bottleneck_score": score,
+            })
+        pos += n_nodes * _NODE.size
+
+        self.counts: Dict[Tuple[str, str], int] = {}
+        edges_out = []
+        bottlenecks = []
+        self.p99: Dict[Tuple[str, str], float] = {}
+        for s, d, count, last, avg, p99, score, bott in _EDGE.iter_unpack(payload[pos:pos + n_edges * _EDGE.size]):
+            src, dst = strings[s], strings[d]
+            self.counts[(src, dst)] = count
+            self.p99[(src, dst)] = p99
+            edges_out.append({
+                "id": f"{src}->{dst}",
+                "source": src,
+                "target": dst,
+                "latency": last,
+                "avg_latency": avg,
+                "capacity": round(1.0 / avg, 4) if avg else None,
+                "is_bottleneck": bool(bott),
+                "score": score,
+            })
+            if bott:
+                bottlenecks.append(f"{src}->{dst}")
+        pos += n_edges * _EDGE.size
+
+        self.routes = [
+            ((strings[s], strings[sr], strings[d], strings[dr]), count, last, avg)
+            for s, sr, d, dr, count, last, avg in _ROUTE.iter_unpack(payload[pos:pos + n_routes * _ROUTE.size])
+        ]
+        self._routes_by_service: Optional[Dict[str, list]] = None
+        self._index: Optional[GraphIndex] = None
+        pos += n_routes * _ROUTE.size
+
+        extra = json.loads(bytes(payload[pos:pos + extra_len]).decode("utf-8"))
+
+        self.total_logs = total_logs
+        self.max_flow = max_flow
+        self.export = {
+            "nodes": nodes_out,
+            "edges": edges_out,
+            "max_flow": max_flow,
+            "bottlenecks": bottlenecks,
+        }
+        self.alerts: List[dict] = extra["alerts"]
+        self.status: str = extra["status"]
+        # кольцо с теми же seq, что у писателя: курсор клиента переживает смену воркера
+        self.logs = LogRingBuffer(RECENT_LOGS_SIZE)
+        self.logs.load(*extra["logs"])
+        self.memory: dict = extra.get("memory", {})
+
+    def export_query(self, service: Optional[str] = None, hops: int = 1, top: Optional[int] = None,
+                     sort: str = "latency", statuses=None) -> Optional[dict]:
+        if self._index is None:
+            # индекс строится при первом запросе с параметрами в этом поколении
+            nodes = {n["id"]: n for n in self.export["nodes"]}
+            edges = {(e["source"], e["target"]): e for e in self.export["edges"]}
+            values = {
+                key: (e["avg_latency"], self.p99.get(key, 0.0), e["score"])
+                for key, e in edges.items()
+            }
+            index = GraphIndex(values.get, lambda name: nodes[name]["status"])
+            index.rebuild(edges, nodes)
+            self._nodes_by_id, self._edges_by_key, self._index = nodes, edges, index
+        if service is not None and service not in self._nodes_by_id:
+            return None
+
+        nodes, edges = self._index.select(service, hops, top, sort, statuses)
+        if nodes is None:
+            nodes = self._nodes_by_id
+        if edges is None:
+            edges = self._edges_by_key
+        return {
+            "nodes": [self._nodes_by_id[name] for name in nodes],
+            "edges": [dict(self._edges_by_key[key], p99=self.p99.get(key, 0.0)) for key in edges],
+            "max_flow": self.max_flow,
+            "bottlenecks": [b for b in self.export["bottlenecks"]
+                            if all(name in nodes for name in b.split("->", 1))],
+            "total_nodes": len(self._nodes_by_id),
+            "total_edges": len(self._edges_by_key),
+        }
+
+    def export_routes(self, service: str) -> Optional[dict]:
+        if self._routes_by_service is None:
+            # индекс строится при первом drill-down в этом поколении, а не на каждый разбор
+            index: Dict[str, list] = {n["id"]: [] for n in self.export["nodes"]}
+            for row in self.routes:
+                src, _, dst, _ = row[0]
+                index.setdefault(src, []).append(row)
+                if dst != src:
+                    index.setdefault(dst, []).append(row)
+            self._routes_by_service = index
+        rows = self._routes_by_service.get(service)
+        if rows is None:
+            return None
+        bottlenecks = {tuple(b.split("->", 1)) for b in self.export["bottlenecks"]}
+        return route_view(service, rows, bottlenecks)
+
+
+class SharedGraphWriter:
+    """Владелец области: создаёт её и периодически публикует GraphState."""
+
+    def __init__(self, name: str, size: int, graph_state, alert_engine, interval: float = 0.5):
+        self._gs = graph_state
+        self._ae = alert_engine
+        self.interval = interval
+        self.name = name
+        self._stop = Event()
+
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # осталась от упавшего процесса ингеста — пересоздаём
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        self.slot_size = (self.shm.size - _REGION_SIZE) // 2
+        self.instance = random.getrandbits(32)
+        self.generation = 0
+        self._active = 0
+        buf = self.shm.buf
+        buf[:_REGION_SIZE] = bytes(_REGION_SIZE)
+        for i in range(2):
+            _SLOT.pack_into(buf, self._slot_offset(i), 0, 0, 0, 0.0)
+        _REGION.pack_into(buf, 0, MAGIC, LAYOUT_VERSION, 0, self.instance, 0, self.slot_size)
+
+    def _slot_offset(self, i: int) -> int:
+        return _REGION_SIZE + i * self.slot_size
+
+    def publish(self) -> bool:
+        gs, ae = self._gs, self._ae
+        with gs.lock:
+            export = gs.export()
+            counts = {key: m.count for key, m in gs.edges.items()}
+            routes = [(rkey, m.count, m.last_latency, m.avg_latency) for rkey, m in gs.route_edges.items()]
+            # p99 берём из индекса: он пересчитывает только изменившиеся рёбра
+            gs.index.refresh()
+            p99 = {key: values[1] for key, values in gs.index.values.items()}
+            total_logs = gs.total_logs
+            extra = {
+                "alerts": ae.get_alerts() if ae is not None else [],
+                "status": ae.overall_status() if ae is not None else "ok",
+                "logs": gs.recent_logs.dump(),
+                "memory": gs.memory_stats(),
+            }
+        payload = _encode(export, counts, total_logs, extra, routes, p99)
+        SHARED_BYTES.set(len(payload))
+        if len(payload) > self.slot_size - _SLOT_HEADER:
+            SHARED_OVERFLOWS.inc()
+            print(f">>> Shared graph payload {len(payload)} bytes does not fit slot {self.slot_size}")
+            return False
+
+        buf = self.shm.buf
+        slot = 1 - self._active
+        off = self._slot_offset(slot)
+        seq = _SLOT.unpack_from(buf, off)[0]
+        generation = self.generation + 1
+
+        _SLOT.pack_into(buf, off, seq + 1, generation, len(payload), time.time())
+        buf[off + _SLOT_HEADER:off + _SLOT_HEADER + len(payload)] = payload
+        _SLOT.pack_into(buf, off, seq + 2, generation, len(payload), time.time())
+
+        _REGION.pack_into(buf, 0, MAGIC, LAYOUT_VERSION, slot, self.instance, generation, self.slot_size)
+        self._active = slot
+        self.generation = generation
+        SHARED_PUBLISHES.inc()
+        return True
+
+    def run_blocking(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.publish()
+            except Exception as e:
+                print(f">>> Shared graph publish error: {e}")
+
+    def start(self) -> Thread:
+        t = Thread(target=self.run_blocking, name="SharedGraphWriter", daemon=True)
+        t.start()
+        return t
+
+    def close(self) -> None:
+        self._stop.set()
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedGraphView:
+    """
+    Читатель области в WSGI-воркере. Поверх неё — тот же интерфейс чтения,
+    что у GraphState/AlertEngine в маршрутах (export, recent_logs, get_alerts...).
+    Пока поколение не сменилось, запрос не разбирает payload заново.
+    """
+
+    def __init__(self, name: str, max_retries: int = 100, stale_after: float = SHARED_STALE_AFTER):
+        self.name = name
+        self.max_retries = max_retries
+        self.stale_after = stale_after
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        self._graph: Optional[SharedGraph] = None
+        self._attached_at = 0.0
+
+    def _attach(self) -> shared_memory.SharedMemory:
+        if self.shm is None:
+            try:
+                shm = shared_memory.SharedMemory(name=self.name)
+            except FileNotFoundError:
+                raise SharedStateError(f"shared graph '{self.name}' is not published yet")
+            # до 3.13 трекер ресурсов удаляет сегмент при выходе любого
+            # подключившегося процесса — владелец здесь только писатель
+            resource_tracker.unregister(shm._name, "shared_memory")
+            self.shm = shm
+            self._attached_at = time.monotonic()
+        return self.shm
+
+    def _detach(self) -> None:
+        shm, self.shm, self._graph = self.shm, None, None
+        if shm is not None:
+            try:
+                shm.close()
+            except BufferError:
+                # на буфер ещё ссылается разбор в другом потоке — отображение закроет GC
+                pass
+
+    def read(self) -> SharedGraph:
+        graph = self._read()
+        age = time.time() - graph.published_at
+        if age <= self.stale_after:
+            return graph
+        # писатель мог перезапуститься в новой области с тем же именем;
+        # переподключаемся не чаще раза в stale_after
+        if time.monotonic() - self._attached_at > self.stale_after:
+            self._detach()
+            graph = self._read()
+            age = time.time() - graph.published_at
+            if age <= self.stale_after:
+                return graph
+        raise SharedStateError(f"shared graph '{self.name}' is stale: last published {age:.1f}s ago")
+
+    def _read(self) -> SharedGraph:
+        buf = self._attach().buf
+        for _ in range(self.max_retries):
+            magic, layout, active, instance, generation, slot_size = _REGION.unpack_from(buf, 0)
+            if magic != MAGIC or layout != LAYOUT_VERSION:
+                raise SharedStateError("shared graph region has unknown layout")
+            if generation == 0:
+                raise SharedStateError(f"shared graph '{self.name}' is not published yet")
+
+            cached = self._graph
+            if cached is not None and cached.generation == generation and cached.instance == instance:
+                return cached
+
+            off = _REGION_SIZE + active * slot_size
+            seq, slot_gen, length, published_at = _SLOT.unpack_from(buf, off)
+            if seq & 1:
+                SHARED_RETRIES.inc()
+                continue
+            try:
+                graph = SharedGraph(slot_gen, published_at, buf[off + _SLOT_HEADER:off + _SLOT_HEADER + length],
+                                    instance)
+            except (struct.error, ValueError, IndexError):
+                # разбирали слот, который в этот момент переписывался
+                graph = None
+            if graph is None or _SLOT.unpack_from(buf, off)[0] != seq:
+                SHARED_RETRIES.inc()
+                continue
+            self._graph = graph
+            return graph
+        raise SharedStateError("shared graph is being rewritten too often to read")
+
+    # ---------- интерфейс GraphState для маршрутов ----------
+
+    def export(self) -> dict:
+        return self.read().export
+
+    def export_routes(self, service: str) -> Optional[dict]:
+        return self.read().export_routes(service)
+
+    def export_query(self, *args, **kwargs) -> Optional[dict]:
+        return self.read().export_query(*args, **kwargs)
+
+    @property
+    def recent_logs(self) -> LogRingBuffer:
+        return self.read().logs
+
+    @property
+    def edges(self) -> Dict[Tuple[str, str], "_EdgeCount"]:
+        return {key: _EdgeCount(count) for key, count in self.read().counts.items()}
+
+    @property
+    def total_logs(self) -> int:
+        return self.read().total_logs
+
+    @property
+    def version(self) -> int:
+        # поколение публикации: меняется вместе с графом
+        return self.read().generation
+
+    @property
+    def global_max_flow(self) -> float:
+        return self.read().max_flow
+
+    def active_nodes_count(self) -> int:
+        return len(self.read().export["nodes"])
+
+    def memory_stats(self) -> dict:
+        return self.read().memory
+
+    # ---------- интерфейс AlertEngine ----------
+
+    def get_alerts(self) -> List[dict]:
+        return list(self.read().alerts)
+
+    def overall_status(self) -> str:
+        return self.read().status
+
+
+class _EdgeCount:
+    __slots__ = ("count",)
+
+    def __init__(self, count: int):
+        self.count = count
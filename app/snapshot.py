@@ -0,0 +1,547 @@
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from threading import Event, Thread
+from typing import Dict, List, Optional
+
+from .baselines import BaselineTable
+from .compressed import detect
+from .models import NodeMetrics, EdgeMetrics
+
+# Формат снапшота (little-endian):
+#   заголовок: MAGIC, u16 версия, u16 число секций, f64 время создания
+#   секции:    u16 тег, u32 длина, payload
+#   хвост:     u32 crc32 всего, что выше
+# Неизвестные секции при чтении пропускаются, так что формат можно расширять
+# без смены версии; версия меняется только при несовместимых изменениях.
+
+MAGIC = b"MBDS"
+FORMAT_VERSION = 1
+
+SECTION_STRINGS = 1
+SECTION_GRAPH = 2
+SECTION_RECENT_LOGS = 3
+SECTION_ALERTS = 4
+SECTION_OFFSETS = 5
+SECTION_ROUTES = 6
+SECTION_LOG_RING = 7
+SECTION_BASELINES = 8  # BaselineTable.to_bytes() как есть
+SECTION_FILE_SIZES = 9  # размер файлов на диске к моменту снапшота (для сжатых логов)
+
+_HEADER = struct.Struct("<4sHHd")
+_SECTION = struct.Struct("<HI")
+_CRC = struct.Struct("<I")
+
+_ALERT_FIELDS = ("type", "title", "message", "route", "meta")
+
+SNAPSHOT_PREFIX = "snapshot-"
+SNAPSHOT_SUFFIX = ".mbds"
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _floats_to_bytes(values) -> bytes:
+    arr = array("d", values)
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _floats_from_bytes(raw) -> List[float]:
+    arr = array("d")
+    arr.frombytes(raw)
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr.tolist()
+
+
+class _Writer:
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def u8(self, v: int):
+        self.parts.append(struct.pack("<B", v))
+
+    def u16(self, v: int):
+        self.parts.append(struct.pack("<H", v))
+
+    def u32(self, v: int):
+        self.parts.append(struct.pack("<I", v))
+
+    def i32(self, v: int):
+        self.parts.append(struct.pack("<i", v))
+
+    def u64(self, v: int):
+        self.parts.append(struct.pack("<Q", v))
+
+    def f64(self, v: float):
+        self.parts.append(struct.pack("<d", v))
+
+    def text(self, s: str):
+        raw = s.encode("utf-8")
+        self.u32(len(raw))
+        self.parts.append(raw)
+
+    def floats(self, values):
+        values = list(values)
+        self.u32(len(values))
+        self.parts.append(_floats_to_bytes(values))
+
+    def getvalue(self) -> bytes:
+        return b"".join(self.parts)
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def _take(self, n: int):
+        if self.pos + n > len(self.data):
+            raise SnapshotError("unexpected end of section")
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return chunk
+
+    def _unpack(self, fmt: str):
+        size = struct.calcsize(fmt)
+        return struct.unpack(fmt, self._take(size))[0]
+
+    def u8(self) -> int:
+        return self._unpack("<B")
+
+    def u16(self) -> int:
+        return self._unpack("<H")
+
+    def u32(self) -> int:
+        return self._unpack("<I")
+
+    def i32(self) -> int:
+        return self._unpack("<i")
+
+    def u64(self) -> int:
+        return self._unpack("<Q")
+
+    def f64(self) -> float:
+        return self._unpack("<d")
+
+    def text(self) -> str:
+        n = self.u32()
+        return bytes(self._take(n)).decode("utf-8")
+
+    def floats(self) -> List[float]:
+        n = self.u32()
+        return _floats_from_bytes(self._take(n * 8))
+
+
+class _StringTable:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def id(self, s: str) -> int:
+        idx = self.ids.get(s)
+        if idx is None:
+            idx = len(self.values)
+            self.ids[s] = idx
+            self.values.append(s)
+        return idx
+
+
+class SnapshotData:
+    """Разобранное содержимое снапшота, ещё не применённое к состоянию."""
+
+    def __init__(self):
+        self.created_at: float = 0.0
+        self.total_logs: int = 0
+        self.global_max_flow: float = 0.0
+        self.nodes: Dict[str, NodeMetrics] = {}
+        self.edges: Dict[tuple, EdgeMetrics] = {}
+        self.route_edges: Dict[tuple, EdgeMetrics] = {}
+        self.bottleneck_edges = set()
+        # лента логов: next_seq кольца и записи (seq, src, dst, latency, ts)
+        self.log_next_seq: int = 1
+        self.recent_logs: List[tuple] = []
+        self.alerts: List[dict] = []
+        self.offsets: Dict[str, dict] = {}
+        # сериализованная таблица базовых линий (app/baselines.py) или None
+        self.baselines: Optional[bytes] = None
+
+    def apply(self, graph_state, alert_engine=None) -> None:
+        # время простоя рёбер отсчитываем от момента снапшота
+        for m in self.edges.values():
+            m.last_seen = self.created_at
+        for m in self.route_edges.values():
+            m.last_seen = self.created_at
+        graph_state.nodes = self.nodes
+        graph_state.edges = self.edges
+        graph_state.set_route_edges(self.route_edges)
+        graph_state.reindex()
+        graph_state.version += 1
+        graph_state.total_logs = self.total_logs
+        graph_state.global_max_flow = self.global_max_flow
+        graph_state.bottleneck_edges = self.bottleneck_edges
+        graph_state.recent_logs.load(self.log_next_seq, self.recent_logs)
+
+        if alert_engine is not None:
+            alert_engine.load_alerts(self.alerts)
+            # файл, собранный офлайн после снапшота, новее онлайн-обучения в снапшоте
+            if self.baselines and alert_engine.baselines_at < self.created_at:
+                try:
+                    alert_engine.baselines = BaselineTable.from_bytes(self.baselines)
+                    alert_engine.baselines_at = self.created_at
+                except (ValueError, struct.error, UnicodeDecodeError) as e:
+                    print(f">>> Skip broken baselines in snapshot: {e}")
+
+    def offset_for(self, path: str) -> int:
+        """Смещение, с которого можно продолжить чтение файла, или 0."""
+        info = self.offsets.get(os.path.abspath(path))
+        if not info:
+            return 0
+        try:
+            st = os.stat(path)
+        except OSError:
+            return 0
+        if st.st_ino != info["inode"]:
+            # файл подменили (ротация) — читаем с начала
+            return 0
+        if detect(path) is not None:
+            # у сжатого файла смещение в распакованных байтах, st_size — в сжатых:
+            # обрезку видно по размеру на диске, записанному вместе со смещением
+            if st.st_size < info.get("size", 0):
+                return 0
+        elif st.st_size < info["offset"]:
+            return 0
+        return info["offset"]
+
+
+def encode_snapshot(graph_state, alert_engine=None, offsets: Optional[Dict[str, int]] = None) -> bytes:
+    baselines = alert_engine.baselines if alert_engine is not None else None
+    return pack_sections(encode_sections(graph_state, alert_engine, offsets), baselines)
+
+
+def encode_sections(graph_state, alert_engine=None, offsets: Optional[Dict[str, int]] = None) -> List[tuple]:
+    """Секции графа, алертов и смещений. Вызывается под gs.lock."""
+    strings = _StringTable()
+
+    # ----- граф -----
+    g = _Writer()
+    nodes = list(graph_state.nodes.values())
+    edges = list(graph_state.edges.items())
+
+    g.u64(graph_state.total_logs)
+    g.f64(graph_state.global_max_flow)
+
+    g.u32(len(nodes))
+    for node in nodes:
+        g.u32(strings.id(node.name))
+        g.f64(node.bottleneck_score)
+        g.u64(node.incoming_calls)
+        g.u64(node.outgoing_calls)
+        forced = node._forced_status
+        g.i32(strings.id(forced) if forced is not None else -1)
+        g.floats(node.incoming_latencies)
+        g.floats(node.outgoing_latencies)
+
+    g.u32(len(edges))
+    for (src, dst), m in edges:
+        g.u32(strings.id(src))
+        g.u32(strings.id(dst))
+        g.u64(m.count)
+        g.f64(m.last_latency)
+        g.floats(m.latencies)
+
+    bottlenecks = list(graph_state.bottleneck_edges)
+    g.u32(len(bottlenecks))
+    for src, dst in bottlenecks:
+        g.u32(strings.id(src))
+        g.u32(strings.id(dst))
+
+    # ----- рёбра маршрутов -----
+    routes_w = _Writer()
+    route_edges = list(graph_state.route_edges.items())
+    routes_w.u32(len(route_edges))
+    for (src, src_route, dst, dst_route), m in route_edges:
+        for name in (src, src_route, dst, dst_route):
+            routes_w.u32(strings.id(name))
+        routes_w.u64(m.count)
+        routes_w.f64(m.last_latency)
+        routes_w.floats(m.latencies)
+
+    # ----- лента логов: записи идут подряд, seq первой = next_seq - n -----
+    logs = _Writer()
+    next_seq, recent = graph_state.recent_logs.dump()
+    logs.u64(next_seq)
+    logs.u32(len(recent))
+    for _, src, dst, latency, ts in recent:
+        logs.u32(strings.id(src))
+        logs.u32(strings.id(dst))
+        logs.f64(latency)
+        logs.f64(ts)
+
+    # ----- алерты -----
+    alerts_w = _Writer()
+    alerts = alert_engine.get_alerts() if alert_engine is not None else []
+    alerts_w.u32(len(alerts))
+    for alert in alerts:
+        for key in _ALERT_FIELDS:
+            alerts_w.u32(strings.id(str(alert.get(key, ""))))
+
+    # ----- смещения читателей -----
+    off_w = _Writer()
+    sizes_w = _Writer()
+    offsets = offsets or {}
+    off_w.u32(len(offsets))
+    sizes_w.u32(len(offsets))
+    for path, offset in offsets.items():
+        abs_path = os.path.abspath(path)
+        try:
+            st = os.stat(abs_path)
+            inode, size = st.st_ino, st.st_size
+        except OSError:
+            inode = size = 0
+        off_w.u32(strings.id(abs_path))
+        off_w.u64(inode)
+        off_w.u64(offset)
+        sizes_w.u32(strings.id(abs_path))
+        sizes_w.u64(size)
+
+    # ----- таблица строк (пишется первой) -----
+    s = _Writer()
+    s.u32(len(strings.values))
+    for value in strings.values:
+        s.text(value)
+
+    sections = [
+        (SECTION_STRINGS, s.getvalue()),
+        (SECTION_GRAPH, g.getvalue()),
+        (SECTION_LOG_RING, logs.getvalue()),
+        (SECTION_ALERTS, alerts_w.getvalue()),
+        (SECTION_OFFSETS, off_w.getvalue()),
+        (SECTION_ROUTES, routes_w.getvalue()),
+        (SECTION_FILE_SIZES, sizes_w.getvalue()),
+    ]
+    return sections
+
+
+def pack_sections(sections: List[tuple], baselines: Optional[BaselineTable] = None) -> bytes:
+    """Файл снапшота из секций. Базовые линии (выученное онлайн переживает рестарт)
+    сериализуются здесь — уже без gs.lock, поэтому передаётся копия таблицы."""
+    if baselines is not None and len(baselines):
+        sections = sections + [(SECTION_BASELINES, baselines.to_bytes())]
+
+    out = [_HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), time.time())]
+    for tag, payload in sections:
+        out.append(_SECTION.pack(tag, len(payload)))
+        out.append(payload)
+
+    body = b"".join(out)
+    return body + _CRC.pack(zlib.crc32(body))
+
+
+def decode_snapshot(data: bytes) -> SnapshotData:
+    if len(data) < _HEADER.size + _CRC.size:
+        raise SnapshotError("snapshot is too short")
+
+    body, (crc,) = data[:-_CRC.size], _CRC.unpack(data[-_CRC.size:])
+    if zlib.crc32(body) != crc:
+        raise SnapshotError("checksum mismatch")
+
+    magic, version, n_sections, created_at = _HEADER.unpack_from(body, 0)
+    if magic != MAGIC:
+        raise SnapshotError("not a snapshot file")
+    if version != FORMAT_VERSION:
+        raise SnapshotError(f"unsupported snapshot version {version}")
+
+    sections: Dict[int, bytes] = {}
+    pos = _HEADER.size
+    for _ in range(n_sections):
+        tag, length = _SECTION.unpack_from(body, pos)
+        pos += _SECTION.size
+        sections[tag] = body[pos:pos + length]
+        pos += length
+
+    snap = SnapshotData()
+    snap.created_at = created_at
+
+    strings: List[str] = []
+    if SECTION_STRINGS in sections:
+        r = _Reader(sections[SECTION_STRINGS])
+        strings = [r.text() for _ in range(r.u32())]
+
+    if SECTION_GRAPH in sections:
+        r = _Reader(sections[SECTION_GRAPH])
+        snap.total_logs = r.u64()
+        snap.global_max_flow = r.f64()
+
+        for _ in range(r.u32()):
+            name = strings[r.u32()]
+            node = NodeMetrics(name=name)
+            node.bottleneck_score = r.f64()
+            node.incoming_calls = r.u64()
+            node.outgoing_calls = r.u64()
+            forced = r.i32()
+            node._forced_status = strings[forced] if forced >= 0 else None
+            node.incoming_latencies = r.floats()
+            node.outgoing_latencies = r.floats()
+            snap.nodes[name] = node
+
+        for _ in range(r.u32()):
+            src = strings[r.u32()]
+            dst = strings[r.u32()]
+            m = EdgeMetrics()
+            m.count = r.u64()
+            m.last_latency = r.f64()
+            m.latencies = r.floats()
+            snap.edges[(src, dst)] = m
+
+        for _ in range(r.u32()):
+            src = strings[r.u32()]
+            dst = strings[r.u32()]
+            snap.bottleneck_edges.add((src, dst))
+
+    if SECTION_ROUTES in sections:
+        r = _Reader(sections[SECTION_ROUTES])
+        for _ in range(r.u32()):
+            key = tuple(strings[r.u32()] for _ in range(4))
+            m = EdgeMetrics()
+            m.count = r.u64()
+            m.last_latency = r.f64()
+            m.latencies = r.floats()
+            snap.route_edges[key] = m
+
+    if SECTION_LOG_RING in sections:
+        r = _Reader(sections[SECTION_LOG_RING])
+        snap.log_next_seq = r.u64()
+        n = r.u32()
+        first = snap.log_next_seq - n
+        snap.recent_logs = [(first + i, strings[r.u32()], strings[r.u32()], r.f64(), r.f64()) for i in range(n)]
+    elif SECTION_RECENT_LOGS in sections:
+        # снапшоты до кольца: готовые строки "src → dst  N ms"
+        r = _Reader(sections[SECTION_RECENT_LOGS])
+        for line in (r.text() for _ in range(r.u32())):
+            route, _, latency = line.rpartition("  ")
+            src, _, dst = route.partition(" → ")
+            try:
+                entry = (len(snap.recent_logs) + 1, src, dst, float(latency.split()[0]), created_at)
+            except (ValueError, IndexError):
+                continue
+            snap.recent_logs.append(entry)
+        snap.log_next_seq = len(snap.recent_logs) + 1
+
+    if SECTION_ALERTS in sections:
+        r = _Reader(sections[SECTION_ALERTS])
+        for _ in range(r.u32()):
+            snap.alerts.append({key: strings[r.u32()] for key in _ALERT_FIELDS})
+
+    if SECTION_OFFSETS in sections:
+        r = _Reader(sections[SECTION_OFFSETS])
+        for _ in range(r.u32()):
+            path = strings[r.u32()]
+            inode = r.u64()
+            offset = r.u64()
+            snap.offsets[path] = {"inode": inode, "offset": offset}
+
+    if SECTION_FILE_SIZES in sections:
+        r = _Reader(sections[SECTION_FILE_SIZES])
+        for _ in range(r.u32()):
+            path = strings[r.u32()]
+            size = r.u64()
+            if path in snap.offsets:
+                snap.offsets[path]["size"] = size
+
+    if SECTION_BASELINES in sections:
+        snap.baselines = bytes(sections[SECTION_BASELINES])
+
+    return snap
+
+
+class SnapshotStore:
+    def __init__(self, directory: str, keep: int = 3):
+        self.directory = directory
+        self.keep = max(1, keep)
+
+    def _list(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        names = [
+            n for n in os.listdir(self.directory)
+            if n.startswith(SNAPSHOT_PREFIX) and n.endswith(SNAPSHOT_SUFFIX)
+        ]
+        names.sort()
+        return [os.path.join(self.directory, n) for n in names]
+
+    def write(self, data: bytes) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+
+        name = f"{SNAPSHOT_PREFIX}{time.time_ns():020d}{SNAPSHOT_SUFFIX}"
+        path = os.path.join(self.directory, name)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        for old in self._list()[:-self.keep]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+        return path
+
+    def load_latest(self) -> Optional[SnapshotData]:
+        # идём от новых к старым: битый снапшот не должен мешать старту
+        for path in reversed(self._list()):
+            try:
+                with open(path, "rb") as f:
+                    return decode_snapshot(f.read())
+            except (OSError, SnapshotError, struct.error, IndexError, UnicodeDecodeError) as e:
+                print(f">>> Skip broken snapshot {path}: {e}")
+        return None
+
+
+class Snapshotter:
+    def __init__(self, store: SnapshotStore, graph_state, alert_engine, readers, interval: float):
+        self.store = store
+        self._gs = graph_state
+        self._ae = alert_engine
+        self._readers = list(readers)
+        self.interval = interval
+        self._stop = Event()
+
+    def _offsets(self) -> Dict[str, int]:
+        offsets: Dict[str, int] = {}
+        for r in self._readers:
+            offsets.update(r.offsets())
+        return offsets
+
+    def save_now(self) -> Optional[str]:
+        # смещения читателей снимаются под той же блокировкой, что и граф,
+        # иначе после рестарта часть строк применится повторно; таблица базовых
+        # линий под ней только копируется — её сериализация долгая
+        with self._gs.lock:
+            sections = encode_sections(self._gs, self._ae, self._offsets())
+            baselines = self._ae.baselines.copy() if self._ae is not None else None
+        data = pack_sections(sections, baselines)
+        try:
+            return self.store.write(data)
+        except OSError as e:
+            print(f">>> Snapshot failed: {e}")
+            return None
+
+    def run_blocking(self):
+        while not self._stop.wait(self.interval):
+            self.save_now()
+
+    def start(self) -> Thread:
+        t = Thread(target=self.run_blocking, name="Snapshotter", daemon=True)
+        t.start()
+        return t
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,393 @@
+import bisect
+import os
+import struct
+import time
+import zlib
+from collections import OrderedDict
+from threading import Event, Lock, Thread
+from typing import Dict, List, Optional, Set, Tuple
+
+from .metrics import REGISTRY, STAGE_SECONDS
+from .models import latency_status
+from .snapshot import SnapshotError, _Reader, _Writer
+
+TIMELINE_WRITES = REGISTRY.counter("mbd_timeline_writes_total", "Timeline records written", ["kind"])
+TIMELINE_BYTES = REGISTRY.counter("mbd_timeline_bytes_total", "Bytes written to the timeline", ["kind"])
+_REPLAY_TIME = STAGE_SECONDS.labels(stage="replay")
+
+# История графа для разбора инцидентов: "как выглядел граф в 15:03".
+#
+# Раз в checkpoint_interval пишется контрольная точка — агрегаты всех рёбер,
+# между ними раз в delta_interval — дельта: только рёбра, изменившиеся
+# с прошлой записи, вытесненные рёбра, изменившиеся score узлов и множество
+# узких мест. Окно задержек не хранится: для экспорта достаточно суммы и
+# размера окна, так что ребро в истории — пять чисел.
+#
+# Состояние на момент T = ближайшая точка не позже T + дельты её сегмента
+# до T. Дельт в сегменте не больше checkpoint_interval / delta_interval,
+# поэтому время ответа не зависит от длины истории.
+#
+# Файлы: checkpoint-<ns>.mbdt и deltas-<ns той же точки>.mbdt. Сегмент дельт —
+# последовательность [u32 длина][zlib(payload)]; недописанный хвост при
+# чтении отбрасывается. Время — время ингеста (time.time()), не метки логов.
+
+MAGIC = b"MBDT"
+FORMAT_VERSION = 1
+
+CHECKPOINT_PREFIX = "checkpoint-"
+DELTAS_PREFIX = "deltas-"
+SUFFIX = ".mbdt"
+# метки хранятся в наносекундах; позже 9999-12-31 datetime уже не умеет
+MAX_AT = 253402300799.0
+
+_HEADER = struct.Struct("<4sHd")
+_LEN = struct.Struct("<I")
+
+Key = Tuple[str, str]
+# count, last_latency, window_sum, window_size, score
+EdgeRow = Tuple[int, float, float, int, float]
+
+
+class TimelineState:
+    """Агрегаты графа на момент at — то, из чего собирается экспорт."""
+
+    def __init__(self, at: float = 0.0):
+        self.at = at
+        self.edges: Dict[Key, EdgeRow] = {}
+        self.node_scores: Dict[str, float] = {}
+        self.bottlenecks: Set[Key] = set()
+        self.max_flow: float = 0.0
+
+    def export(self) -> dict:
+        """Тот же вид, что у GraphState.export()."""
+        load: Dict[str, int] = {}
+        wsum: Dict[str, float] = {}
+        wsize: Dict[str, int] = {}
+        for (src, dst), (count, _, s, n, _) in self.edges.items():
+            for name in (src, dst):
+                load.setdefault(name, 0)
+                wsum.setdefault(name, 0.0)
+                wsize.setdefault(name, 0)
+            load[dst] += count
+            wsum[dst] += s
+            wsize[dst] += n
+
+        nodes_out = []
+        for name in load:
+            avg = wsum[name] / wsize[name] if wsize[name] else 0.0
+            nodes_out.append({
+                "id": name,
+                "label": name,
+                "load": load[name],
+                "avg_latency": avg,
+                "status": latency_status(avg),
+                "bottleneck_score": self.node_scores.get(name, 0.0),
+            })
+
+        edges_out = []
+        for (src, dst), (count, last, s, n, score) in self.edges.items():
+            avg = s / n if n else 0.0
+            edges_out.append({
+                "id": f"{src}->{dst}",
+                "source": src,
+                "target": dst,
+                "latency": last,
+                "avg_latency": avg,
+                "capacity": round(1.0 / avg, 4) if avg else None,
+                "is_bottleneck": (src, dst) in self.bottlenecks,
+                "score": score,
+            })
+
+        return {
+            "nodes": nodes_out,
+            "edges": edges_out,
+            "max_flow": self.max_flow,
+            "bottlenecks": [f"{u}->{v}" for (u, v) in self.bottlenecks],
+        }
+
+
+def capture(graph_state) -> TimelineState:
+    """Агрегаты текущего графа. Вызывается под gs.lock."""
+    scorer = graph_state.scorer
+    scores = scorer.edge_scores if scorer is not None else {}
+    state = TimelineState(time.time())
+    state.edges = {
+        key: (m.count, m.last_latency, m.window_sum, m.window_size, scores.get(key, 0.0))
+        for key, m in graph_state.edges.items()
+    }
+    state.node_scores = {name: n.bottleneck_score for name, n in graph_state.nodes.items() if n.bottleneck_score}
+    state.bottlenecks = set(graph_state.bottleneck_edges)
+    state.max_flow = graph_state.global_max_flow
+    return state
+
+
+# ---------- кодирование ----------
+
+def _write_edge(w: _Writer, key: Key, row: EdgeRow) -> None:
+    count, last, s, n, score = row
+    w.text(key[0])
+    w.text(key[1])
+    w.u64(count)
+    w.f64(last)
+    w.f64(s)
+    w.u32(n)
+    w.f64(score)
+
+
+def _read_edge(r: _Reader) -> Tuple[Key, EdgeRow]:
+    key = (r.text(), r.text())
+    return key, (r.u64(), r.f64(), r.f64(), r.u32(), r.f64())
+
+
+def _write_tail(w: _Writer, state: TimelineState) -> None:
+    w.u32(len(state.node_scores))
+    for name, score in state.node_scores.items():
+        w.text(name)
+        w.f64(score)
+    w.u32(len(state.bottlenecks))
+    for src, dst in state.bottlenecks:
+        w.text(src)
+        w.text(dst)
+
+
+def _read_tail(r: _Reader, state: TimelineState) -> None:
+    state.node_scores = {}
+    for _ in range(r.u32()):
+        name = r.text()
+        state.node_scores[name] = r.f64()
+    state.bottlenecks = {(r.text(), r.text()) for _ in range(r.u32())}
+
+
+def encode_checkpoint(state: TimelineState) -> bytes:
+    w = _Writer()
+    w.f64(state.max_flow)
+    w.u32(len(state.edges))
+    for key, row in state.edges.items():
+        _write_edge(w, key, row)
+    _write_tail(w, state)
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, state.at) + zlib.compress(w.getvalue(), 1)
+
+
+def decode_checkpoint(data: bytes) -> TimelineState:
+    magic, version, at = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise SnapshotError("not a timeline checkpoint")
+    r = _Reader(zlib.decompress(data[_HEADER.size:]))
+    state = TimelineState(at)
+    state.max_flow = r.f64()
+    for _ in range(r.u32()):
+        key, row = _read_edge(r)
+        state.edges[key] = row
+    _read_tail(r, state)
+    return state
+
+
+def encode_delta(prev: TimelineState, cur: TimelineState) -> Optional[bytes]:
+    """Отличия cur от prev; None, если граф не менялся."""
+    changed = [(key, row) for key, row in cur.edges.items() if prev.edges.get(key) != row]
+    removed = [key for key in prev.edges if key not in cur.edges]
+    if (not changed and not removed and cur.node_scores == prev.node_scores
+            and cur.bottlenecks == prev.bottlenecks and cur.max_flow == prev.max_flow):
+        return None
+
+    w = _Writer()
+    w.f64(cur.at)
+    w.f64(cur.max_flow)
+    w.u32(len(changed))
+    for key, row in changed:
+        _write_edge(w, key, row)
+    w.u32(len(removed))
+    for src, dst in removed:
+        w.text(src)
+        w.text(dst)
+    # score узлов и узкие места — целиком: их мало, а сравнение по ключам дороже
+    _write_tail(w, cur)
+    payload = zlib.compress(w.getvalue(), 1)
+    return _LEN.pack(len(payload)) + payload
+
+
+def iter_deltas(data: bytes):
+    """(at, читатель остатка записи) по порядку; недописанная последняя запись пропускается."""
+    pos = 0
+    while pos + _LEN.size <= len(data):
+        (n,) = _LEN.unpack_from(data, pos)
+        pos += _LEN.size
+        if pos + n > len(data):
+            return
+        try:
+            r = _Reader(zlib.decompress(data[pos:pos + n]))
+        except zlib.error:
+            return
+        pos += n
+        yield r.f64(), r
+
+
+def apply_delta(state: TimelineState, at: float, r: _Reader) -> None:
+    state.at = at
+    state.max_flow = r.f64()
+    for _ in range(r.u32()):
+        key, row = _read_edge(r)
+        state.edges[key] = row
+    for _ in range(r.u32()):
+        state.edges.pop((r.text(), r.text()), None)
+    _read_tail(r, state)
+
+
+# ---------- хранилище ----------
+
+class TimelineStore:
+    """Файлы истории в одной папке; читать можно из любого процесса, писать — одному."""
+
+    def __init__(self, directory: str, retention: Optional[float] = None, cache_size: int = 4):
+        self.directory = directory
+        self.retention = retention
+        self.cache_size = cache_size
+        self._lock = Lock()
+        self._listing: Tuple[int, List[int]] = (-1, [])
+        # (точка, число применённых дельт) -> состояние: дашборд опрашивает один и тот же момент
+        self._cache: "OrderedDict[Tuple[int, int], TimelineState]" = OrderedDict()
+
+    def _path(self, prefix: str, stamp: int) -> str:
+        return os.path.join(self.directory, f"{prefix}{stamp:020d}{SUFFIX}")
+
+    def checkpoints(self) -> List[int]:
+        """Метки точек (ns) по возрастанию; листинг перечитывается, только если папка менялась."""
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return []
+        cached_mtime, stamps = self._listing
+        # mtime папки грубее наносекунд: файл, созданный в тот же тик, его не меняет,
+        # поэтому свежему mtime не верим
+        if mtime != cached_mtime or time.time_ns() - mtime < 2_000_000_000:
+            stamps = sorted(
+                int(n[len(CHECKPOINT_PREFIX):-len(SUFFIX)]) for n in os.listdir(self.directory)
+                if n.startswith(CHECKPOINT_PREFIX) and n.endswith(SUFFIX)
+            )
+            self._listing = (mtime, stamps)
+        return stamps
+
+    def write_checkpoint(self, state: TimelineState) -> int:
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = int(state.at * 1e9)
+        data = encode_checkpoint(state)
+        path = self._path(CHECKPOINT_PREFIX, stamp)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        TIMELINE_WRITES.labels(kind="checkpoint").inc()
+        TIMELINE_BYTES.labels(kind="checkpoint").inc(len(data))
+        return stamp
+
+    def append_delta(self, stamp: int, record: bytes) -> None:
+        with open(self._path(DELTAS_PREFIX, stamp), "ab") as f:
+            f.write(record)
+        TIMELINE_WRITES.labels(kind="delta").inc()
+        TIMELINE_BYTES.labels(kind="delta").inc(len(record))
+
+    def prune(self, now: Optional[float] = None) -> None:
+        if self.retention is None:
+            return
+        cutoff = int(((time.time() if now is None else now) - self.retention) * 1e9)
+        stamps = self.checkpoints()
+        # последняя точка до cutoff ещё нужна для моментов сразу после cutoff
+        i = bisect.bisect_right(stamps, cutoff) - 1
+        for stamp in stamps[:max(0, i)]:
+            for prefix in (CHECKPOINT_PREFIX, DELTAS_PREFIX):
+                try:
+                    os.remove(self._path(prefix, stamp))
+                except OSError:
+                    pass
+
+    def bounds(self) -> Optional[Tuple[float, float]]:
+        stamps = self.checkpoints()
+        if not stamps:
+            return None
+        return stamps[0] / 1e9, time.time()
+
+    def state_at(self, at: float) -> Optional[TimelineState]:
+        """Состояние на момент at или None, если история начинается позже."""
+        if not 0 <= at <= MAX_AT:
+            raise ValueError(f"timestamp out of range: {at}")
+        stamps = self.checkpoints()
+        i = bisect.bisect_right(stamps, int(at * 1e9)) - 1
+        if i < 0:
+            return None
+        stamp = stamps[i]
+
+        with _REPLAY_TIME.time():
+            try:
+                with open(self._path(DELTAS_PREFIX, stamp), "rb") as f:
+                    deltas = f.read()
+            except OSError:
+                deltas = b""
+            pending = []
+            for delta_at, r in iter_deltas(deltas):
+                if delta_at > at:
+                    break
+                pending.append((delta_at, r))
+
+            key = (stamp, len(pending))
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    return cached
+
+            try:
+                with open(self._path(CHECKPOINT_PREFIX, stamp), "rb") as f:
+                    state = decode_checkpoint(f.read())
+            except FileNotFoundError:
+                # точку удалили между листингом и чтением (prune)
+                return None
+            for delta_at, r in pending:
+                apply_delta(state, delta_at, r)
+
+            with self._lock:
+                self._cache[key] = state
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            return state
+
+
+class TimelineRecorder:
+    """Пишет точки и дельты из живого GraphState."""
+
+    def __init__(self, store: TimelineStore, graph_state, checkpoint_interval: float, delta_interval: float):
+        self.store = store
+        self._gs = graph_state
+        self.checkpoint_interval = checkpoint_interval
+        self.delta_interval = delta_interval
+        self._prev: Optional[TimelineState] = None
+        self._stamp: Optional[int] = None
+        self._stop = Event()
+
+    def record(self) -> None:
+        with self._gs.lock:
+            cur = capture(self._gs)
+        prev = self._prev
+        if prev is None or cur.at - self._stamp / 1e9 >= self.checkpoint_interval:
+            self._stamp = self.store.write_checkpoint(cur)
+            self.store.prune(cur.at)
+        else:
+            record = encode_delta(prev, cur)
+            if record is not None:
+                self.store.append_delta(self._stamp, record)
+        self._prev = cur
+
+    def run_blocking(self):
+        while not self._stop.wait(self.delta_interval):
+            try:
+                self.record()
+            except OSError as e:
+                print(f">>> Timeline write failed: {e}")
+            except Exception as e:
+                print(f">>> Timeline recorder error: {e}")
+
+    def start(self) -> Thread:
+        t = Thread(target=self.run_blocking, name="TimelineRecorder", daemon=True)
+        t.start()
+        return t
+
+    def stop(self):
+        self._stop.set()
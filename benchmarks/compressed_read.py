@@ -0,0 +1,124 @@
+import argparse
+import bz2
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from app.compressed import open_log, zstandard
+from app.config import READ_CHUNK_SIZE
+from app.csv_parser import BatchParser
+
+from .synthetic import build_topology, write_log_file
+
+# Сжатые логи: потоковая распаковка против "распаковать на диск, потом читать":
+#   python -m benchmarks.compressed_read --lines 400000 --formats gzip,bz2,zstd
+# Оба пути заканчиваются одним и тем же разбором BatchParser по кускам.
+# Память — пик аллокаций Python (tracemalloc), диск — размер распакованной копии.
+
+_EXT = {"gzip": "gz", "bz2": "bz2", "zstd": "zst"}
+
+
+def _compress(path: str, kind: str) -> str:
+    out = f"{path}.{_EXT[kind]}"
+    with open(path, "rb") as src:
+        if kind == "gzip":
+            with gzip.open(out, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst)
+        elif kind == "bz2":
+            with bz2.open(out, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        else:
+            with open(out, "wb") as dst:
+                zstandard.ZstdCompressor().copy_stream(src, dst)
+    return out
+
+
+def _parse(f, chunk_size: int) -> int:
+    parser = BatchParser()
+    rows = 0
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return rows + len(parser.flush())
+        rows += len(parser.feed(chunk))
+
+
+def read_streaming(path: str, chunk_size: int) -> dict:
+    with open_log(path) as f:
+        return {"rows": _parse(f, chunk_size), "disk_bytes": 0}
+
+
+def read_via_disk(path: str, chunk_size: int, tmp: str) -> dict:
+    copy = os.path.join(tmp, "decompressed.csv")
+    with open_log(path) as src, open(copy, "wb") as dst:
+        shutil.copyfileobj(src, dst, chunk_size)
+    try:
+        with open(copy, "rb") as f:
+            return {"rows": _parse(f, chunk_size), "disk_bytes": os.path.getsize(copy)}
+    finally:
+        os.remove(copy)
+
+
+def _measure(fn, *args) -> dict:
+    # tracemalloc замедляет в разы — время и память снимаем разными прогонами
+    t0 = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result.update({
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(result["rows"] / elapsed, 1) if elapsed > 0 else None,
+        "peak_mb": round(peak / 2 ** 20, 2),
+    })
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streaming decompression vs decompress-then-read")
+    parser.add_argument("--services", type=int, default=50)
+    parser.add_argument("--lines", type=int, default=400_000)
+    parser.add_argument("--formats", default="plain,gzip,bz2,zstd")
+    parser.add_argument("--chunk-size", type=int, default=READ_CHUNK_SIZE)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args(argv)
+
+    topo = build_topology(services=args.services, seed=args.seed)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = write_log_file(os.path.join(tmp, "logs.csv"), topo, args.lines, seed=args.seed)
+        for kind in [k for k in args.formats.split(",") if k]:
+            if kind == "zstd" and zstandard is None:
+                print("zstd skipped: zstandard is not installed", file=sys.stderr)
+                continue
+            path = plain if kind == "plain" else _compress(plain, kind)
+            modes = [("stream", read_streaming, (path, args.chunk_size))]
+            if kind != "plain":
+                modes.append(("disk", read_via_disk, (path, args.chunk_size, tmp)))
+            for mode, fn, fn_args in modes:
+                r = _measure(fn, *fn_args)
+                r.update({"format": kind, "mode": mode, "file_bytes": os.path.getsize(path)})
+                results.append(r)
+                print(f"{kind:>6} {mode:>6} {r['rows_per_sec']:12.0f} rows/s  peak {r['peak_mb']:7.2f} MB  "
+                      f"disk {r['disk_bytes'] / 2 ** 20:7.1f} MB", file=sys.stderr)
+
+    report = {"args": vars(args), "results": results}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import argparse
+import json
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import List, Tuple
+
+from .synthetic import build_topology, generate_lines
+
+# Нагрузочный генератор для POST /api/ingest.
+#   python -m benchmarks.load_ingest --records 50000 --batch 500 --concurrency 4
+#   python -m benchmarks.load_ingest --url http://127.0.0.1:5000/api/ingest
+# Без --url поднимает приложение в этом же процессе (test client + писатель),
+# что меряет сам конвейер без сетевого стека.
+
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _to_ndjson(lines: List[str]) -> bytes:
+    out = []
+    for line in lines:
+        ts, src, src_route, dst, dst_route, latency = line.rstrip("\n").split(",")
+        out.append(json.dumps({
+            "timestamp": ts, "srcService": src, "srcRoute": src_route,
+            "dstService": dst, "dstRoute": dst_route, "latency_ms": float(latency),
+        }))
+    return ("\n".join(out) + "\n").encode("utf-8")
+
+
+def build_bodies(services: int, records: int, batch: int, fmt: str, seed: int) -> List[Tuple[bytes, int]]:
+    topo = build_topology(services=services, seed=seed)
+    lines = generate_lines(topo, records, seed=seed)
+    bodies = []
+    for i in range(0, len(lines), batch):
+        chunk = lines[i:i + batch]
+        body = "".join(chunk).encode("utf-8") if fmt == "csv" else _to_ndjson(chunk)
+        bodies.append((body, len(chunk)))
+    return bodies
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = Lock()
+        self.requests = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.shed = 0
+        self.errors = 0
+        self.latencies: List[float] = []
+
+    def add(self, status: int, records: int, payload: dict, seconds: float) -> None:
+        with self.lock:
+            self.requests += 1
+            self.latencies.append(seconds)
+            if status == 202:
+                self.accepted += payload.get("accepted", records)
+                self.shed += payload.get("shed", 0)
+            elif status == 429:
+                self.rejected += records
+            else:
+                self.errors += 1
+
+
+def _http_sender(url: str, content_type: str):
+    def send(body: bytes):
+        req = urllib.request.Request(url, data=body, method="POST", headers={"Content-Type": content_type})
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                return resp.status, json.loads(resp.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            return e.code, {}
+    return send
+
+
+def _local_app(queue_max: int, policy: str):
+    from app import create_app
+    from app.ingest import IngestPipeline
+
+    app = create_app()
+    pipeline = IngestPipeline(app.graph_state, app.alert_engine, queue_max, policy)
+    pipeline.start()
+    app.ingest_pipeline = pipeline
+    return app
+
+
+def _local_sender(app, content_type: str):
+    def send(body: bytes):
+        # свой клиент на поток: test client не рассчитан на общий доступ
+        client = app.test_client()
+        resp = client.post("/api/ingest", data=body, content_type=content_type)
+        return resp.status_code, resp.get_json(silent=True) or {}
+    return send
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load generator for the push ingest endpoint")
+    parser.add_argument("--url", default="", help="ingest URL; empty = in-process app")
+    parser.add_argument("--services", type=int, default=50)
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=500, help="records per request")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--format", default="csv", choices=sorted(CONTENT_TYPES))
+    parser.add_argument("--rate", type=float, default=0.0, help="requests per second per sender, 0 = unlimited")
+    parser.add_argument("--queue-max", type=int, default=20000, help="in-process only")
+    parser.add_argument("--policy", default="reject", choices=["reject", "shed_oldest"], help="in-process only")
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="in-process: wait for the writer")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args(argv)
+
+    bodies = build_bodies(args.services, args.records, args.batch, args.format, args.seed)
+    content_type = CONTENT_TYPES[args.format]
+
+    app = None
+    if args.url:
+        send = _http_sender(args.url, content_type)
+    else:
+        app = _local_app(args.queue_max, args.policy)
+        send = _local_sender(app, content_type)
+
+    stats = _Stats()
+    pause = 1.0 / args.rate if args.rate > 0 else 0.0
+
+    def worker(items: List[Tuple[bytes, int]]):
+        for body, records in items:
+            t0 = time.perf_counter()
+            status, payload = send(body)
+            elapsed = time.perf_counter() - t0
+            stats.add(status, records, payload, elapsed)
+            if pause > elapsed:
+                time.sleep(pause - elapsed)
+
+    parts = [bodies[i::args.concurrency] for i in range(args.concurrency)]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, parts))
+    send_elapsed = time.perf_counter() - t0
+
+    report = {
+        "args": vars(args),
+        "sent_records": sum(n for _, n in bodies),
+        "requests": stats.requests,
+        "accepted_records": stats.accepted,
+        "rejected_records": stats.rejected,
+        "shed_records": stats.shed,
+        "http_errors": stats.errors,
+        "send_seconds": round(send_elapsed, 3),
+        "offered_records_per_sec": round(sum(n for _, n in bodies) / send_elapsed, 1),
+        "accepted_records_per_sec": round(stats.accepted / send_elapsed, 1),
+        "request_p50_ms": round(_percentile(stats.latencies, 0.5) * 1000, 3),
+        "request_p99_ms": round(_percentile(stats.latencies, 0.99) * 1000, 3),
+    }
+
+    if app is not None:
+        # ждём, пока писатель применит всё принятое
+        pipeline = app.ingest_pipeline
+        pipeline.join(args.drain_timeout)
+        total = time.perf_counter() - t0
+        applied = app.graph_state.total_logs
+        report.update({
+            "applied_records": applied,
+            "applied_seconds": round(total, 3),
+            "applied_records_per_sec": round(applied / total, 1),
+            "queue_left": pipeline.depth,
+        })
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
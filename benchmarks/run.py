@@ -0,0 +1,316 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+from app.alert_engine import AlertEngine
+from app.config import READ_CHUNK_SIZE
+from app.csv_parser import BatchParser
+from app.flow_analyzer import FlowAnalyzer
+from app.graph_state import GraphState
+from app.ingest import apply_batch
+from app.log_reader import LogReader
+from app.sampling import AdaptiveSampler
+
+from .synthetic import build_topology, generate_lines
+
+# Запуск:  python -m benchmarks.run --sizes 10,50,200 --output bench.json
+# Результат — JSON со списком замеров; --compare подсвечивает регрессии
+# относительно сохранённого прошлого прогона.
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str):
+    def deco(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return deco
+
+
+class Case:
+    """Данные одного размера графа, общие для всех бенчмарков."""
+
+    def __init__(self, services: int, lines: int, fanout: int, distribution: str, seed: int):
+        self.services = services
+        self.topology = build_topology(services=services, fanout=fanout, seed=seed)
+        self.lines = generate_lines(self.topology, lines, distribution=distribution, seed=seed)
+        self.trace_lines = generate_lines(self.topology, lines, fmt="trace", distribution=distribution, seed=seed)
+
+    def fresh_state(self):
+        gs = GraphState()
+        ae = AlertEngine(gs)
+        gs.alert_engine = ae
+        return gs, ae
+
+    def parsed(self):
+        reader = LogReader(None, None, "", 0)
+        return [p for p in map(reader.parse_line, self.lines) if p]
+
+    def filled_state(self):
+        gs, ae = self.fresh_state()
+        for src, dst, latency, src_route, dst_route in self.parsed():
+            gs.update_from_log(src, dst, latency, src_route, dst_route)
+        return gs, ae
+
+
+def _measure(fn: Callable[[], int], repeat: int) -> dict:
+    """fn возвращает число выполненных операций; берём лучший и медианный прогон."""
+    times: List[float] = []
+    ops = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        ops = fn()
+        times.append(time.perf_counter() - t0)
+    best = min(times)
+    return {
+        "ops": ops,
+        "repeat": repeat,
+        "best_s": best,
+        "median_s": statistics.median(times),
+        "ops_per_sec": ops / best if best > 0 else None,
+        "us_per_op": best / ops * 1e6 if ops else None,
+    }
+
+
+def _parse_line(lines: List[str], repeat: int) -> dict:
+    reader = LogReader(None, None, "", 0)
+
+    def run():
+        parse = reader.parse_line
+        for line in lines:
+            parse(line)
+        return len(lines)
+
+    return _measure(run, repeat)
+
+
+def _parse_batch(lines: List[str], repeat: int) -> dict:
+    data = "".join(lines).encode("utf-8")
+    chunks = [data[i:i + READ_CHUNK_SIZE] for i in range(0, len(data), READ_CHUNK_SIZE)]
+
+    def run():
+        parser = BatchParser()
+        rows = 0
+        for chunk in chunks:
+            rows += len(parser.feed(chunk))
+        rows += len(parser.flush())
+        return rows
+
+    return _measure(run, repeat)
+
+
+@benchmark("parse_line")
+def bench_parse_line(case: Case, repeat: int) -> dict:
+    return _parse_line(case.lines, repeat)
+
+
+@benchmark("parse_line_trace")
+def bench_parse_line_trace(case: Case, repeat: int) -> dict:
+    return _parse_line(case.trace_lines, repeat)
+
+
+@benchmark("parse_batch")
+def bench_parse_batch(case: Case, repeat: int) -> dict:
+    return _parse_batch(case.lines, repeat)
+
+
+@benchmark("parse_batch_trace")
+def bench_parse_batch_trace(case: Case, repeat: int) -> dict:
+    return _parse_batch(case.trace_lines, repeat)
+
+
+@benchmark("update_from_log")
+def bench_update_from_log(case: Case, repeat: int) -> dict:
+    parsed = case.parsed()
+
+    def run():
+        gs, _ = case.fresh_state()
+        for src, dst, latency, src_route, dst_route in parsed:
+            gs.update_from_log(src, dst, latency, src_route, dst_route)
+        return len(parsed)
+
+    return _measure(run, repeat)
+
+
+@benchmark("export")
+def bench_export(case: Case, repeat: int) -> dict:
+    gs, _ = case.filled_state()
+    calls = 20
+
+    def run():
+        for _ in range(calls):
+            gs.export()
+        return calls
+
+    result = _measure(run, repeat)
+    result["edges"] = len(gs.edges)
+    result["nodes"] = len(gs.nodes)
+    return result
+
+
+@benchmark("handle_log")
+def bench_handle_log(case: Case, repeat: int) -> dict:
+    gs, ae = case.filled_state()
+    # путь без замера (слияние дельт воркеров): пороги по всем рёбрам,
+    # кэшируемые на ALERT_THRESHOLD_INTERVAL; сравниваем время на операцию
+    keys = [(src, dst) for src, dst, *_ in case.parsed()][:500]
+
+    def run():
+        ae.load_alerts([])
+        for src, dst in keys:
+            ae.handle_log(src, dst)
+        return len(keys)
+
+    result = _measure(run, repeat)
+    result["edges"] = len(gs.edges)
+    return result
+
+
+@benchmark("handle_log_baseline")
+def bench_handle_log_baseline(case: Case, repeat: int) -> dict:
+    gs, ae = case.filled_state()
+    samples = [(src, dst, latency) for src, dst, latency, *_ in case.parsed()]
+    # таблица обучена на тех же замерах: у каждого ребра есть базовая линия
+    ts = time.time()
+    for src, dst, latency in samples:
+        ae.baselines.observe((src, dst), ts, latency)
+
+    def run():
+        ae.load_alerts([])
+        for src, dst, latency in samples:
+            ae.handle_log(src, dst, latency, ts)
+        return len(samples)
+
+    result = _measure(run, repeat)
+    result["edges"] = len(gs.edges)
+    result["baselines"] = len(ae.baselines)
+    return result
+
+
+def _apply(case: Case, repeat: int, rate: float) -> dict:
+    parser = BatchParser()
+    batch = parser.feed("".join(line + "\n" for line in case.lines).encode())
+    batch.extend(parser.flush())
+
+    def run():
+        gs, ae = case.fresh_state()
+        if rate < 1.0:
+            # доля зафиксирована: меряем сам путь сэмплирования, не регулятор
+            gs.sampler = AdaptiveSampler(lambda: 0, seed=1)
+            gs.sampler.rate = rate
+        with gs.lock:
+            apply_batch(gs, ae, batch)
+        return len(batch)
+
+    return _measure(run, repeat)
+
+
+@benchmark("apply_batch")
+def bench_apply_batch(case: Case, repeat: int) -> dict:
+    return _apply(case, repeat, 1.0)
+
+
+@benchmark("apply_batch_sampled")
+def bench_apply_batch_sampled(case: Case, repeat: int) -> dict:
+    return _apply(case, repeat, 0.1)
+
+
+@benchmark("analyze")
+def bench_analyze(case: Case, repeat: int) -> dict:
+    gs, _ = case.filled_state()
+    analyzer = FlowAnalyzer()
+
+    def run():
+        # analyze печатает подробный отчёт — в замер он не должен попадать
+        with contextlib.redirect_stdout(io.StringIO()):
+            analyzer.analyze(gs.nodes, gs.edges)
+        return 1
+
+    result = _measure(run, repeat)
+    result["edges"] = len(gs.edges)
+    return result
+
+
+def compare(results: List[dict], baseline_path: str, threshold: float) -> List[dict]:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    old = {(r["benchmark"], r["services"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        prev = old.get((r["benchmark"], r["services"]))
+        if not prev or not prev.get("best_s") or not r.get("best_s"):
+            continue
+        # нормируем на операцию: число операций между прогонами может отличаться
+        ratio = (r["best_s"] / r["ops"]) / (prev["best_s"] / prev["ops"])
+        r["vs_baseline"] = round(ratio, 3)
+        if ratio > 1.0 + threshold:
+            regressions.append(r)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for ingest, export, alerting and flow analysis")
+    parser.add_argument("--sizes", default="10,50,200", help="comma separated service counts")
+    parser.add_argument("--lines", type=int, default=20000, help="log lines per size")
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--distribution", default="lognormal", choices=["lognormal", "exponential", "uniform"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", default="", help="comma separated benchmark names")
+    parser.add_argument("--output", default="", help="write JSON results to this file")
+    parser.add_argument("--compare", default="", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown vs baseline")
+    args = parser.parse_args(argv)
+
+    names = [n for n in args.only.split(",") if n] or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    results: List[dict] = []
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        case = Case(size, args.lines, args.fanout, args.distribution, args.seed)
+        for name in names:
+            r = BENCHMARKS[name](case, args.repeat)
+            r.update({"benchmark": name, "services": size, "lines": args.lines})
+            results.append(r)
+            print(f"{name:>16} services={size:<5} {r['us_per_op']:10.2f} us/op", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    regressions = compare(results, args.compare, args.threshold) if args.compare else []
+    if regressions:
+        report["regressions"] = [
+            {"benchmark": r["benchmark"], "services": r["services"], "vs_baseline": r["vs_baseline"]}
+            for r in regressions
+        ]
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+from app.config import READ_CHUNK_SIZE
+from app.csv_parser import BatchParser
+from app.graph_state import GraphState
+from app.sharded import ShardedIngest
+
+from .synthetic import build_topology, write_log_file
+
+# Масштабирование многопроцессного разбора по числу воркеров:
+#   python -m benchmarks.scale_ingest --lines 400000 --workers 1,2,4,8
+# workers=0 — разбор и update_from_log в одном процессе, как у LogReader.
+# Алерты в замер не входят: они одинаково считаются в процессе сервера.
+
+
+def _blocks(data: bytes, size: int) -> List[bytes]:
+    out = []
+    start = 0
+    while start < len(data):
+        end = data.rfind(b"\n", start, start + size) + 1
+        if end <= start:
+            end = min(len(data), start + size)
+        out.append(data[start:end])
+        start = end
+    return out
+
+
+def run_inprocess(blocks: List[bytes]) -> GraphState:
+    gs = GraphState()
+    parser = BatchParser()
+    for block in blocks:
+        batch = parser.feed(block)
+        for src, dst, latency, sr, dr in zip(batch.src, batch.dst, batch.latency, batch.src_route, batch.dst_route):
+            gs.update_from_log(src, dst, latency, sr, dr)
+    return gs
+
+
+def run_sharded(blocks: List[bytes], workers: int, publish_interval: float) -> Tuple[GraphState, float]:
+    gs = GraphState()
+    ingest = ShardedIngest(gs, None, "", workers, publish_interval=publish_interval)
+    ingest.start(read_file=False)
+    try:
+        t0 = time.perf_counter()
+        for block in blocks:
+            ingest.submit_block(block)
+        ingest.wait_idle()
+        elapsed = time.perf_counter() - t0
+    finally:
+        ingest.stop()
+    return gs, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput of sharded ingest by worker count")
+    parser.add_argument("--services", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=400_000)
+    parser.add_argument("--workers", default="0,1,2,4", help="comma separated worker counts, 0 = in-process")
+    parser.add_argument("--chunk-size", type=int, default=READ_CHUNK_SIZE)
+    parser.add_argument("--publish-interval", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args(argv)
+
+    topo = build_topology(services=args.services, seed=args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_log_file(os.path.join(tmp, "logs.csv"), topo, args.lines, seed=args.seed)
+        with open(path, "rb") as f:
+            data = f.read()
+    blocks = _blocks(data, args.chunk_size)
+
+    results = []
+    base = None
+    for workers in [int(w) for w in args.workers.split(",") if w]:
+        if workers == 0:
+            t0 = time.perf_counter()
+            gs = run_inprocess(blocks)
+            elapsed = time.perf_counter() - t0
+        else:
+            # время запуска процессов (spawn) в замер не входит
+            gs, elapsed = run_sharded(blocks, workers, args.publish_interval)
+        rate = gs.total_logs / elapsed
+        base = base or rate
+        results.append({
+            "workers": workers,
+            "records": gs.total_logs,
+            "edges": len(gs.edges),
+            "seconds": round(elapsed, 3),
+            "records_per_sec": round(rate, 1),
+            "speedup": round(rate / base, 2),
+        })
+        print(f"workers={workers:<3} {rate:12.0f} rec/s  x{rate / base:.2f}", file=sys.stderr)
+
+    report = {"args": vars(args), "cpu_count": os.cpu_count(), "results": results}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import math
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Tuple
+
+# Синтетическая топология и генератор логов для бенчмарков.
+# Граф слоистый: api-gateway -> сервисы -> ... -> db-*, так что у каждого
+# сервиса есть путь до какой-нибудь БД и FlowAnalyzer находит стоки.
+
+TRACE_HEADER = "traceId,spanId,parentSpanId,timestamp,srcService,srcRoute,dstService,dstRoute,latency_ms"
+
+
+@dataclass
+class Topology:
+    services: List[str]
+    children: Dict[str, List[str]]
+    routes: Dict[str, List[str]]
+    # параметры распределения latency для ребра: (median_ms, sigma)
+    latency: Dict[Tuple[str, str], Tuple[float, float]] = field(default_factory=dict)
+
+    @property
+    def edges(self) -> List[Tuple[str, str]]:
+        return [(u, v) for u, vs in self.children.items() for v in vs]
+
+
+def build_topology(
+    services: int = 20,
+    fanout: int = 3,
+    layers: int = 4,
+    db_ratio: float = 0.2,
+    routes_per_service: int = 3,
+    median_latency: float = 30.0,
+    slow_edge_ratio: float = 0.1,
+    seed: int = 42,
+) -> Topology:
+    rnd = random.Random(seed)
+
+    n_db = max(1, int(services * db_ratio))
+    n_mid = max(1, services - n_db - 1)
+
+    mids = [f"svc-{i:04d}" for i in range(n_mid)]
+    dbs = [f"db-{i:04d}" for i in range(n_db)]
+
+    # раскладываем промежуточные сервисы по слоям
+    per_layer = max(1, math.ceil(n_mid / max(1, layers)))
+    layered: List[List[str]] = []
+    for i in range(0, n_mid, per_layer):
+        layered.append(mids[i:i + per_layer])
+
+    children: Dict[str, List[str]] = {"api-gateway": rnd.sample(layered[0], min(fanout, len(layered[0])))}
+
+    for li, layer in enumerate(layered):
+        deeper = [s for lay in layered[li + 1:] for s in lay]
+        for s in layer:
+            pool = deeper + dbs
+            k = rnd.randint(1, max(1, fanout))
+            picked = rnd.sample(pool, min(k, len(pool)))
+            if not any(p.startswith("db") for p in picked):
+                picked.append(rnd.choice(dbs))
+            children[s] = picked
+
+    # сервисы, до которых никто не ходит, подвешиваем к предыдущему слою
+    reachable = {c for cs in children.values() for c in cs}
+    for li, layer in enumerate(layered):
+        parents = ["api-gateway"] if li == 0 else layered[li - 1]
+        for s in layer:
+            if s not in reachable:
+                children[rnd.choice(parents)].append(s)
+                reachable.add(s)
+    for db in dbs:
+        if db not in reachable:
+            children[rnd.choice(layered[-1])].append(db)
+
+    all_services = ["api-gateway"] + mids + dbs
+    routes = {
+        s: [f"/{s.split('-')[0]}/op{j}" for j in range(routes_per_service)]
+        for s in all_services
+    }
+
+    topo = Topology(services=all_services, children=children, routes=routes)
+    for u, v in topo.edges:
+        base = median_latency * (1.5 if v.startswith("db") else 1.0)
+        if rnd.random() < slow_edge_ratio:
+            base *= rnd.uniform(4.0, 8.0)
+        topo.latency[(u, v)] = (base * rnd.uniform(0.5, 1.5), rnd.uniform(0.2, 0.6))
+    return topo
+
+
+def sample_latency(rnd: random.Random, median: float, sigma: float, distribution: str = "lognormal") -> float:
+    if distribution == "lognormal":
+        return rnd.lognormvariate(math.log(median), sigma)
+    if distribution == "exponential":
+        return rnd.expovariate(1.0 / median)
+    if distribution == "uniform":
+        return rnd.uniform(median * (1 - sigma), median * (1 + sigma))
+    raise ValueError(f"unknown distribution: {distribution}")
+
+
+def generate_spans(
+    topo: Topology,
+    traces: int,
+    distribution: str = "lognormal",
+    call_probability: float = 0.7,
+    start: datetime = datetime(2025, 11, 21, 15, 0, 0, tzinfo=timezone.utc),
+    seed: int = 7,
+) -> Iterator[tuple]:
+    """
+    Кортежи (trace_id, span_id, parent_span_id, ts, src, src_route, dst, dst_route, latency)
+    в порядке обхода трейсов.
+    """
+    rnd = random.Random(seed)
+    span_no = 0
+    ts = start
+
+    for t in range(traces):
+        trace_id = f"trace{t:08d}"
+        ts += timedelta(milliseconds=rnd.randint(1, 20))
+
+        stack = [("api-gateway", rnd.choice(topo.routes["api-gateway"]), "", ts)]
+        while stack:
+            src, src_route, parent, at = stack.pop()
+            for dst in topo.children.get(src, []):
+                if parent and rnd.random() > call_probability:
+                    continue
+                span_no += 1
+                span_id = f"span{span_no:010d}"
+                median, sigma = topo.latency[(src, dst)]
+                latency = round(sample_latency(rnd, median, sigma, distribution), 1)
+                dst_route = rnd.choice(topo.routes[dst])
+                yield (trace_id, span_id, parent, at, src, src_route, dst, dst_route, latency)
+                stack.append((dst, dst_route, span_id, at + timedelta(milliseconds=latency)))
+
+
+def _fmt_ts(ts: datetime) -> str:
+    return ts.strftime("%Y-%m-%dT%H:%M:%S.%f") + "Z"
+
+
+def generate_lines(topo: Topology, count: int, fmt: str = "live", **kwargs) -> List[str]:
+    """Ровно count строк лога в формате live (6 колонок) или trace (9 колонок)."""
+    lines: List[str] = []
+    traces = max(1, count // max(1, len(topo.edges) // 2))
+    while len(lines) < count:
+        for span in generate_spans(topo, traces, **kwargs):
+            trace_id, span_id, parent, ts, src, src_route, dst, dst_route, latency = span
+            if fmt == "live":
+                lines.append(f"{_fmt_ts(ts)},{src},{src_route},{dst},{dst_route},{latency}\n")
+            elif fmt == "trace":
+                lines.append(
+                    f"{trace_id},{span_id},{parent},{_fmt_ts(ts)},"
+                    f"{src},{src_route},{dst},{dst_route},{latency}\n"
+                )
+            else:
+                raise ValueError(f"unknown format: {fmt}")
+            if len(lines) >= count:
+                break
+        kwargs["seed"] = kwargs.get("seed", 7) + 1
+    return lines
+
+
+def write_log_file(path: str, topo: Topology, count: int, fmt: str = "live", **kwargs) -> str:
+    with open(path, "w", encoding="utf-8") as f:
+        if fmt == "trace":
+            f.write(TRACE_HEADER + "\n")
+        f.writelines(generate_lines(topo, count, fmt=fmt, **kwargs))
+    return path
@@ -0,0 +1,34 @@
+import atexit
+import signal
+import sys
+import time
+
+from app import start_ingest
+from app.alert_engine import AlertEngine
+from app.config import SHARED_PUBLISH_INTERVAL, SHARED_STATE_NAME, SHARED_STATE_SIZE
+from app.graph_state import GraphState
+from app.shared_state import SharedGraphWriter
+
+# Процесс ингеста для режима MBD_SERVING_MODE=shared:
+#   python run_ingest.py
+#   MBD_SERVING_MODE=shared gunicorn -w 4 'app:create_app()'
+
+if __name__ == '__main__':
+    graph_state = GraphState()
+    alert_engine = AlertEngine(graph_state)
+    graph_state.alert_engine = alert_engine
+
+    writer = SharedGraphWriter(SHARED_STATE_NAME, SHARED_STATE_SIZE, graph_state, alert_engine,
+                               SHARED_PUBLISH_INTERVAL)
+    # atexit выполняется в обратном порядке: область удаляется после финального снапшота
+    atexit.register(writer.close)
+    start_ingest(graph_state, alert_engine)
+    writer.start()
+    print(f">>> Publishing graph to shared memory '{SHARED_STATE_NAME}' every {SHARED_PUBLISH_INTERVAL}s")
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
@@ -42,6 +42,13 @@ let cy = null;
 let firstLayoutDone = false;
 let lastZoom = 1;
 let lastPan = {x: 0, y: 0};
+// сервис, раскрытый до маршрутов; null — общий граф сервисов
+let drillService = null;
+// seq последней показанной строки ленты логов (/api/logs?since=)
+let logCursor = 0;
+// параметры выборки из адреса страницы (?service=&hops=&top=&sort=&status=)
+// уходят в /api/graph как есть — сервер отдаёт только нужную часть графа
+const graphQuery = new URLSearchParams(window.location.search).toString();
 
 function initGraph() {
     cy = cytoscape({
@@ -78,6 +85,22 @@ function initGraph() {
                     "border-width": 4
                 }
             },
+            {
+                // сервис-контейнер в маршрутном виде
+                selector: "node:parent",
+                style: {
+                    "background-color": "#1f2a44",
+                    "background-opacity": 0.35,
+                    "text-valign": "top",
+                    "text-halign": "center",
+                    "border-color": "#4C8BF5",
+                    "border-width": 1
+                }
+            },
+            {
+                selector: "node[?focus]",
+                style: {"border-width": 3}
+            },
             {
                 selector: "edge",
                 style: {
@@ -105,6 +128,16 @@ function initGraph() {
         lastPan = cy.pan();
     });
 
+    // клик по сервису — его маршруты, клик по пустому месту — назад к сервисам
+    cy.on("tap", "node", evt => {
+        const d = evt.target.data();
+        const service = d.level === "route" ? d.service : d.id;
+        if (service !== drillService) setDrill(service);
+    });
+    cy.on("tap", evt => {
+        if (evt.target === cy && drillService !== null) setDrill(null);
+    });
+
     initTooltipHandlers();
 }
 
@@ -252,27 +285,49 @@ function updateGraph(graphData) {
 }
 
 
+function setDrill(service) {
+    drillService = service;
+    firstLayoutDone = false;
+    cy.elements().remove();
+    fetchGraph();
+}
+
 function fetchGraph() {
-    fetch("/api/graph")
-        .then(res => res.json())
-        .then(updateGraph)
+    const url = drillService === null
+        ? (graphQuery ? `/api/graph?${graphQuery}` : "/api/graph")
+        : `/api/graph?level=route&service=${encodeURIComponent(drillService)}`;
+
+    fetch(url)
+        .then(res => {
+            // сервис мог быть вытеснен из графа — возвращаемся к общему виду
+            if (res.status === 404 && drillService !== null) {
+                setDrill(null);
+                return null;
+            }
+            return res.json();
+        })
+        .then(data => data && updateGraph(data))
         .catch(err => {
             console.error("fetchGraph error:", err);
         });
 }
 
 function fetchLogs() {
-    fetch("/api/logs")
+    // только записи новее уже показанных: курсор — seq последней
+    fetch(`/api/logs?since=${logCursor}`)
         .then(res => res.json())
         .then(data => {
             const el = document.getElementById("log-stream");
             if (!el) return;
 
-            (data.logs || []).forEach(line => {
+            (data.logs || []).forEach(entry => {
                 const div = document.createElement("div");
-                div.textContent = line;
+                div.textContent = entry.line;
                 el.appendChild(div);
             });
+            if (typeof data.next === "number") {
+                logCursor = data.next;
+            }
 
             while (el.childNodes.length > 100) {
                 el.removeChild(el.firstChild);
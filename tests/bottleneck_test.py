@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import bz2
+import gzip
+import io
 import sys
 from dataclasses import dataclass, field
 from typing import List, Dict, Tuple, Set
@@ -550,9 +553,22 @@ def parse_log_line(line: str) -> LogEntry | None:
     )
 
 
+def open_log_text(path: str):
+    """Текстовый поток лога; .gz/.bz2/.zst распаковываются на лету, без копии на диске."""
+    if path.endswith((".gz", ".gzip")):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8")
+    if path.endswith((".zst", ".zstd")):
+        import zstandard  # нужен только для .zst
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return io.TextIOWrapper(raw, encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
 def load_logs_from_file(path: str) -> List[LogEntry]:
     result: List[LogEntry] = []
-    with open(path, "r", encoding="utf-8") as f:
+    with open_log_text(path) as f:
         for line in f:
             entry = parse_log_line(line)
             if entry:
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.alert_engine import AlertEngine  # noqa: E402
+from app.graph_state import GraphState  # noqa: E402
+from benchmarks.synthetic import build_topology, generate_lines  # noqa: E402
+
+
+@pytest.fixture
+def state():
+    gs = GraphState()
+    ae = AlertEngine(gs)
+    gs.alert_engine = ae
+    return gs, ae
+
+
+@pytest.fixture(scope="session")
+def topology():
+    return build_topology(services=12, fanout=2, seed=3)
+
+
+@pytest.fixture(scope="session")
+def live_lines(topology):
+    return generate_lines(topology, 2000, seed=5)
+
+
+@pytest.fixture(scope="session")
+def trace_lines(topology):
+    return generate_lines(topology, 2000, fmt="trace", seed=5)
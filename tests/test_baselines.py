@@ -0,0 +1,137 @@
+import gzip
+import os
+import statistics
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from app.alert_engine import AlertEngine
+from app.baselines import _CELL, ALL, BaselineTable, build, hour_of_week
+from app.graph_state import GraphState
+from app.snapshot import SnapshotStore, Snapshotter, decode_snapshot
+
+MONDAY = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+def test_hour_of_week_starts_on_monday_utc():
+    assert hour_of_week(MONDAY) == 0
+    assert hour_of_week(MONDAY + 3600 * 25 + 59) == 25
+    assert hour_of_week(MONDAY + 7 * 24 * 3600 - 1) == 167
+
+
+def test_build_gives_exact_cell_statistics(tmp_path):
+    rows = [(MONDAY + i * 60, 100.0 + (i % 7)) for i in range(120)]  # два часа
+    with gzip.open(tmp_path / "logs.csv.gz", "wt") as f:
+        for ts, latency in rows:
+            stamp = datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            f.write(f"{stamp},a,/x,b,/y,{latency}\n")
+
+    table = build([str(tmp_path / "logs.csv.gz")])
+    p = table.profiles[("a", "b")]
+    for slot, values in ((0, [lat for _, lat in rows[:60]]), (1, [lat for _, lat in rows[60:]]),
+                         (ALL, [lat for _, lat in rows])):
+        assert p.n[slot] == len(values)
+        assert p.mean[slot] == pytest.approx(statistics.fmean(values))
+        assert p.var[slot] == pytest.approx(statistics.pvariance(values), rel=1e-5)
+
+
+def test_save_load_round_trip(tmp_path):
+    table = BaselineTable(min_samples=1)
+    for i in range(500):
+        table.observe(("a", "b"), MONDAY + i * 600, 50.0 + i % 13)
+        table.observe(("c", "d"), MONDAY + i * 900, 5.0)
+    path = str(tmp_path / "b.mbdb")
+    table.save(path)
+
+    loaded = BaselineTable.load(path)
+    for key, p in table.profiles.items():
+        q = loaded.profiles[key]
+        assert (list(q.mean), list(q.var), list(q.n)) == (list(p.mean), list(p.var), list(p.n))
+    assert BaselineTable.load(str(tmp_path / "missing.mbdb")) is None
+    with open(path, "r+b") as f:
+        f.truncate(20)
+    assert BaselineTable.load(path) is None
+
+
+def test_lookup_falls_back_to_all_hours():
+    table = BaselineTable(min_samples=30)
+    for i in range(40):
+        table.observe(("a", "b"), MONDAY, 10.0)
+    assert table.lookup(("a", "b"), MONDAY) == pytest.approx((10.0, 0.0))
+    # в 5:00 замеров нет — берётся ячейка по всем часам
+    assert table.lookup(("a", "b"), MONDAY + 5 * 3600) == pytest.approx((10.0, 0.0))
+    assert BaselineTable(min_samples=50).lookup(("a", "b"), MONDAY) is None
+
+
+def test_score_is_relative_to_the_edge_and_hour():
+    gs = GraphState()
+    ae = AlertEngine(gs)
+    night, day = MONDAY + 3 * 3600, MONDAY + 14 * 3600
+    for i in range(200):
+        ae.baselines.observe(("db", "disk"), night, 40.0 + i % 5)
+        ae.baselines.observe(("db", "disk"), day, 400.0 + i % 50)
+        ae.baselines.observe(("api", "cache"), day, 2.0 + (i % 3) * 0.1)
+    gs.update_from_log("db", "disk", 400.0)
+    gs.update_from_log("api", "cache", 40.0)
+
+    # 400 ms днём для медленной БД — норма
+    for _ in range(10):
+        ae.handle_log("db", "disk", 420.0, day)
+    assert ae.get_alerts() == []
+    # ночью у той же БД — аномалия
+    for _ in range(4):
+        ae.handle_log("db", "disk", 420.0, night)
+    assert ae.get_alerts()[-1]["type"] == "critical"
+    # быстрому кэшу 40 ms — тоже
+    for _ in range(4):
+        ae.handle_log("api", "cache", 40.0, day)
+    assert ae.get_alerts()[-1]["route"] == "api/cache"
+
+
+def test_single_outlier_does_not_alert_and_is_learned_slowly():
+    gs = GraphState()
+    ae = AlertEngine(gs)
+    now = time.time()
+    for i in range(100):
+        gs.update_from_log("a", "b", 100.0 + i % 10)
+        ae.handle_log("a", "b", 100.0 + i % 10, now)
+    mean_before, _ = ae.baselines.lookup(("a", "b"), now)
+
+    ae.handle_log("a", "b", 5000.0, now)
+    assert ae.get_alerts() == []
+    assert ae.baselines.lookup(("a", "b"), now)[0] - mean_before < 5.0
+
+
+def test_snapshotter_stores_baselines(tmp_path):
+    gs = GraphState()
+    ae = AlertEngine(gs)
+    for i in range(300):
+        ae.baselines.observe(("a", "b"), MONDAY + i * 60, 30.0 + i % 4)
+    store = SnapshotStore(str(tmp_path))
+    path = Snapshotter(store, gs, ae, [], 60).save_now()
+    assert os.path.exists(path)
+
+    ae2 = AlertEngine(GraphState())
+    with open(path, "rb") as f:
+        decode_snapshot(f.read()).apply(GraphState(), ae2)
+    assert ae2.baselines.lookup(("a", "b"), MONDAY) == ae.baselines.lookup(("a", "b"), MONDAY)
+
+    # офлайн-таблица новее снапшота — снапшот её не перетирает
+    ae3 = AlertEngine(GraphState())
+    ae3.baselines_at = time.time() + 60
+    with open(path, "rb") as f:
+        decode_snapshot(f.read()).apply(GraphState(), ae3)
+    assert len(ae3.baselines) == 0
+
+
+def test_corrupt_slot_skips_the_table(tmp_path):
+    table = BaselineTable(min_samples=1)
+    table.observe(("a", "b"), MONDAY, 10.0)
+    data = bytearray(table.to_bytes())
+    # первая ячейка идёт сразу за "a", "b" и числом ячеек
+    cell = len(data) - 2 * _CELL.size
+    data[cell] = 200
+    path = tmp_path / "b.mbdb"
+    path.write_bytes(bytes(data))
+    assert BaselineTable.load(str(path)) is None
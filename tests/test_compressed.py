@@ -0,0 +1,76 @@
+import gzip
+
+from app.alert_engine import AlertEngine
+from app.compressed import open_log
+from app.csv_parser import BatchParser
+from app.graph_state import GraphState
+from app.ingest import apply_batch
+from app.snapshot import decode_snapshot, encode_snapshot
+
+
+def _write_gz(path, lines):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.writelines(lines)
+    return str(path)
+
+
+def _ingest(gs, ae, path, offset=0, limit=None):
+    """Читает файл с offset, как LogReader; limit — остановиться после стольких байт."""
+    parser = BatchParser()
+    position = offset
+    with open_log(path, offset) as f:
+        while limit is None or position - offset < limit:
+            chunk = f.read(4096)
+            batch = parser.feed(chunk) if chunk else parser.flush()
+            with gs.lock:
+                apply_batch(gs, ae, batch)
+            position += batch.consumed
+            if not chunk:
+                break
+    return position
+
+
+def test_streaming_read_matches_plain(tmp_path, live_lines):
+    path = _write_gz(tmp_path / "logs.csv.gz", live_lines)
+    with open_log(path) as f:
+        assert f.read().decode("utf-8") == "".join(live_lines)
+
+
+def test_seek_counts_decompressed_bytes(tmp_path, live_lines):
+    path = _write_gz(tmp_path / "logs.csv.gz", live_lines)
+    raw = "".join(live_lines).encode("utf-8")
+    with open_log(path, 1000) as f:
+        assert f.tell() == 1000
+        assert f.read(50) == raw[1000:1050]
+
+
+def test_warm_start_over_gzip_does_not_replay(tmp_path, live_lines, state):
+    path = _write_gz(tmp_path / "logs.csv.gz", live_lines)
+
+    gs, ae = state
+    position = _ingest(gs, ae, path, limit=len("".join(live_lines)) // 2)
+    data = encode_snapshot(gs, ae, {path: position})
+    applied = gs.total_logs
+    assert 0 < applied < len(live_lines)
+
+    snap = decode_snapshot(data)
+    # позиция в распакованных байтах больше сжатого размера файла
+    assert snap.offset_for(path) == position
+
+    gs2 = GraphState()
+    ae2 = AlertEngine(gs2)
+    snap.apply(gs2, ae2)
+    _ingest(gs2, ae2, path, snap.offset_for(path))
+    assert gs2.total_logs == len(live_lines)
+    assert sum(e.count for e in gs2.edges.values()) == len(live_lines)
+
+
+def test_truncated_gzip_is_read_from_start(tmp_path, live_lines, state):
+    path = _write_gz(tmp_path / "logs.csv.gz", live_lines)
+    gs, ae = state
+    snap = decode_snapshot(encode_snapshot(gs, ae, {path: 5000}))
+
+    # тот же inode, но файл переписан короче
+    with open(path, "r+b") as f:
+        f.truncate(100)
+    assert snap.offset_for(path) == 0
@@ -0,0 +1,68 @@
+import pytest
+
+from app.csv_parser import BatchParser, parse_block, parse_timestamp
+from app.log_reader import LogReader
+
+_parse_line = LogReader(None, None, "", 0).parse_line
+
+
+def _rows(batch):
+    return list(zip(batch.src, batch.dst, batch.latency, batch.src_route, batch.dst_route))
+
+
+def _feed_all(data: bytes, chunk: int, track_offsets: bool = False):
+    parser = BatchParser(track_offsets=track_offsets)
+    rows, ts = [], []
+    for i in range(0, len(data), chunk):
+        batch = parser.feed(data[i:i + chunk])
+        rows += _rows(batch)
+        ts += batch.timestamps
+    batch = parser.flush()
+    return rows + _rows(batch), ts + batch.timestamps, parser
+
+
+@pytest.mark.parametrize("fixture", ["live_lines", "trace_lines"])
+@pytest.mark.parametrize("chunk", [1 << 20, 4096, 97])
+def test_batch_matches_parse_line(request, fixture, chunk):
+    lines = request.getfixturevalue(fixture)
+    data = "".join(lines).encode("utf-8")
+    rows, ts, parser = _feed_all(data, chunk)
+
+    assert rows == [_parse_line(line) for line in lines]
+    assert parser.rows == len(lines) and parser.errors == 0
+    expected_ts = [parse_timestamp(line.split(",")[0 if fixture == "live_lines" else 3]) for line in lines]
+    assert ts == pytest.approx(expected_ts)
+
+
+def test_trace_ids_are_kept(trace_lines):
+    batch = parse_block("".join(trace_lines[:50]).encode("utf-8"))
+    for line, tid, sid, pid in zip(trace_lines, batch.trace_id, batch.span_id, batch.parent_id):
+        assert line.split(",")[:3] == [tid, sid, pid]
+
+
+def test_broken_and_mixed_rows_are_counted():
+    data = (
+        b"timestamp,srcService,srcRoute,dstService,dstRoute,latency_ms\n"
+        b"2024-01-01T00:00:00Z,a,/x,b,/y,10.5\r\n"
+        b"\n"
+        b"not,a,log\n"
+        b"2024-01-01T00:00:01Z,a,/x,b,/y,oops\n"
+        b"t1,s1,,2024-01-01T00:00:02Z,b,/y,c,/z,7\n"
+        b"2024-01-01T00:00:03Z,c,/z,d,/w,3"
+    )
+    rows, _, parser = _feed_all(data, 16)
+    assert rows == [("a", "b", 10.5, "/x", "/y"), ("b", "c", 7.0, "/y", "/z"), ("c", "d", 3.0, "/z", "/w")]
+    assert (parser.headers, parser.empty, parser.errors) == (1, 1, 2)
+
+
+def test_track_offsets_end_at_each_row(live_lines):
+    data = "".join(live_lines[:200]).encode("utf-8")
+    batch = parse_block(data, track_offsets=True)
+    assert batch.consumed == len(data)
+    for i, end in enumerate(batch.ends):
+        # смещение конца строки i — ровно после её перевода строки
+        assert data[:end].decode("utf-8") == "".join(live_lines[:i + 1])
+
+    part = batch.slice(10, 20)
+    assert _rows(part) == _rows(batch)[10:20]
+    assert part.consumed == batch.ends[19]
@@ -0,0 +1,113 @@
+import gzip
+import os
+import time
+
+from app.compressed import ZSTD_MAGIC
+from app.dir_reader import DirectoryReader
+from app.ingest import IngestPipeline
+
+T0 = 1_700_000_000
+
+
+def _line(ts, src="a", dst="b", latency=10.0):
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(T0 + ts))
+    return f"{stamp},{src},/x,{dst},/y,{latency}\n"
+
+
+def _write(path, lines, mode="w"):
+    with open(path, mode) as f:
+        f.writelines(lines)
+    return str(path)
+
+
+def _read_all(reader, path):
+    tail = reader._open(path)
+    reader._ingest(tail, tail.file.read())
+    return tail
+
+
+def _wait(cond, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_files_are_merged_in_timestamp_order(tmp_path, state):
+    gs, ae = state
+    reader = DirectoryReader(IngestPipeline(gs, ae), str(tmp_path / "*.csv"), reorder_window=2.0)
+    _read_all(reader, _write(tmp_path / "even.csv", [_line(t, "even") for t in range(0, 20, 2)]))
+    _read_all(reader, _write(tmp_path / "odd.csv", [_line(t, "odd") for t in range(1, 20, 2)]))
+
+    # отпускается только то, что старше самой свежей метки на reorder_window
+    entries = reader._release()
+    assert [e[0] - T0 for e in entries] == list(range(0, 18))
+    batch, _ = reader._build(entries)
+    assert batch.src == ["even", "odd"] * 9
+    assert [e[0] - T0 for e in reader._release(everything=True)] == [18, 19]
+
+
+def test_offsets_commit_only_applied_chunks(tmp_path, state):
+    gs, ae = state
+    reader = DirectoryReader(IngestPipeline(gs, ae), str(tmp_path / "*.csv"), reorder_window=0.0)
+    first = [_line(t) for t in range(5)]
+    path = _write(tmp_path / "a.csv", first)
+    tail = _read_all(reader, path)
+    _, on_applied = reader._build(reader._release())
+    _write(path, [_line(t) for t in range(5, 8)], mode="a")
+    reader._ingest(tail, tail.file.read())
+
+    # первый кусок отпущен, но смещение двигается только после применения
+    assert reader.offsets() == {path: 0}
+    with gs.lock:
+        on_applied()
+    assert reader.offsets() == {path: len("".join(first))}
+
+    _, on_applied = reader._build(reader._release(everything=True))
+    with gs.lock:
+        on_applied()
+    assert reader.offsets() == {path: os.path.getsize(path)}
+
+
+def test_trace_ids_survive_reordering(tmp_path, state, trace_lines):
+    gs, ae = state
+    reader = DirectoryReader(IngestPipeline(gs, ae), str(tmp_path / "*.csv"))
+    _read_all(reader, _write(tmp_path / "t.csv", trace_lines[:200]))
+    _read_all(reader, _write(tmp_path / "l.csv", [_line(t) for t in range(3)]))
+
+    batch, _ = reader._build(reader._release(everything=True))
+    ids = {(t, s) for t, s in zip(batch.trace_id, batch.span_id) if t}
+    assert ids == {tuple(line.split(",")[:2]) for line in trace_lines[:200]}
+    assert batch.trace_id.count("") == 3
+
+
+def test_rotation_truncation_and_broken_files(tmp_path, state):
+    gs, ae = state
+    pipeline = IngestPipeline(gs, ae)
+    pipeline.start()
+    reader = DirectoryReader(pipeline, str(tmp_path / "*.log"), poll_interval=0.05, reorder_window=0.1)
+
+    # без zstandard и с битым gzip-потоком файлы пропускаются, остальные читаются
+    with open(tmp_path / "c.log", "wb") as f:
+        f.write(ZSTD_MAGIC + b"\x00" * 64)
+    good = gzip.compress("".join(_line(t, "gz") for t in range(50)).encode())
+    with open(tmp_path / "d.log", "wb") as f:
+        f.write(good[:len(good) // 2] + b"\x00" * 32 + good[len(good) // 2:])
+
+    path = _write(tmp_path / "app.log", [_line(t) for t in range(10)])
+    thread = reader.start()
+    assert _wait(lambda: gs.edges.get(("a", "b")) is not None and gs.edges[("a", "b")].count == 10)
+
+    # обрезали на месте — читаем с начала
+    _write(path, [_line(t) for t in range(10, 14)])
+    assert _wait(lambda: gs.edges[("a", "b")].count == 14)
+
+    # logrotate: файл переименован, по старому пути новый
+    os.rename(path, tmp_path / "app.log.1")
+    _write(path, [_line(t) for t in range(14, 20)])
+    assert _wait(lambda: gs.edges[("a", "b")].count == 20)
+
+    assert thread.is_alive()
+    assert reader.skipped == {str(tmp_path / "c.log")}
@@ -0,0 +1,35 @@
+import random
+
+import pytest
+
+from app.graph_index import SORT_KEYS, GraphIndex
+
+
+def _full_sort(values, i):
+    return sorted((-v[i], key) for key, v in values.items())
+
+
+@pytest.mark.parametrize("dirty_share", [0.01, 0.5, 1.0])
+def test_rankings_equal_full_sort(dirty_share):
+    rng = random.Random(7)
+    current = {}
+    index = GraphIndex(lambda key: current.get(key), lambda name: "normal")
+    for n in range(400):
+        key = (f"s{n % 40}", f"s{(n * 7 + 1) % 40}-{n}")
+        current[key] = (rng.random(), rng.random(), rng.random())
+        index.add_edge(key)
+    index.refresh()
+
+    for _ in range(5):
+        keys = list(current)
+        for key in rng.sample(keys, max(1, int(len(keys) * dirty_share))):
+            if rng.random() < 0.1:
+                # вытеснено до пересчёта
+                del current[key]
+            else:
+                current[key] = (rng.random(), rng.random(), rng.random())
+            index.touch(key)
+        index.refresh()
+        assert index.values == current
+        for i, sort in enumerate(SORT_KEYS):
+            assert index.ranking(sort) == _full_sort(current, i)
@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from app import create_app
+from app.graph_state import GraphState
+
+
+def _routes(gs):
+    gs.update_from_log("api", "auth", 10.0, "/login", "/check")
+    gs.update_from_log("api", "auth", 30.0, "/login", "/check")
+    gs.update_from_log("api", "auth", 20.0, "/me", "/token")
+    gs.update_from_log("web", "auth", 40.0, "/", "/check")
+    gs.update_from_log("auth", "db", 5.0, "/check", "/users")
+    gs.update_from_log("api", "cache", 1.0)  # без маршрутов
+
+
+def test_route_view_aggregates_per_route(state):
+    gs, _ = state
+    _routes(gs)
+    view = gs.export_routes("auth")
+    nodes = {n["id"]: n for n in view["nodes"]}
+    edges = {e["id"]: e for e in view["edges"]}
+
+    assert {n["id"] for n in view["nodes"] if n["level"] == "service"} == {"api", "web", "auth", "db"}
+    assert nodes["auth"]["focus"] and not nodes["api"]["focus"]
+    assert set(edges) == {"api::/login->auth::/check", "api::/me->auth::/token",
+                          "web::/->auth::/check", "auth::/check->db::/users"}
+    assert edges["api::/login->auth::/check"]["count"] == 2
+    assert edges["api::/login->auth::/check"]["avg_latency"] == pytest.approx(20.0)
+
+    # нагрузка маршрута — сумма входящих, задержка — средняя, взвешенная по вызовам
+    check = nodes["auth::/check"]
+    assert check["parent"] == "auth" and check["load"] == 3
+    assert check["avg_latency"] == pytest.approx((2 * 20.0 + 40.0) / 3)
+    # маршрутные рёбра одного ребра сервисов в сумме дают его счётчик
+    assert sum(e["count"] for e in view["edges"] if e["source"].startswith("api::")) == gs.edges[("api", "auth")].count
+    assert gs.export_routes("nobody") is None
+
+
+def test_route_edges_leave_with_parent_edge(state):
+    gs, _ = state
+    _routes(gs)
+    with gs.lock:
+        gs._evict_edge(("api", "auth"), "ttl")
+    assert not [k for k in gs.route_edges if (k[0], k[2]) == ("api", "auth")]
+    assert {e["id"] for e in gs.export_routes("auth")["edges"]} == {"web::/->auth::/check", "auth::/check->db::/users"}
+
+
+def test_ttl_sweep_evicts_routes(state):
+    gs = GraphState(edge_ttl=60)
+    _routes(gs)
+    gs.route_edges[("web", "/", "auth", "/check")].last_seen -= 120
+    gs.sweep(time.time())
+    # маршрут устарел, а ребро сервисов ещё живо
+    assert ("web", "auth") in gs.edges
+    assert ("web", "/", "auth", "/check") not in gs.route_edges
+    assert ("web", "auth") not in gs._routes_by_edge
+
+    gs.sweep(time.time() + 120)
+    assert not gs.edges and not gs.route_edges and not gs._routes_by_edge
+
+
+def test_route_drill_down_endpoint():
+    app = create_app()
+    _routes(app.graph_state)
+    client = app.test_client()
+
+    res = client.get("/api/graph?level=route&service=auth")
+    assert res.status_code == 200 and res.get_json()["service"] == "auth"
+    assert client.get("/api/graph?level=route").status_code == 400
+    assert client.get("/api/graph?level=pod&service=auth").status_code == 400
+    assert client.get("/api/graph?level=route&service=nobody").status_code == 404
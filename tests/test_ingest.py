@@ -0,0 +1,113 @@
+import json
+import threading
+
+import pytest
+
+from app.csv_parser import parse_block
+from app.ingest import POLICY_SHED_OLDEST, IngestPipeline, QueueFull, parse_ndjson
+
+
+def _batches(lines, size):
+    return [parse_block("".join(lines[i:i + size]).encode("utf-8")) for i in range(0, len(lines), size)]
+
+
+def test_reject_bounds_queue_in_records(state, live_lines):
+    gs, ae = state
+    pipeline = IngestPipeline(gs, ae, max_records=250)
+    accepted = rejected = 0
+    for batch in _batches(live_lines[:1000], 100):
+        try:
+            pipeline.submit(batch)
+            accepted += len(batch)
+        except QueueFull:
+            rejected += len(batch)
+        assert pipeline.depth <= 250
+    assert (accepted, rejected) == (200, 800)
+
+    assert pipeline.drain() == 200
+    assert gs.total_logs == 200 and pipeline.depth == 0
+
+
+def test_oversized_batch_is_accepted_into_empty_queue(state, live_lines):
+    gs, ae = state
+    pipeline = IngestPipeline(gs, ae, max_records=10)
+    pipeline.submit(parse_block("".join(live_lines[:50]).encode("utf-8")))
+    with pytest.raises(QueueFull):
+        pipeline.submit(parse_block(live_lines[0].encode("utf-8")))
+
+
+def test_shed_oldest_keeps_newest(state, live_lines):
+    gs, ae = state
+    pipeline = IngestPipeline(gs, ae, max_records=300, policy=POLICY_SHED_OLDEST)
+    batches = _batches(live_lines[:1000], 100)
+    shed = sum(pipeline.submit(batch) for batch in batches)
+    assert shed == 700 and pipeline.depth == 300
+
+    pipeline.drain()
+    # в граф попали ровно три последних пакета
+    assert gs.total_logs == 300
+    last = [rec for b in batches[-3:] for rec in zip(b.src, b.dst)]
+    assert gs.recent_logs.entries()[-1][1:3] == last[-1]
+
+
+def test_blocking_submit_applies_everything_in_order(state, live_lines):
+    gs, ae = state
+    pipeline = IngestPipeline(gs, ae, max_records=150)
+    pipeline.start()
+    applied = []
+
+    def producer(batches):
+        for i, batch in enumerate(batches):
+            pipeline.submit(batch, block=True, on_applied=lambda i=i: applied.append(i))
+
+    t = threading.Thread(target=producer, args=(_batches(live_lines, 50),))
+    t.start()
+    t.join(10)
+    assert pipeline.join(10)
+    assert gs.total_logs == len(live_lines)
+    assert applied == list(range(len(live_lines) // 50))
+
+
+def test_ndjson_matches_csv(live_lines):
+    records = []
+    for line in live_lines[:100]:
+        ts, src, src_route, dst, dst_route, latency = line.strip().split(",")
+        records.append({"timestamp": ts, "src": src, "srcRoute": src_route, "dst": dst,
+                        "dstRoute": dst_route, "latency_ms": float(latency)})
+    csv = parse_block("".join(live_lines[:100]).encode("utf-8"))
+    for data in ("\n".join(map(json.dumps, records)), json.dumps(records)):
+        batch = parse_ndjson(data.encode("utf-8"))
+        assert (batch.src, batch.dst, batch.src_route, batch.latency) == (csv.src, csv.dst, csv.src_route, csv.latency)
+        assert batch.timestamps == csv.timestamps
+
+
+def test_non_finite_timestamps_do_not_break_the_batch(state):
+    gs, ae = state
+    data = b'\n'.join([
+        b'{"src":"a","dst":"b","latency":5,"ts":1e400}',
+        b'{"src":"a","dst":"b","latency":5,"ts":"nan"}',
+        b'{"src":"a","dst":"b","latency":5,"ts":"-inf"}',
+        b'{"src":"a","dst":"b","latency":5,"ts":1700000000}',
+    ])
+    batch = parse_ndjson(data)
+    assert batch.timestamps == [None, None, None, 1700000000.0]
+
+    applied = []
+    pipeline = IngestPipeline(gs, ae)
+    pipeline.submit(batch, on_applied=lambda: applied.append(True))
+    assert pipeline.drain() == 4
+    assert gs.total_logs == 4 and applied == [True]
+
+
+def test_shed_batches_still_report_applied_in_order(state, live_lines):
+    gs, ae = state
+    pipeline = IngestPipeline(gs, ae, max_records=300, policy=POLICY_SHED_OLDEST)
+    applied = []
+    for i, batch in enumerate(_batches(live_lines[:1000], 100)):
+        pipeline.submit(batch, source="file", on_applied=lambda i=i: applied.append(i))
+    assert pipeline.depth == 300
+
+    pipeline.drain()
+    # строки выброшенных пакетов потеряны, но смещение файла идёт дальше
+    assert gs.total_logs == 300
+    assert applied == list(range(10))
@@ -0,0 +1,71 @@
+from app.log_buffer import LogRingBuffer
+
+
+def _fill(buf, n, start=0):
+    for i in range(start, start + n):
+        buf.append(f"s{i % 3}", f"d{i}", float(i), 1000.0 + i)
+
+
+def test_since_cursor_returns_only_new_entries():
+    buf = LogRingBuffer(10)
+    _fill(buf, 4)
+    first = buf.query()
+    assert [e["seq"] for e in first["logs"]] == [1, 2, 3, 4]
+    assert first["next"] == 4 and not first["truncated"]
+
+    _fill(buf, 2, 4)
+    second = buf.query(since=first["next"])
+    assert [e["latency"] for e in second["logs"]] == [4.0, 5.0]
+    assert buf.query(since=second["next"])["logs"] == []
+    # курсор от сервера, начавшего счёт заново — отдаём всё
+    assert len(buf.query(since=100)["logs"]) == 6
+
+
+def test_wraparound_keeps_last_capacity_entries():
+    buf = LogRingBuffer(5)
+    _fill(buf, 12)
+    assert len(buf) == 5 and buf.first_seq == 8
+    assert [e[0] for e in buf.entries()] == [8, 9, 10, 11, 12]
+    assert [e[3] for e in buf.entries()] == [7.0, 8.0, 9.0, 10.0, 11.0]
+    # клиент отстал больше чем на кольцо
+    assert buf.query(since=2)["truncated"]
+    assert not buf.query(since=7)["truncated"]
+
+
+def test_limit_cut_is_reported():
+    buf = LogRingBuffer(20)
+    _fill(buf, 10)
+    page = buf.query(since=2, limit=3)
+    assert [e["seq"] for e in page["logs"]] == [8, 9, 10]
+    assert page["next"] == 10 and page["truncated"]
+    assert not buf.query(since=7, limit=3)["truncated"]
+    # limit среди подходящих по фильтру
+    page = buf.query(service="s0", limit=10)
+    assert {e["src"] for e in page["logs"]} == {"s0"} and not page["truncated"]
+
+
+def test_compact_drops_dead_names():
+    buf = LogRingBuffer(4)
+    _fill(buf, 40)
+    assert len(buf._names) <= 4 * buf.capacity
+    assert [(e[1], e[2]) for e in buf.entries()] == [(f"s{i % 3}", f"d{i}") for i in range(36, 40)]
+
+
+def test_dump_load_keeps_seq():
+    buf = LogRingBuffer(6)
+    _fill(buf, 9)
+    next_seq, entries = buf.dump()
+
+    restored = LogRingBuffer(6)
+    restored.load(next_seq, entries)
+    assert restored.dump() == (next_seq, entries)
+    _fill(restored, 1, 9)
+    assert [e["seq"] for e in restored.query(since=9)["logs"]] == [10]
+
+    # кольцо меньше сохранённого — остаются последние записи
+    small = LogRingBuffer(3)
+    small.load(next_seq, entries)
+    assert [e[0] for e in small.entries()] == [7, 8, 9]
+    empty = LogRingBuffer(3)
+    empty.load(42, [])
+    assert empty.next_seq == 42 and empty.entries() == []
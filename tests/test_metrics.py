@@ -0,0 +1,85 @@
+import math
+import re
+
+import pytest
+
+from app import create_app
+from app.metrics import Registry
+
+_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+_LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def _parse(text):
+    """Текстовый формат Prometheus -> ({(имя, метки): значение}, {имя: тип})."""
+    samples, types = {}, {}
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            types[name] = kind
+            continue
+        if not line or line.startswith("#"):
+            continue
+        m = _SAMPLE.match(line)
+        assert m, f"bad exposition line: {line!r}"
+        name, labels, value = m.groups()
+        pairs = tuple(
+            (k, v.replace('\\n', "\n").replace('\\"', '"').replace("\\\\", "\\"))
+            for k, v in _LABEL.findall(labels or "")
+        )
+        samples[(name, pairs)] = float(value.replace("+Inf", "inf"))
+    return samples, types
+
+
+def test_render_round_trips():
+    reg = Registry()
+    c = reg.counter("t_requests_total", "Requests", ["path", "code"])
+    c.labels(path='/a"b\\c\nd', code=200).inc(3)
+    c.labels("/x", "500").inc()
+    g = reg.gauge("t_depth", "Depth")
+    g.set(2.5)
+    broken = reg.gauge("t_broken", "Raises")
+    broken.set_function(lambda: 1 / 0)
+
+    samples, types = _parse(reg.render())
+    assert types == {"t_requests_total": "counter", "t_depth": "gauge", "t_broken": "gauge"}
+    assert samples[("t_requests_total", (("path", '/a"b\\c\nd'), ("code", "200")))] == 3
+    assert samples[("t_requests_total", (("path", "/x"), ("code", "500")))] == 1
+    assert samples[("t_depth", ())] == 2.5
+    assert math.isnan(samples[("t_broken", ())])
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    reg = Registry()
+    h = reg.histogram("t_seconds", "Time", ["stage"], buckets=(0.1, 1.0, 0.5))
+    for v in (0.1, 0.2, 0.5, 0.7, 1.0, 3.0):
+        h.labels(stage="parse").observe(v)
+
+    samples, _ = _parse(reg.render())
+    bucket = {dict(labels)["le"]: v for (name, labels), v in samples.items() if name == "t_seconds_bucket"}
+    # граница входит в свою корзину (le — "меньше или равно")
+    assert bucket == {"0.1": 1, "0.5": 3, "1": 5, "+Inf": 6}
+    assert samples[("t_seconds_count", (("stage", "parse"),))] == 6
+    assert samples[("t_seconds_sum", (("stage", "parse"),))] == pytest.approx(5.5)
+
+
+def test_labels_and_registration_are_checked():
+    reg = Registry()
+    c = reg.counter("t_total", "Total", ["kind"])
+    assert reg.counter("t_total", "Total", ["kind"]) is c
+    assert c.labels("a") is c.labels(kind="a")
+    with pytest.raises(ValueError):
+        c.labels("a", "b")
+    with pytest.raises(ValueError):
+        reg.gauge("t_total", "Total")
+
+
+def test_metrics_endpoint_is_valid_exposition():
+    app = create_app()
+    app.graph_state.update_from_log("a", "b", 10.0)
+    res = app.test_client().get("/api/metrics")
+    assert res.status_code == 200 and res.mimetype == "text/plain"
+    samples, types = _parse(res.get_data(as_text=True))
+    assert types["mbd_stage_seconds"] == "histogram"
+    assert samples[("mbd_graph_edges", ())] >= 1
+    assert samples[("mbd_graph_logs", ())] >= 1
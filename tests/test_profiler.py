@@ -0,0 +1,57 @@
+import threading
+import time
+
+import pytest
+
+from app.profiler import ProfilerBusy, SamplingProfiler, _busy, profile
+
+
+def _spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.fixture
+def worker():
+    stop = threading.Event()
+    t = threading.Thread(target=_spin, args=(stop,), name="spinner", daemon=True)
+    t.start()
+    yield t
+    stop.set()
+    t.join()
+
+
+def test_outputs_describe_the_same_samples(worker):
+    prof = profile(0.3, 0.005, 60.0, 0.001)
+
+    assert prof.samples > 0 and prof.thread_samples["spinner"] > 0
+    lines = prof.collapsed().splitlines()
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == sum(prof.thread_samples.values())
+    spinner = [line for line in lines if line.startswith("spinner;")]
+    assert spinner and all("_spin (test_profiler.py:" in line for line in spinner)
+
+    doc = prof.speedscope()
+    frames = doc["shared"]["frames"]
+    by_name = {p["name"]: p for p in doc["profiles"]}
+    p = by_name["spinner"]
+    assert len(p["samples"]) == len(p["weights"])
+    assert sum(p["weights"]) == pytest.approx(prof.thread_samples["spinner"] * prof.interval)
+    assert all(0 <= i < len(frames) for stack in p["samples"] for i in stack)
+
+    summary = prof.summary()
+    assert summary["samples"] == prof.samples
+    assert summary["threads"]["spinner"] == prof.thread_samples["spinner"]
+
+
+@pytest.mark.parametrize("interval", [1000.0, float("inf")])
+def test_interval_is_capped_by_duration(interval):
+    t0 = time.perf_counter()
+    prof = profile(0.2, interval, 60.0, 0.001)
+    assert time.perf_counter() - t0 < 1.0
+    assert prof.interval == pytest.approx(0.2)
+
+
+def test_only_one_profile_at_a_time():
+    with _busy:
+        with pytest.raises(ProfilerBusy):
+            SamplingProfiler(0.1).run()
@@ -0,0 +1,31 @@
+from app import create_app
+from app.timeline import TimelineStore
+
+
+def test_stats_total_logs_survives_eviction():
+    app = create_app()
+    gs = app.graph_state
+    for _ in range(3):
+        gs.update_from_log("a", "b", 10.0)
+        gs.update_from_log("b", "c", 20.0)
+    client = app.test_client()
+    assert client.get("/api/stats").get_json()["total_logs"] == 6
+
+    with gs.lock:
+        gs._evict_edge(("a", "b"), "ttl")
+    stats = client.get("/api/stats").get_json()
+    # счётчик ингеста не откатывается, вытесненное видно отдельно
+    assert stats["total_logs"] == 6
+    assert stats["memory"]["evicted_edges"] == 1
+    assert stats["memory"]["evicted_logs"] == 3
+    assert gs.total_logs == 6
+
+
+def test_graph_at_rejects_non_finite_and_out_of_range(tmp_path):
+    app = create_app()
+    app.timeline = TimelineStore(str(tmp_path))
+    client = app.test_client()
+    for raw in ("nan", "inf", "-inf", "1e300", "-5", "yesterday"):
+        assert client.get(f"/api/graph?at={raw}").status_code == 400
+    # корректная метка без истории — 404, а не 500
+    assert client.get("/api/graph?at=1700000000").status_code == 404
@@ -0,0 +1,25 @@
+from app.csv_parser import parse_block
+from app.ingest import IngestPipeline
+from app.sampling import AdaptiveSampler
+
+
+def test_sampler_follows_pipeline_backlog(state, live_lines):
+    gs, ae = state
+    pipeline = IngestPipeline(gs, ae, max_records=1000)
+    sampler = AdaptiveSampler(lambda: pipeline.depth, enter_lag=500, exit_lag=100, seed=1)
+    gs.sampler = sampler
+
+    # писатель не запущен: очередь упирается в потолок
+    for i in range(0, 1000, 100):
+        pipeline.submit(parse_block("".join(live_lines[i:i + 100]).encode("utf-8")))
+    sampler.adjust()
+    assert sampler.active and sampler.rate == 0.5
+    # очередь полна и не сокращается — доля продолжает падать
+    sampler.adjust()
+    assert sampler.rate == 0.25
+
+    assert pipeline.drain() == 1000
+    assert gs.total_logs == 1000
+    assert 0 < sampler.counted < 1000 and sampler.full + sampler.counted == 1000
+    sampler.adjust()
+    assert not sampler.active and sampler.rate == 1.0
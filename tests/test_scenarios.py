@@ -0,0 +1,58 @@
+import pytest
+
+from app.graph_state import GraphState
+from app.scenarios import ScenarioEngine, ScenarioError, parse_scenario
+
+
+@pytest.mark.parametrize("raw", [
+    {"scale": [1]},
+    {"replicas": "auth"},
+    {"capacity": 3},
+    {"add_edges": {"source": "a"}},
+    {"add_edges": ["a->b"]},
+    {"add_edges": [{"source": "a"}]},
+    {"scale": {"db": -1}},
+    {"capacity": {"a-b": 1}},
+    {"colour": "red"},
+])
+def test_malformed_scenarios_are_rejected(raw):
+    with pytest.raises(ScenarioError):
+        parse_scenario(raw)
+
+
+def test_scenario_is_canonical():
+    a = parse_scenario({"scale": {"db": 2}, "add_edges": [{"source": "b", "target": "c"},
+                                                          {"source": "a", "target": "c", "capacity": 1}]})
+    b = parse_scenario({"add_edges": [{"source": "a", "target": "c", "capacity": "1"},
+                                      {"source": "b", "target": "c"}], "scale": {"db": 2.0}})
+    assert a == b
+
+
+def _slow_graph(db_latency=30_000.0, cache_latency=1000.0):
+    gs = GraphState()
+    for _ in range(5):
+        gs.update_from_log("api-gateway", "svc", 10.0)
+        gs.update_from_log("svc", "db-main", db_latency)
+        gs.update_from_log("api-gateway", "db-cache", cache_latency)
+    return gs
+
+
+def test_capacities_are_not_rounded():
+    gs = _slow_graph()
+    frozen = ScenarioEngine(gs, workers=0).freeze()
+    assert frozen.capacities[("svc", "db-main")] == pytest.approx(1 / 30_000.0)
+    assert frozen.capacities[("api-gateway", "db-cache")] == pytest.approx(1 / 1000.0)
+
+
+def test_scaling_the_bottleneck_raises_flow():
+    gs = _slow_graph(db_latency=2000.0, cache_latency=100.0)
+    result = ScenarioEngine(gs, workers=0).run([{"name": "x2", "scale": {"db-main": 2}}])
+    assert result["baseline"]["max_flow"] == pytest.approx(0.0105)
+    assert "svc->db-main" in result["baseline"]["min_cut"]
+    assert result["scenarios"][0]["max_flow"] == pytest.approx(0.011)
+
+
+@pytest.mark.parametrize("source", [["x"], {"a": 1}, 5, ""])
+def test_bad_source_is_rejected(source):
+    with pytest.raises(ScenarioError, match="source"):
+        ScenarioEngine(_slow_graph(), workers=0).run([{}], source)
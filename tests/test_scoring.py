@@ -0,0 +1,117 @@
+from app.graph_state import GraphState
+from app.scoring import ScoringEngine
+
+GW_SVC = ("api-gateway", "svc")
+SVC_DB = ("svc", "db-main")
+
+
+def _trace(gs, scorer, trace_id, gw_latency=100.0, db_latency=10.0):
+    gs.update_from_log(*GW_SVC, gw_latency)
+    gs.update_from_log(*SVC_DB, db_latency)
+    scorer.observe_span(trace_id, "a", "", GW_SVC, gw_latency)
+    scorer.observe_span(trace_id, "b", "a", SVC_DB, db_latency)
+
+
+def _assert_consistent(scorer, gs):
+    for counts in (scorer.trace_struct, scorer.flow_struct):
+        assert all(n > 0 for n in counts.values()), counts
+    node_struct = {}
+    for counts in (scorer.trace_struct, scorer.flow_struct):
+        for key, n in counts.items():
+            for name in key:
+                node_struct[name] = node_struct.get(name, 0) + n
+    for name, node in gs.nodes.items():
+        assert node.bottleneck_score == node_struct.get(name, 0), name
+
+
+def test_slowest_step_of_each_path_is_counted():
+    gs = GraphState()
+    scorer = ScoringEngine(gs, trace_window=10)
+    gs.scorer = scorer
+    for i in range(3):
+        _trace(gs, scorer, f"t{i}")
+    # дочерний спан пришёл раньше родителя — путь досчитывается, когда родитель появится
+    gs.update_from_log(*SVC_DB, 500.0)
+    scorer.observe_span("late", "b", "a", SVC_DB, 500.0)
+    scorer.observe_span("late", "a", "", GW_SVC, 100.0)
+
+    assert scorer.trace_struct == {GW_SVC: 3, SVC_DB: 1}
+    scorer.refresh()
+    _assert_consistent(scorer, gs)
+
+
+def test_window_drops_old_paths():
+    gs = GraphState()
+    scorer = ScoringEngine(gs, trace_window=2)
+    gs.scorer = scorer
+    for i in range(5):
+        _trace(gs, scorer, f"t{i}")
+    assert scorer.trace_struct == {GW_SVC: 2}
+
+
+def test_evicted_edge_counts_never_go_negative():
+    gs = GraphState(edge_ttl=60)
+    scorer = ScoringEngine(gs, trace_window=4)
+    gs.scorer = scorer
+    for i in range(4):
+        _trace(gs, scorer, f"t{i}")
+    scorer.refresh()
+    assert scorer.trace_struct[GW_SVC] == 4
+    assert GW_SVC in scorer.flow_struct
+
+    gs.edges[GW_SVC].last_seen -= 120
+    gs.sweep()
+    assert GW_SVC not in gs.edges
+    assert GW_SVC not in scorer.trace_struct and GW_SVC not in scorer.flow_struct
+
+    # пути вытесненного ребра выходят из окна, разрезы стоков пересчитываются
+    for i in range(8):
+        gs.update_from_log(*SVC_DB, 10.0)
+        scorer.observe_span(f"u{i}", "b", "", SVC_DB, 10.0)
+    scorer.refresh()
+    _trace(gs, scorer, "back")
+    scorer.refresh()
+
+    _assert_consistent(scorer, gs)
+    assert scorer.trace_struct[GW_SVC] == 1
+
+
+def test_sweep_forgets_evicted_edges_in_one_pass():
+    gs = GraphState(edge_ttl=60)
+    scorer = ScoringEngine(gs, trace_window=100)
+    gs.scorer = scorer
+    for i in range(20):
+        src = f"svc{i}"
+        gs.update_from_log("api-gateway", src, 50.0)
+        gs.update_from_log(src, "db-main", 10.0)
+        scorer.observe_span(f"t{i}", "a", "", ("api-gateway", src), 50.0)
+        scorer.observe_span(f"t{i}", "b", "a", (src, "db-main"), 10.0)
+    scorer.refresh()
+
+    calls = []
+    forget = scorer.forget
+    scorer.forget = lambda keys: calls.append(list(keys)) or forget(keys)
+    for i in range(15):
+        gs.edges[("api-gateway", f"svc{i}")].last_seen -= 120
+        gs.edges[(f"svc{i}", "db-main")].last_seen -= 120
+    gs.sweep()
+
+    assert len(calls) == 1 and len(calls[0]) == 30
+    assert all(k in gs.edges for k in scorer._hits)
+    assert all(k in gs.edges for cut in scorer._cuts.values() for k in cut)
+    scorer.refresh()
+    _assert_consistent(scorer, gs)
+
+
+def test_db_sinks_match_case_insensitively():
+    gs = GraphState()
+    scorer = ScoringEngine(gs, trace_window=10)
+    gs.scorer = scorer
+    gs.update_from_log("api-gateway", "svc", 100.0)
+    gs.update_from_log("svc", "DB-Main", 10.0)
+    scorer.observe_span("t", "a", "", ("api-gateway", "svc"), 100.0)
+    scorer.observe_span("t", "b", "a", ("svc", "DB-Main"), 10.0)
+    scorer.refresh()
+    # путь трейса дошёл до БД, и та же БД — сток для min-cut
+    assert scorer.trace_struct == {("api-gateway", "svc"): 1}
+    assert set(scorer._cuts) == {"DB-Main"}
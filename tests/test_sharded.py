@@ -0,0 +1,86 @@
+import time
+
+from app.csv_parser import parse_block
+from app.graph_state import GraphState
+from app.sharded import ShardedIngest
+
+
+def test_offset_commits_only_contiguous_chunks(state):
+    gs, ae = state
+    ingest = ShardedIngest(gs, ae, "unused.csv", workers=2)
+    for end in (100, 200, 300, 400):
+        ingest._chunks[ingest._seq] = (ingest._pass, end)
+        ingest._seq += 1
+
+    # куски слиты не по порядку: смещение не обгоняет неслитый кусок
+    ingest._commit([1, 3])
+    assert ingest.position == 0
+    ingest._commit([0])
+    assert ingest.position == 200
+    ingest._commit([2])
+    assert ingest.position == 400 and not ingest._chunks
+
+
+def test_chunk_from_previous_pass_does_not_move_offset(state):
+    gs, ae = state
+    ingest = ShardedIngest(gs, ae, "unused.csv", workers=1)
+    ingest._chunks[0] = (0, 500)
+    ingest._seq = 1
+    # файл перемотан, пока кусок был у воркера
+    ingest._pass = 1
+    ingest.position = 0
+    ingest._commit([0])
+    assert ingest.position == 0
+
+
+def test_workers_aggregate_like_single_process(state, live_lines):
+    gs, ae = state
+    ingest = ShardedIngest(gs, ae, "unused.csv", workers=2, publish_interval=0.05)
+    ingest.start(read_file=False)
+    try:
+        end = 0
+        for i in range(0, len(live_lines), 150):
+            block = "".join(live_lines[i:i + 150]).encode("utf-8")
+            end += len(block)
+            ingest.submit_block(block, end)
+        assert ingest.wait_idle(timeout=60)
+    finally:
+        ingest.stop()
+
+    expected = GraphState()
+    batch = parse_block("".join(live_lines).encode("utf-8"))
+    for src, dst, latency, sr, dr in zip(batch.src, batch.dst, batch.latency, batch.src_route, batch.dst_route):
+        expected.update_from_log(src, dst, latency, sr, dr)
+
+    assert ingest.position == end
+    assert gs.total_logs == expected.total_logs
+    assert {k: m.count for k, m in gs.edges.items()} == {k: m.count for k, m in expected.edges.items()}
+    assert {k: m.count for k, m in gs.route_edges.items()} == {k: m.count for k, m in expected.route_edges.items()}
+
+
+def test_merge_scores_each_latency_against_baseline(state):
+    gs, ae = state
+    ingest = ShardedIngest(gs, ae, "unused.csv", workers=1)
+    now = time.time()
+    for i in range(100):
+        ae.baselines.observe(("a", "b"), now, 100.0 + i % 10)
+
+    with gs.lock:
+        ingest.merge({("a", "/x", "b", "/y"): (4, 900.0, [900.0] * 4)}, [])
+    assert gs.edges[("a", "b")].count == 4
+    # каждый замер сдвигает сглаженный z, но алерт один — по итогу дельты
+    assert [a["type"] for a in ae.get_alerts()] == ["critical"]
+    assert "baseline" in ae.get_alerts()[-1]["message"]
+    assert ae.baselines.profiles[("a", "b")].n[-1] == 104
+
+
+def test_merge_without_baselines_raises_one_alert_per_edge(state):
+    gs, ae = state
+    ingest = ShardedIngest(gs, ae, "unused.csv", workers=1)
+    with gs.lock:
+        ingest.merge({
+            ("a", "/x", "b", "/y"): (200, 900.0, [900.0] * 200),
+            ("a", "/z", "b", "/y"): (200, 900.0, [900.0] * 200),
+        }, [])
+    assert [a["route"] for a in ae.get_alerts()] == ["a/b"]
+    assert ae.baselines.profiles[("a", "b")].n[-1] == 400
@@ -0,0 +1,106 @@
+import time
+import uuid
+
+import pytest
+
+from app.shared_state import _SLOT, SharedGraphView, SharedGraphWriter, SharedStateError
+
+
+@pytest.fixture
+def name():
+    return f"mbd_test_{uuid.uuid4().hex[:12]}"
+
+
+def _fill(gs, lines):
+    for line in lines:
+        _, src, sr, dst, dr, latency = line.strip().split(",")
+        gs.update_from_log(src, dst, float(latency), sr, dr)
+
+
+def test_reader_sees_published_graph(name, state, live_lines):
+    gs, ae = state
+    _fill(gs, live_lines[:500])
+    writer = SharedGraphWriter(name, 1 << 20, gs, ae)
+    view = SharedGraphView(name)
+    try:
+        with pytest.raises(SharedStateError):
+            view.read()
+        assert writer.publish()
+
+        graph = view.read()
+        export = gs.export()
+        assert [n["id"] for n in graph.export["nodes"]] == [n["id"] for n in export["nodes"]]
+        assert graph.counts == {k: m.count for k, m in gs.edges.items()}
+        assert view.total_logs == 500
+        assert view.recent_logs.dump() == gs.recent_logs.dump()
+        # пока поколение то же, payload не разбирается заново
+        assert view.read() is graph
+
+        _fill(gs, live_lines[500:600])
+        writer.publish()
+        assert view.read() is not graph and view.total_logs == 600
+    finally:
+        view._detach()
+        writer.close()
+
+
+def test_write_in_progress_is_not_read(name, state, live_lines):
+    gs, ae = state
+    _fill(gs, live_lines[:10])
+    writer = SharedGraphWriter(name, 1 << 20, gs, ae)
+    view = SharedGraphView(name, max_retries=5)
+    try:
+        writer.publish()
+        # писатель "застрял" посреди записи активного слота
+        off = writer._slot_offset(writer._active)
+        seq, gen, length, published_at = _SLOT.unpack_from(writer.shm.buf, off)
+        _SLOT.pack_into(writer.shm.buf, off, seq + 1, gen, length, published_at)
+        with pytest.raises(SharedStateError):
+            view.read()
+    finally:
+        view._detach()
+        writer.close()
+
+
+def test_reader_reattaches_after_writer_restart(name, state, live_lines):
+    gs, ae = state
+    _fill(gs, live_lines[:100])
+    writer = SharedGraphWriter(name, 1 << 20, gs, ae)
+    view = SharedGraphView(name, stale_after=0.2)
+    try:
+        writer.publish()
+        assert view.total_logs == 100
+
+        # новый процесс ингеста: новая область под тем же именем, поколения с нуля
+        writer.close()
+        _fill(gs, live_lines[100:150])
+        writer = SharedGraphWriter(name, 1 << 20, gs, ae)
+        writer.publish()
+        # воркер ещё держит отображение удалённой области
+        assert view.total_logs == 100
+
+        time.sleep(0.3)
+        writer.publish()
+        assert view.total_logs == 150
+    finally:
+        view._detach()
+        writer.close()
+
+
+def test_stale_graph_is_unavailable(name, state, live_lines):
+    gs, ae = state
+    _fill(gs, live_lines[:10])
+    writer = SharedGraphWriter(name, 1 << 20, gs, ae)
+    view = SharedGraphView(name, stale_after=0.2)
+    try:
+        writer.publish()
+        view.read()
+        time.sleep(0.3)
+        with pytest.raises(SharedStateError, match="stale"):
+            view.read()
+        writer.publish()
+        assert view.read().generation == 2
+    finally:
+        view._detach()
+        writer.close()
+
@@ -0,0 +1,77 @@
+import pytest
+
+from app.alert_engine import AlertEngine
+from app.graph_state import GraphState
+from app.log_reader import LogReader
+from app.snapshot import SnapshotError, SnapshotStore, decode_snapshot, encode_snapshot
+
+
+def _fill(gs, lines):
+    parse = LogReader(None, None, "", 0).parse_line
+    for line in lines:
+        src, dst, latency, src_route, dst_route = parse(line)
+        gs.update_from_log(src, dst, latency, src_route, dst_route)
+        gs.recent_logs.append(src, dst, latency, 0.0)
+
+
+def _restore(data):
+    gs = GraphState()
+    ae = AlertEngine(gs)
+    snap = decode_snapshot(data)
+    snap.apply(gs, ae)
+    return gs, ae, snap
+
+
+def test_round_trip_restores_graph(state, live_lines):
+    gs, ae = state
+    _fill(gs, live_lines)
+    gs.bottleneck_edges = {next(iter(gs.edges))}
+    ae.load_alerts([{"type": "warning", "title": "t", "message": "m", "route": "a/b", "meta": ""}])
+
+    gs2, ae2, snap = _restore(encode_snapshot(gs, ae, {"/var/log/x.csv": 1234}))
+
+    assert gs2.total_logs == gs.total_logs
+    assert gs2.export() == gs.export()
+    assert set(gs2.route_edges) == set(gs.route_edges)
+    for key, m in gs.edges.items():
+        assert gs2.edges[key].count == m.count
+        assert list(gs2.edges[key].latencies) == list(m.latencies)
+    assert gs2.bottleneck_edges == gs.bottleneck_edges
+    assert ae2.get_alerts() == ae.get_alerts()
+    assert gs2.recent_logs.dump() == gs.recent_logs.dump()
+    assert snap.offsets["/var/log/x.csv"]["offset"] == 1234
+
+
+def test_corrupt_checksum_is_rejected(state, live_lines):
+    gs, ae = state
+    _fill(gs, live_lines[:100])
+    data = bytearray(encode_snapshot(gs, ae))
+    data[len(data) // 2] ^= 0xFF
+    with pytest.raises(SnapshotError):
+        decode_snapshot(bytes(data))
+    with pytest.raises(SnapshotError):
+        decode_snapshot(b"MBDS")
+
+
+def test_store_skips_broken_latest(tmp_path, state, live_lines):
+    gs, ae = state
+    _fill(gs, live_lines[:100])
+    store = SnapshotStore(str(tmp_path), keep=2)
+    store.write(encode_snapshot(gs, ae))
+    broken = store.write(b"garbage" * 10)
+
+    snap = store.load_latest()
+    assert snap is not None and snap.total_logs == 100
+    assert len(store._list()) == 2 and store._list()[-1] == broken
+
+
+def test_unknown_offset_or_rotated_file_starts_from_zero(tmp_path, state):
+    gs, ae = state
+    path = tmp_path / "logs.csv"
+    path.write_text("x" * 100)
+    snap = decode_snapshot(encode_snapshot(gs, ae, {str(path): 60}))
+    assert snap.offset_for(str(path)) == 60
+    assert snap.offset_for(str(tmp_path / "other.csv")) == 0
+
+    path.write_text("x" * 10)
+    assert snap.offset_for(str(path)) == 0
@@ -0,0 +1,98 @@
+import os
+
+from app.timeline import DELTAS_PREFIX, TimelineRecorder, TimelineStore, capture
+
+
+def _normalized(export):
+    return (
+        sorted(export["nodes"], key=lambda n: n["id"]),
+        sorted(export["edges"], key=lambda e: e["id"]),
+        sorted(export["bottlenecks"]),
+        export["max_flow"],
+    )
+
+
+def _record_history(tmp_path, gs, lines, checkpoint_interval=3600.0):
+    store = TimelineStore(str(tmp_path))
+    recorder = TimelineRecorder(store, gs, checkpoint_interval, 1.0)
+    history = []
+    for i in range(0, len(lines), 200):
+        for line in lines[i:i + 200]:
+            _, src, sr, dst, dr, latency = line.strip().split(",")
+            gs.update_from_log(src, dst, float(latency), sr, dr)
+        if i == 600:
+            # ребро ушло из графа, узкие места сменились
+            key = next(iter(gs.edges))
+            gs._evict_edge(key, "ttl")
+            gs.bottleneck_edges = {next(iter(gs.edges))}
+            gs.global_max_flow = 1.5
+        recorder.record()
+        history.append((recorder._prev.at, _normalized(gs.export())))
+    return store, recorder, history
+
+
+def test_state_at_equals_live_export(tmp_path, state, live_lines):
+    gs, _ = state
+    store, _, history = _record_history(tmp_path, gs, live_lines)
+    assert len(store.checkpoints()) == 1
+
+    for at, expected in history:
+        assert _normalized(store.state_at(at).export()) == expected
+    # между записями — состояние последней записи до момента
+    assert _normalized(store.state_at(history[3][0] + 1e-6).export()) == history[3][1]
+    assert store.state_at(history[0][0] - 1) is None
+
+
+def test_replay_across_checkpoints(tmp_path, state, live_lines):
+    gs, _ = state
+    store, _, history = _record_history(tmp_path, gs, live_lines, checkpoint_interval=0.0)
+    assert len(store.checkpoints()) == len(history)
+    for at, expected in history:
+        assert _normalized(store.state_at(at).export()) == expected
+
+
+def test_truncated_delta_tail_is_ignored(tmp_path, state, live_lines):
+    gs, _ = state
+    store, recorder, history = _record_history(tmp_path, gs, live_lines)
+    path = store._path(DELTAS_PREFIX, recorder._stamp)
+    with open(path, "ab") as f:
+        f.write(b"\xff\x00\x00\x00partial")
+    at, expected = history[-1]
+    assert _normalized(store.state_at(at + 10).export()) == expected
+
+
+def test_capture_matches_graph(state, live_lines):
+    gs, _ = state
+    for line in live_lines[:300]:
+        _, src, sr, dst, dr, latency = line.strip().split(",")
+        gs.update_from_log(src, dst, float(latency), sr, dr)
+    assert _normalized(capture(gs).export()) == _normalized(gs.export())
+
+
+def test_prune_keeps_checkpoint_covering_cutoff(tmp_path, state):
+    gs, _ = state
+    store = TimelineStore(str(tmp_path), retention=100)
+    for at in (1000.0, 1050.0, 1090.0, 1200.0):
+        snap = capture(gs)
+        snap.at = at
+        store.write_checkpoint(snap)
+    store.prune(now=1195.0)
+    assert [s / 1e9 for s in store.checkpoints()] == [1090.0, 1200.0]
+    assert store.state_at(1100.0).at == 1090.0
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_recorder_survives_unexpected_errors(tmp_path, state, capsys):
+    gs, _ = state
+    recorder = TimelineRecorder(TimelineStore(str(tmp_path)), gs, 3600.0, 0.01)
+    calls = []
+
+    def record():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        recorder.stop()
+    recorder.record = record
+    recorder.run_blocking()
+    assert len(calls) == 2
+    assert "Timeline recorder error: boom" in capsys.readouterr().out